@@ -95,12 +95,13 @@ const App: React.FC = () => {
             id: bm.metadata?.url || `cloud-${idx}`,
             type: 'VIDEO_LOG',
             title: bm.metadata.title,
-            content: bm.content,
+            content: bm.preview,
             timestamp: new Date(bm.metadata.time).getTime(),
             metadata: {
               url: bm.metadata.url,
               platform: getPlatform(bm.metadata.url) as any,
-              description: bm.content.substring(0, 100)
+              description: bm.preview.substring(0, 100),
+              brainId: bm.id
             }
           }));
 
@@ -0,0 +1,233 @@
+import asyncio
+import collections
+import json
+import math
+import os
+import time
+
+from metrics import ADMISSION_REJECTED
+
+
+# "0" lets every request straight through
+ADMISSION = os.getenv("ADMISSION", "1") != "0"
+# Token bucket per client: sustained requests per second and burst size (0 turns a limit off)
+RECALL_RATE_PER_S = float(os.getenv("RECALL_RATE_PER_S", "5"))
+RECALL_RATE_BURST = float(os.getenv("RECALL_RATE_BURST", "20"))
+INGEST_RATE_PER_S = float(os.getenv("INGEST_RATE_PER_S", "10"))
+INGEST_RATE_BURST = float(os.getenv("INGEST_RATE_BURST", "50"))
+RATE_LIMIT_CLIENTS = int(os.getenv("RATE_LIMIT_CLIENTS", "10000"))
+# Recall and ingest requests handled at once. Ingest only gets part of it, so recall always has room.
+ADMIT_CONCURRENCY = int(os.getenv("ADMIT_CONCURRENCY", "32"))
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "16"))
+# Requests waiting for a slot beyond these get a 429 right away
+RECALL_QUEUE_MAX = int(os.getenv("RECALL_QUEUE_MAX", "64"))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "128"))
+# Ingest is shed while this much accepted work (journal + encode / store queues) is still waiting
+INGEST_SHED_BACKLOG = int(os.getenv("INGEST_SHED_BACKLOG", "5000"))
+SHED_RETRY_AFTER_S = 5
+# The backlog is read at most this often
+BACKLOG_CHECK_S = 0.25
+# "1" when behind a proxy we run: only then are X-Client-Id / X-Forwarded-For believed, else anyone could rotate them
+TRUSTED_PROXY = os.getenv("TRUSTED_PROXY", "0") == "1"
+
+# Routes under admission control, most important first
+ROUTES = {("POST", "/recall"): "recall", ("POST", "/ingest"): "ingest", ("POST", "/ingest/batch"): "ingest"}
+PRIORITY = ("recall", "ingest")
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket per client, the least recently seen clients forgotten beyond max_clients."""
+
+    def __init__(self, rate, burst, max_clients=RATE_LIMIT_CLIENTS):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._buckets = collections.OrderedDict()  # client -> [tokens, updated]
+
+    def take(self, client, now=None):
+        """0 if the client may go ahead (one token taken), else the seconds until it may."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+
+class PriorityGate:
+    """Concurrency slots shared by request classes, with a bounded wait queue per class.
+
+    A freed slot goes to the first class in priority order that has a waiter
+    and is under its own limit, so recall never waits behind queued ingests.
+    """
+
+    def __init__(self, concurrency, limits, queue_max, priority=PRIORITY):
+        self.concurrency = concurrency
+        self.limits = limits
+        self.queue_max = queue_max
+        self.priority = priority
+        self.running = {op: 0 for op in priority}
+        self._waiting = {op: collections.deque() for op in priority}
+
+    def _can_run(self, op):
+        return sum(self.running.values()) < self.concurrency and self.running[op] < self.limits.get(op, self.concurrency)
+
+    def waiting(self, op):
+        return len(self._waiting[op])
+
+    async def acquire(self, op):
+        ahead = any(self._waiting[o] for o in self.priority[:self.priority.index(op) + 1])
+        if not ahead and self._can_run(op):
+            self.running[op] += 1
+            return
+        if len(self._waiting[op]) >= self.queue_max.get(op, 0):
+            raise Rejected("queue_full", 1)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[op].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(op)  # granted just as the client went away
+            else:
+                self._waiting[op].remove(future)
+            raise
+
+    def release(self, op):
+        self.running[op] -= 1
+        for o in self.priority:
+            queue = self._waiting[o]
+            while queue and self._can_run(o):
+                future = queue.popleft()
+                if not future.done():
+                    self.running[o] += 1
+                    future.set_result(None)
+
+
+class Admission:
+    """Rate limits, priority gate and ingest shedding for the routes in ROUTES.
+
+    backlog() returns how much accepted ingest work is still waiting.
+    """
+
+    def __init__(self, backlog=lambda: 0, shed_backlog=INGEST_SHED_BACKLOG):
+        self.limiters = {
+            "recall": RateLimiter(RECALL_RATE_PER_S, RECALL_RATE_BURST),
+            "ingest": RateLimiter(INGEST_RATE_PER_S, INGEST_RATE_BURST),
+        }
+        self.gate = PriorityGate(
+            ADMIT_CONCURRENCY,
+            limits={"recall": ADMIT_CONCURRENCY, "ingest": INGEST_MAX_IN_FLIGHT},
+            queue_max={"recall": RECALL_QUEUE_MAX, "ingest": INGEST_QUEUE_MAX},
+        )
+        self.backlog = backlog
+        self.shed_backlog = shed_backlog
+        self._backlog = (0, -math.inf)  # (value, read at)
+
+    def current_backlog(self):
+        value, read_at = self._backlog
+        now = time.monotonic()
+        if now - read_at >= BACKLOG_CHECK_S:
+            value = self.backlog()
+            self._backlog = (value, now)
+        return value
+
+    async def admit(self, op, client):
+        """Takes a slot for one request, Rejected if it has to be turned away. Call release(op) after."""
+        try:
+            if op == "ingest" and self.shed_backlog > 0 and self.current_backlog() >= self.shed_backlog:
+                raise Rejected("shed", SHED_RETRY_AFTER_S)
+            wait = self.limiters[op].take(client)
+            if wait > 0:
+                raise Rejected("rate_limited", wait)
+            await self.gate.acquire(op)
+        except Rejected as e:
+            ADMISSION_REJECTED.inc(op=op, reason=e.reason)
+            raise
+
+    def release(self, op):
+        self.gate.release(op)
+
+    def stats(self):
+        return {
+            "running": dict(self.gate.running),
+            "waiting": {op: self.gate.waiting(op) for op in PRIORITY},
+            "backlog": self._backlog[0],
+            "shed_backlog": self.shed_backlog,
+            "rejected": {
+                op: {reason: ADMISSION_REJECTED.value(op=op, reason=reason) for reason in ("rate_limited", "queue_full", "shed")}
+                for op in PRIORITY
+            },
+        }
+
+
+def client_key(scope, trusted_proxy=None):
+    """Who a request counts against: the peer address.
+
+    Behind a trusted proxy the peer is the proxy itself, so X-Client-Id, else
+    the first X-Forwarded-For hop, is used instead.
+    """
+    if TRUSTED_PROXY if trusted_proxy is None else trusted_proxy:
+        headers = dict(scope.get("headers") or [])
+        client = headers.get(b"x-client-id") or headers.get(b"x-forwarded-for", b"").split(b",")[0].strip()
+        if client:
+            return client.decode("latin-1")[:128]
+    peer = scope.get("client")
+    return peer[0] if peer else "unknown"
+
+
+class AdmissionMiddleware:
+    """Applies an Admission to the requests of ROUTES, answering 429 with Retry-After when it says no."""
+
+    def __init__(self, app, admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        op = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if op is None or not ADMISSION:
+            return await self.app(scope, receive, send)
+        try:
+            await self.admission.admit(op, client_key(scope))
+        except Rejected as e:
+            return await self._reject(send, e)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(op)
+
+    @staticmethod
+    async def _reject(send, rejected):
+        details = {
+            "rate_limited": "Too many requests from this client",
+            "queue_full": "Server busy, too many requests waiting",
+            "shed": "Server is catching up on ingests",
+        }
+        body = json.dumps({"detail": details[rejected.reason]}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(rejected.retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
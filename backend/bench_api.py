@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Benchmarks /ingest and /recall of the brain API, fully offline.
+
+The app runs in-process (or against --url) with Pinecone replaced by a local
+store that adds a configurable delay to every call, so the numbers include
+the round trip we would pay in production without needing the service.
+The synthetic corpus covers every platform branch of ingest_activity with
+realistic content lengths.
+
+Reports throughput and p50/p95/p99 latency per scenario and concurrency
+level, and writes them as JSON so runs on different commits can be compared.
+
+With write-behind on, /ingest answers 202 once the payload is in the journal,
+so ingest_queued times that append and reports separately how long the
+journal took to drain. ingest_sync times the full encode and upsert
+(INGEST_WRITE_BEHIND=0); in-process runs measure both.
+
+Usage:
+    python bench_api.py                                  # in-process, real model
+    python bench_api.py --encoder hash                   # no model weights needed
+    python bench_api.py --store-latency-ms 40 --concurrency 1,8,32
+    python bench_api.py --url http://localhost:7860      # a running server
+    python bench_api.py --compare bench_results/old.json
+    python bench_api.py --scenarios recall --recall-mode snippet --accept-encoding identity
+    python bench_api.py --scenarios ingest_queued,ingest_sync
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Ingest scenarios and the write-behind setting each one measures
+INGEST_SCENARIOS = {"ingest_queued": True, "ingest_sync": False}
+
+# Platform branches of ingest_activity with (url template, min chars, max chars)
+PLATFORMS = {
+    "youtube": ("https://www.youtube.com/watch?v={id}", 2000, 20000),
+    "youtube_title_only": ("https://youtu.be/{id}", 0, 80),
+    "instagram_reel": ("https://www.instagram.com/reel/{id}/", 60, 600),
+    "tiktok": ("https://www.tiktok.com/@user/video/{id}", 60, 400),
+    "instagram_dm": ("https://www.instagram.com/direct/t/{id}/", 200, 3000),
+    "chatgpt": ("https://chatgpt.com/c/{id}", 1000, 10000),
+    "web": ("https://example-{id}.com/article", 500, 8000),
+}
+
+WORDS = (
+    "python react vector memory search transcript video music recipe travel deploy docker "
+    "kubernetes latency throughput model embedding browser history tutorial lecture podcast "
+    "design review bug fix release notes meeting summary question answer idea project plan "
+    "the a of and to in is that for on with as it was be at by this from we you they"
+).split()
+
+
+def make_text(rng, n_chars):
+    words = []
+    size = 0
+    while size < n_chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:n_chars]
+
+
+def make_corpus(n, seed=0):
+    """Synthetic ActivityLog dicts, spread over every platform branch."""
+    rng = random.Random(seed)
+    logs = []
+    for i in range(n):
+        name = rng.choice(list(PLATFORMS))
+        url, low, high = PLATFORMS[name]
+        logs.append({
+            "title": f"{name} item {i}: " + make_text(rng, 40),
+            "url": url.format(id=f"{seed}x{i}"),
+            "content": make_text(rng, rng.randint(low, high)),
+            "timestamp": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+        })
+    return logs
+
+
+def make_queries(n, seed=1):
+    rng = random.Random(seed)
+    return [make_text(rng, rng.randint(10, 80)) for _ in range(n)]
+
+
+class HashEncoder:
+    """Deterministic bag-of-words vectors, for benchmarking the server without model weights."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.dimension] += 1
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+        return out[0] if single else out
+
+
+def delayed_store(store, latency_ms, jitter_ms):
+    """Wraps a VectorStore so every call sleeps like a network round trip first."""
+    from vector_store import VectorStore
+
+    class DelayedStore(VectorStore):
+        def _wait(self):
+            time.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0)
+
+        def __getattr__(self, name):
+            return getattr(store, name)
+
+        def upsert(self, vectors):
+            self._wait()
+            return store.upsert(vectors)
+
+        def query(self, *args, **kwargs):
+            self._wait()
+            return store.query(*args, **kwargs)
+
+        def fetch(self, ids):
+            self._wait()
+            return store.fetch(ids)
+
+        def list(self):
+            self._wait()
+            return store.list()
+
+        def delete(self, ids):
+            self._wait()
+            return store.delete(ids)
+
+        def delete_all(self):
+            self._wait()
+            return store.delete_all()
+
+        def drop(self):
+            self._wait()
+            return store.drop()
+
+    return DelayedStore()
+
+
+async def start_in_process(args):
+    """Imports the app against a throwaway local store and runs its warm-up."""
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix="sentinel-bench-")
+    os.environ["VECTOR_STORE"] = "local"
+    os.environ["LOCAL_STORE_PATH"] = os.path.join(workdir, "store")
+    os.environ["MEMORY_INDEX_PATH"] = os.path.join(workdir, "memory_index.sqlite")
+    os.environ["INGEST_JOURNAL_PATH"] = os.path.join(workdir, "ingest_journal.sqlite")
+    os.environ["EXTRACTOR_CACHE_PATH"] = os.path.join(workdir, "extractor_cache.sqlite")
+    # Transcript fetches would hit the network and re-store pages mid-run
+    os.environ["ENRICHMENT"] = "0"
+    # Every simulated client shares one connection, per-client rate limits would turn most of them away
+    os.environ["ADMISSION"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    if args.encoder == "hash":
+        main.load_model = lambda *args: HashEncoder()
+    await main.warm_up()
+    if not main.readiness.is_ready:
+        raise SystemExit(f"Warm-up failed: {main.readiness.error}")
+    main.store = delayed_store(main.store, args.store_latency_ms, args.store_jitter_ms)
+
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120, headers=client_headers(args)), main
+
+
+def client_headers(args):
+    return {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+
+
+async def run_level(client, make_request, total, concurrency):
+    latencies = []
+    sizes = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+            except Exception:
+                errors += 1
+                return
+            # A 429 or 5xx comes back fast, timing it would flatter the numbers
+            if not 200 <= response.status_code < 300:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+            # Bytes on the wire, i.e. after compression
+            sizes.append(response.num_bytes_downloaded)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - started
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        # Only requests that were served count
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "mean_ms": round(float(lat.mean()), 2),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "mean_bytes": round(float(np.mean(sizes)), 1) if sizes else 0.0,
+    }
+
+
+async def wait_for_journal(client, timeout=600):
+    """Seconds until the write-behind journal is empty again."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if (await client.get("/ingest/status")).json()["depth"] == 0:
+            break
+        await asyncio.sleep(0.05)
+    return round(time.perf_counter() - started, 2)
+
+
+async def benchmark(args):
+    import httpx
+
+    if args.url:
+        client, app = httpx.AsyncClient(base_url=args.url, timeout=120, headers=client_headers(args)), None
+    else:
+        client, app = await start_in_process(args)
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = []
+    async with client:
+        # Seed the store so recall has something to search
+        seed_corpus = make_corpus(args.seed_docs, seed=0)
+        for start in range(0, len(seed_corpus), 200):
+            await client.post("/ingest/batch", json=seed_corpus[start:start + 200])
+        write_behind = (await client.get("/ingest/status")).json()["write_behind"]
+        if write_behind:
+            await wait_for_journal(client)
+
+        for n, scenario in enumerate(args.scenarios.split(",")):
+            if scenario in INGEST_SCENARIOS and INGEST_SCENARIOS[scenario] != write_behind:
+                if app is None:
+                    print(f"Skipping {scenario}: the server runs with write-behind {'on' if write_behind else 'off'}")
+                    continue
+                app.INGEST_WRITE_BEHIND = INGEST_SCENARIOS[scenario]
+            for level in levels:
+                # Fresh content / queries per run so dedup and caches don't hide the real cost
+                run_seed = 1000 * (n + 1) + level
+                corpus = make_corpus(args.requests, seed=run_seed)
+                queries = [{"text": q, "mode": args.recall_mode} for q in make_queries(args.requests, seed=run_seed)]
+
+                if scenario in INGEST_SCENARIOS:
+                    make_request = lambda i: client.post("/ingest", json=corpus[i])
+                elif scenario == "recall":
+                    make_request = lambda i: client.post("/recall", json=queries[i])
+                elif scenario == "mixed":
+                    make_request = lambda i: (
+                        client.post("/recall", json=queries[i]) if i % 4 else client.post("/ingest", json=corpus[i])
+                    )
+                else:
+                    raise SystemExit(f"Unknown scenario: {scenario}")
+
+                result = {"scenario": scenario, **await run_level(client, make_request, args.requests, level)}
+                drain = ""
+                if scenario != "recall" and (app.INGEST_WRITE_BEHIND if app else write_behind):
+                    # The 202s above only cover the journal append, the store catches up afterwards
+                    result["drain_s"] = await wait_for_journal(client)
+                    drain = f"  drained in {result['drain_s']} s"
+                results.append(result)
+                print(f"{scenario:>13} c={level:<4} {result['throughput_rps']:>8} rps  "
+                      f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+                      f"{result['mean_bytes']:>9} B  errors {result['errors']}{drain}")
+            if app is not None:
+                app.INGEST_WRITE_BEHIND = write_behind
+    return results, write_behind
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline['meta']['commit']}:")
+    for r in report["results"]:
+        before = old.get((r["scenario"], r["concurrency"]))
+        if not before:
+            continue
+        rps = (r["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+        p99 = (r["p99_ms"] / before["p99_ms"] - 1) * 100 if before["p99_ms"] else 0.0
+        size = (r["mean_bytes"] / before["mean_bytes"] - 1) * 100 if before.get("mean_bytes") else 0.0
+        print(f"{r['scenario']:>13} c={r['concurrency']:<4} throughput {rps:+6.1f}%  p99 {p99:+6.1f}%  bytes {size:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--encoder", choices=["model", "hash"], default="model",
+                        help="hash skips the embedding model and measures only the server (in-process only)")
+    parser.add_argument("--scenarios", default="ingest_queued,ingest_sync,recall,mixed",
+                        help="mixed ingests the way the server is configured")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--seed-docs", type=int, default=1000, help="Documents ingested before measuring")
+    parser.add_argument("--store-latency-ms", type=float, default=25.0, help="Simulated vector-store round trip")
+    parser.add_argument("--store-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--recall-mode", choices=["full", "snippet", "ids"], default="full",
+                        help="Response mode of the recall queries")
+    parser.add_argument("--accept-encoding", help="Accept-Encoding to send, e.g. identity, gzip or br (default httpx's)")
+    parser.add_argument("--out", help="Results file (default bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    args = parser.parse_args()
+
+    results, write_behind = asyncio.run(benchmark(args))
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "target": args.url or "in-process",
+            "encoder": args.encoder,
+            "store_latency_ms": args.store_latency_ms,
+            "store_jitter_ms": args.store_jitter_ms,
+            "seed_docs": args.seed_docs,
+            "recall_mode": args.recall_mode,
+            "accept_encoding": args.accept_encoding,
+            "write_behind": write_behind,
+        },
+        "results": results,
+    }
+
+    out = args.out or os.path.join("bench_results", f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {out}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
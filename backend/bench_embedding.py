@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Compares the embedding backends (PyTorch vs int8 ONNX).
+Each backend runs in its own process so RSS numbers don't mix.
+
+Reports throughput, p50/p99 single-text latency, RSS and cosine agreement
+of the ONNX vectors with the PyTorch ones.
+
+Usage: python bench_embedding.py [--texts 512] [--latency-runs 200] [--out results.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from embedding import load_model
+
+WORDS = (
+    "video transcript channel subscribe react python tutorial error stack trace "
+    "reel caption music dance recipe travel chat message reply meeting notes "
+    "model vector search memory browser history github issue pull request review "
+    "the a of and to in is that for on with as it was be at by this from"
+).split()
+
+
+def make_corpus(n, seed=0):
+    """Synthetic texts from a few words up to a few hundred, like real page content."""
+    rng = random.Random(seed)
+    lengths = [rng.choice([8, 20, 60, 150, 300]) for _ in range(n)]
+    return [" ".join(rng.choice(WORDS) for _ in range(length)) for length in lengths]
+
+
+def rss_mb():
+    # Current resident memory from /proc, falls back to peak RSS elsewhere
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_backend(backend, texts, latency_runs, vectors_path, queue):
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    model = load_model(backend)
+    load_s = time.perf_counter() - started
+    model.encode(texts[:8])  # warm up
+
+    started = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=32))
+    batch_s = time.perf_counter() - started
+    np.save(vectors_path, vectors)
+
+    latencies = []
+    for i in range(latency_runs):
+        t = time.perf_counter()
+        model.encode(texts[i % len(texts)])
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    queue.put({
+        "backend": backend,
+        "load_s": round(load_s, 3),
+        "throughput_texts_per_s": round(len(texts) / batch_s, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "rss_mb": round(rss_mb(), 1),
+        "model_rss_mb": round(rss_mb() - rss_before, 1),
+    })
+
+
+def cosine_agreement(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    cos = (a * b).sum(axis=1)
+    return {"mean": round(float(cos.mean()), 5), "min": round(float(cos.min()), 5), "p01": round(float(np.percentile(cos, 1)), 5)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--latency-runs", type=int, default=200)
+    parser.add_argument("--backends", default="torch,onnx")
+    parser.add_argument("--out", help="Write the results as JSON here too")
+    args = parser.parse_args()
+
+    texts = make_corpus(args.texts)
+    ctx = multiprocessing.get_context("spawn")
+    results, vectors = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends.split(","):
+            print(f"⏱️ Benchmarking {backend}...")
+            path = os.path.join(tmp, f"{backend}.npy")
+            queue = ctx.Queue()
+            proc = ctx.Process(target=run_backend, args=(backend, texts, args.latency_runs, path, queue))
+            proc.start()
+            result = queue.get()
+            proc.join()
+            results.append(result)
+            vectors[backend] = np.load(path)
+
+    report = {"texts": len(texts), "backends": results}
+    if "torch" in vectors:
+        # Parity: how close each backend's vectors are to the PyTorch reference
+        report["cosine_vs_torch"] = {
+            name: cosine_agreement(vectors["torch"], v) for name, v in vectors.items() if name != "torch"
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import math
+import os
+import re
+
+import logger
+
+
+# MiniLM reads at most 256 word pieces, anything after that is silently dropped.
+# Windows are counted in the model's tokens, 200 leaves room for [CLS] / [SEP] and a margin.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+# Hard cap so one giant page can't flood the index
+CHUNK_MAX_PER_DOC = int(os.getenv("CHUNK_MAX_PER_DOC", "256"))
+
+# Without the model's tokenizer (e.g. encoding through the embedding server) tokens are estimated:
+# one per CJK character, one per 4 characters of anything else, which overestimates English a little
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_UNITS = re.compile(f"[{_CJK}]|[^\\s{_CJK}]{{1,64}}")
+CHARS_PER_TOKEN = 4
+
+
+def span_tokenizer(tokenizer):
+    """A private copy of a Hugging Face fast tokenizer that chunk_text can count with, or None.
+
+    A copy, because the encode thread uses the original at the same time
+    and a shared one fails with "Already borrowed".
+    """
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        return None
+    from tokenizers import Tokenizer
+
+    counter = Tokenizer.from_str(backend.to_str())
+    counter.no_truncation()
+    counter.no_padding()
+    return counter
+
+
+def is_uncased(tokenizer):
+    """Whether a tokenizer from span_tokenizer() lowercases, so case never reaches the model."""
+    normalizer = tokenizer.normalizer if tokenizer is not None else None
+    return normalizer is not None and normalizer.normalize_str("Hello World") == normalizer.normalize_str("hello world")
+
+
+def token_spans(text, tokenizer=None):
+    """(start, end, tokens) for each piece of text, in order.
+
+    With a tokenizer from span_tokenizer() the pieces are its tokens, else
+    words (long ones cut every 64 characters) and single CJK characters.
+    """
+    if tokenizer is not None:
+        return [(start, end, 1) for start, end in tokenizer.encode(text, add_special_tokens=False).offsets if end > start]
+    spans = []
+    for match in _UNITS.finditer(text):
+        piece = match.group()
+        spans.append((match.start(), match.end(), 1 if len(piece) == 1 else math.ceil(len(piece) / CHARS_PER_TOKEN)))
+    return spans
+
+
+class Chunks(list):
+    """What chunk_text returns: the chunks, where each starts in the text, and how many tokens the cap left out."""
+
+    def __init__(self, chunks=(), starts=None):
+        super().__init__(chunks)
+        self.starts = starts if starts is not None else [0] * len(self)
+        self.dropped_tokens = 0
+
+
+def chunk_text(text, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS, max_chunks=CHUNK_MAX_PER_DOC,
+               tokenizer=None):
+    """Splits text into overlapping windows of at most max_tokens tokens, each a slice of text.
+
+    Tokens are the model's when a tokenizer (see span_tokenizer) is given,
+    else estimated, so CJK or unspaced text is split too. Short texts come
+    back as a single chunk, so the common case is one vector. Returns at
+    least one chunk, even for empty text.
+    """
+    spans = token_spans(text, tokenizer)
+    total = sum(tokens for _, _, tokens in spans)
+    if total <= max_tokens:
+        return Chunks([text])
+
+    overlap = min(max(0, overlap), max_tokens - 1)
+    chunks = Chunks()
+    start = 0
+    while start < len(spans):
+        end, used = start, 0
+        # A single piece over the budget still makes a chunk of its own
+        while end < len(spans) and (end == start or used + spans[end][2] <= max_tokens):
+            used += spans[end][2]
+            end += 1
+        chunks.append(text[spans[start][0]:spans[end - 1][1]])
+        chunks.starts.append(spans[start][0])
+        if end >= len(spans):
+            break
+        if len(chunks) >= max_chunks:
+            chunks.dropped_tokens = sum(tokens for _, _, tokens in spans[end:])
+            logger.warning("chunk_cap_reached", chunks=len(chunks), dropped_tokens=chunks.dropped_tokens)
+            break
+        # Next window starts overlap tokens back, but always moves forward
+        back, shared = end, 0
+        while back - 1 > start and shared + spans[back - 1][2] <= overlap:
+            back -= 1
+            shared += spans[back][2]
+        start = back
+    return chunks
+
+
+def join_chunks(chunks, starts=None):
+    """The text chunk_text split, from its chunks in order and where each started (Chunks.starts).
+
+    Chunks stored before starts were kept were runs of words: those are
+    joined where the start of each repeats the end of the one before.
+    """
+    if not chunks:
+        return ""
+    if starts is not None and len(starts) == len(chunks):
+        text = ""
+        for chunk, start in zip(chunks, starts):
+            text = text[:start] + chunk
+        return text
+    text = chunks[0]
+    for chunk in chunks[1:]:
+        shared = _shared_prefix(text, chunk)
+        text += chunk[shared:] if shared else " " + chunk
+    return text
+
+
+def _shared_prefix(text, chunk):
+    """Length of the longest prefix of chunk that text ends with."""
+    head = chunk[:16]
+    at = text.find(head, max(0, len(text) - len(chunk)))
+    while at != -1:
+        if chunk.startswith(text[at:]):
+            return len(text) - at
+        at = text.find(head, at + 1)
+    return 0
+
+
+def chunk_id(doc_id, i):
+    return f"{doc_id}#{i}"
+
+
+def parent_of(vid):
+    """Document id of a chunk id."""
+    return vid.split("#", 1)[0]
+
+
+def doc_id_of(match):
+    """Parent document id of a match. Records from before chunking are their own parent."""
+    meta = match.get('metadata') or {}
+    return meta.get('doc_id') or match['id']
+
+
+def collapse_matches(matches, limit=None):
+    """Keeps the best-scoring chunk of each document, in the order they were ranked."""
+    seen = set()
+    collapsed = []
+    for match in matches:
+        doc_id = doc_id_of(match)
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        collapsed.append(match)
+        if limit is not None and len(collapsed) >= limit:
+            break
+    return collapsed
+
+
+def expand_doc_ids(ids, max_chunks=CHUNK_MAX_PER_DOC):
+    """Turns document ids into every chunk id they may own.
+
+    Deleting ids that don't exist is a no-op in the store, so this works without
+    knowing how many chunks a document really has.
+    """
+    expanded = []
+    for doc_id in ids:
+        expanded.append(doc_id)
+        if "#" not in doc_id:
+            expanded.extend(chunk_id(doc_id, i) for i in range(max_chunks))
+    return expanded
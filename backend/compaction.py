@@ -0,0 +1,194 @@
+import os
+import time
+
+import numpy as np
+
+import logger
+from chunking import chunk_id, expand_doc_ids
+
+
+# How often the background compaction runs (0 turns it off, POST /memories/compact still works)
+COMPACT_INTERVAL_S = float(os.getenv("COMPACT_INTERVAL_S", str(6 * 3600)))
+# Pages of one site whose documents (mean of their chunk vectors) are at least this similar are merged into the newest one
+COMPACT_SIMILARITY = float(os.getenv("COMPACT_SIMILARITY", "0.97"))
+# Keep at most this many memories, dropping the oldest (0 means no limit)
+COMPACT_MAX_MEMORIES = int(os.getenv("COMPACT_MAX_MEMORIES", "0"))
+# Only the newest pages of a very big site are compared, the similarity matrix is n^2
+COMPACT_GROUP_MAX = int(os.getenv("COMPACT_GROUP_MAX", "2000"))
+COMPACT_BATCH = 100
+
+
+def near_duplicate_clusters(vectors, ts, threshold=COMPACT_SIMILARITY):
+    """Groups rows whose cosine similarity to a newer row is at least threshold.
+
+    Greedy, newest first: each row not yet taken collects every free row that
+    is close enough to it. Returns [(keeper, [members])] for groups of two or
+    more, with keeper the newest row of its group.
+    """
+    v = np.asarray(vectors, dtype=np.float32)
+    v = v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+    sims = v @ v.T
+    free = np.ones(len(v), dtype=bool)
+    clusters = []
+    for i in np.argsort(-np.asarray(ts, dtype=np.float64), kind="stable"):
+        if not free[i]:
+            continue
+        free[i] = False
+        members = np.flatnonzero(free & (sims[i] >= threshold))
+        if len(members):
+            free[members] = False
+            clusters.append((int(i), members.tolist()))
+    return clusters
+
+
+class Compactor:
+    """One compaction pass over the store.
+
+    Drops memories older than max_age_s and the oldest ones beyond
+    max_memories, then collapses near-duplicate pages of the same site into
+    their newest copy, which keeps the visit count and first / last visit.
+    Pages are compared as a whole, by the mean of their chunk vectors. A page
+    stored again while the pass ran is left alone: its content hash no longer
+    matches the one that was compared.
+    Blocking: run it in a worker thread.
+    """
+
+    def __init__(self, store, similarity=COMPACT_SIMILARITY, max_memories=COMPACT_MAX_MEMORIES,
+                 max_age_s=None, group_max=COMPACT_GROUP_MAX, batch_size=COMPACT_BATCH):
+        self.store = store
+        self.similarity = similarity
+        self.max_memories = max_memories
+        self.max_age_s = max_age_s
+        self.group_max = group_max
+        self.batch_size = batch_size
+
+    def run(self, documents, domain_of):
+        """documents: (doc_id, ts, url) of every memory, newest first.
+
+        Returns a report; its "removed" list holds the document ids that are gone.
+        """
+        started = time.perf_counter()
+        report = {"scanned": len(documents), "expired": 0, "over_budget": 0, "merged": 0, "clusters": 0, "removed": []}
+
+        keep = documents
+        if self.max_age_s:
+            cutoff = time.time() - self.max_age_s
+            keep = [d for d in keep if d[1] >= cutoff]
+            report["expired"] = len(documents) - len(keep)
+        if self.max_memories and len(keep) > self.max_memories:
+            report["over_budget"] = len(keep) - self.max_memories
+            keep = keep[:self.max_memories]
+        kept = {d[0] for d in keep}
+        evicted = [d[0] for d in documents if d[0] not in kept]
+        for start in range(0, len(evicted), self.batch_size):
+            # Chunk counts aren't known here, delete every id a document may own
+            self.store.delete(expand_doc_ids(evicted[start:start + self.batch_size]))
+        report["removed"] += evicted
+
+        groups = {}
+        for doc_id, ts, url in keep:
+            groups.setdefault(domain_of(url or ""), []).append((doc_id, ts))
+        for docs in groups.values():
+            if len(docs) < 2:
+                continue
+            merged = self._collapse(docs[:self.group_max])
+            report["clusters"] += merged[0]
+            report["merged"] += len(merged[1])
+            report["removed"] += merged[1]
+
+        report["took_s"] = round(time.perf_counter() - started, 3)
+        logger.info("compaction", **{k: v for k, v in report.items() if k != "removed"})
+        return report
+
+    def _first_chunks(self, doc_ids):
+        """{doc_id: record of its first chunk}, records from before chunking are their own first chunk."""
+        found = {}
+        for start in range(0, len(doc_ids), self.batch_size):
+            batch = doc_ids[start:start + self.batch_size]
+            records = self.store.fetch([chunk_id(d, 0) for d in batch] + batch)
+            for doc_id in batch:
+                record = records.get(chunk_id(doc_id, 0)) or records.get(doc_id)
+                if record is not None:
+                    found[doc_id] = record
+        return found
+
+    def _documents(self, doc_ids):
+        """{doc_id: (metadata of its first chunk, mean of its normalized chunk vectors)}."""
+        first = self._first_chunks(doc_ids)
+        vectors = {doc_id: [record["values"]] for doc_id, record in first.items()}
+        rest = [
+            chunk_id(doc_id, c) for doc_id, record in first.items() if "doc_id" in record["metadata"]
+            for c in range(1, record["metadata"].get("chunks", 1))
+        ]
+        for start in range(0, len(rest), self.batch_size):
+            for record in self.store.fetch(rest[start:start + self.batch_size]).values():
+                vectors[record["metadata"]["doc_id"]].append(record["values"])
+        documents = {}
+        for doc_id, record in first.items():
+            v = np.asarray(vectors[doc_id], dtype=np.float32)
+            v = v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+            documents[doc_id] = (record["metadata"], v.mean(axis=0))
+        return documents
+
+    def _collapse(self, docs):
+        """Merges the near-duplicates among one site's documents. Returns (clusters, removed doc ids)."""
+        read = self._documents([doc_id for doc_id, _ in docs])
+        docs = [(doc_id, ts) for doc_id, ts in docs if doc_id in read]
+        if len(docs) < 2:
+            return 0, []
+        clusters = near_duplicate_clusters([read[doc_id][1] for doc_id, _ in docs], [ts for _, ts in docs], self.similarity)
+
+        n_clusters, removed = 0, []
+        for keeper, members in clusters:
+            keeper_id = docs[keeper][0]
+            # Compare-and-set: only pages still stored as they were read are merged. The store has no
+            # conditional write, so a revisit between this check and the delete can still be lost.
+            current = self._first_chunks([docs[i][0] for i in [keeper] + members])
+            unchanged = [
+                i for i in [keeper] + members
+                if docs[i][0] in current and same_version(current[docs[i][0]]["metadata"], read[docs[i][0]][0])
+            ]
+            if len(unchanged) < 2 or unchanged[0] != keeper:
+                continue
+            members = unchanged[1:]
+            cluster = [(read[docs[i][0]][0], docs[i][1]) for i in unchanged]
+            # Visit times are epoch seconds, like "ts"
+            visits = sum(meta.get("visits", 1) for meta, _ in cluster)
+            first_seen = min(meta.get("first_seen", ts) for meta, ts in cluster)
+            last_seen = max(meta.get("last_seen", ts) for meta, ts in cluster)
+
+            # Rewrite every chunk of the keeper with the merged visit history
+            keeper_meta = cluster[0][0]
+            n_chunks = keeper_meta.get("chunks", 1)
+            ids = [chunk_id(keeper_id, i) for i in range(n_chunks)] if "doc_id" in keeper_meta else [keeper_id]
+            records = list(self.store.fetch(ids).values())
+            expected = (keeper_meta.get("content_hash"), n_chunks)
+            if len(records) != len(ids) or any(
+                (record["metadata"].get("content_hash"), record["metadata"].get("chunks", 1)) != expected for record in records
+            ):
+                continue
+            for record in records:
+                record["metadata"].update({"visits": visits, "first_seen": first_seen, "last_seen": last_seen})
+            self.store.upsert(records)
+
+            stale = []
+            for i in members:
+                doc_id = docs[i][0]
+                meta = read[doc_id][0]
+                stale += [chunk_id(doc_id, c) for c in range(meta.get("chunks", 1))] if "doc_id" in meta else [doc_id]
+                removed.append(doc_id)
+            self.store.delete(stale)
+            n_clusters += 1
+        return n_clusters, removed
+
+
+def same_version(meta, other):
+    """Whether two chunk records belong to the same stored version of a page, by content hash and chunk count.
+
+    Records from before hashing are compared by their content.
+    """
+    if meta.get("chunks", 1) != other.get("chunks", 1):
+        return False
+    if meta.get("content_hash") or other.get("content_hash"):
+        return meta.get("content_hash") == other.get("content_hash")
+    return meta.get("content") == other.get("content")
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from generations import Generation
+
+
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+# Optional: keep seen hashes across restarts in a local SQLite file
+DEDUP_DB_PATH = os.getenv("DEDUP_DB_PATH", "")
+
+# Query params that only track where a click came from, never what the page is
+TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "igsh", "si", "feature", "ref", "ref_src", "pp"}
+# Chats show only their latest messages under one URL, so every capture of them is its own memory
+CHAT_PAGES = ("chatgpt.com/", "chat.openai.com/", "instagram.com/direct/")
+
+
+def normalize_url(url):
+    """Canonical form of a URL so the same page always maps to the same id."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host == "m.youtube.com":
+        host = "youtube.com"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    # "#/inbox" or "#!/inbox" is a route of a hash-routed app, any other fragment only scrolls
+    fragment = parts.fragment if parts.fragment.startswith(("/", "!")) else ""
+    return urlunsplit((parts.scheme.lower() or "https", host, path, urlencode(query), fragment))
+
+
+def content_hash(text):
+    # Whitespace-only changes (re-rendered DOM, trailing newlines) aren't new content
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def is_chat(url, kind=None):
+    return kind == "chat" or any(page in url for page in CHAT_PAGES)
+
+
+def doc_id_for(url, content=None, kind=None):
+    """Deterministic document id for a URL. Re-ingesting a page updates the same record.
+
+    A chat capture (kind "chat", or a URL in CHAT_PAGES) is keyed by its
+    content as well, so a later capture of the conversation doesn't overwrite
+    the messages of an earlier one.
+    """
+    key = normalize_url(url)
+    if content is not None and is_chat(key, kind):
+        key += "\n" + content_hash(content)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class SeenCache:
+    """Bounded LRU of doc_id -> (content hash, chunk count) for recently stored pages.
+
+    With several workers, pass a shared Generation: a delete in one worker then
+    empties the LRU of the others, so none of them calls a deleted page a duplicate.
+    """
+
+    def __init__(self, max_size=DEDUP_CACHE_SIZE, db_path=DEDUP_DB_PATH, generation=None):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self.generation = generation or Generation("seen")
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS seen ("
+                "doc_id TEXT PRIMARY KEY, content_hash TEXT, chunks INTEGER, last_seen REAL)"
+            )
+            self._db.commit()
+
+    def get(self, doc_id):
+        """Returns (content_hash, chunks) or None if this page wasn't seen recently."""
+        if self.generation.changed():
+            self._items.clear()
+        entry = self._items.get(doc_id)
+        if entry is not None:
+            self._items.move_to_end(doc_id)
+            self.hits += 1
+            return entry
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT content_hash, chunks FROM seen WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                self._remember(doc_id, (row[0], row[1]))
+                return self._items[doc_id]
+        self.misses += 1
+        return None
+
+    def put(self, doc_id, content_hash, chunks):
+        self._remember(doc_id, (content_hash, chunks))
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO seen VALUES (?, ?, ?, ?)",
+                (doc_id, content_hash, chunks, time.time()),
+            )
+            self._db.commit()
+
+    def discard(self, doc_ids):
+        for doc_id in doc_ids:
+            self._items.pop(doc_id, None)
+        if self._db is not None:
+            self._db.executemany("DELETE FROM seen WHERE doc_id = ?", [(d,) for d in doc_ids])
+            self._db.commit()
+        self.generation.bump()
+
+    def clear(self):
+        self._items.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM seen")
+            self._db.commit()
+        self.generation.bump()
+
+    def _remember(self, doc_id, entry):
+        self._items[doc_id] = entry
+        self._items.move_to_end(doc_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def stats(self):
+        return {"size": len(self._items), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Embedding server: one process owns the model and encodes for every HTTP worker.
+Workers send texts over a Unix socket, get raw float32 rows back, and requests
+from all of them share the same batches. Started by serve.py when WEB_WORKERS > 1.
+
+Usage: python embed_server.py [--socket /tmp/sentinel-embed.sock]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+import logger
+from embedding import EmbeddingBatcher, load_model
+from executors import ENCODE_TIMEOUT_S
+from reindex import current_index
+
+
+# HTTP workers encode through the server listening here. Unset, the process loads its own model.
+EMBED_SERVER_SOCKET = os.getenv("EMBED_SERVER_SOCKET", "")
+# How long a worker waits for the server to come up, it loads the model before listening
+EMBED_SERVER_WAIT_S = float(os.getenv("EMBED_SERVER_WAIT_S", "300"))
+DEFAULT_SOCKET = "/tmp/sentinel-embed.sock"
+
+# Wire format, integers are big-endian uint32:
+#   request:  count, total text bytes, count x text length, the utf-8 texts back to back.
+#             count == STATS_REQUEST asks for the server's stats instead.
+#   response: status, rows, dim, then rows x dim native float32 when status is OK,
+#             or status, 0, length, then a utf-8 message (ERROR) or JSON (STATS).
+_REQUEST = struct.Struct("!II")
+_RESPONSE = struct.Struct("!III")
+OK, ERROR, STATS = 0, 1, 2
+STATS_REQUEST = 0xFFFFFFFF
+
+
+class RemoteEncodeError(RuntimeError):
+    """The embedding server failed to encode a batch."""
+
+
+def _recv_exactly(sock, n):
+    buffer = bytearray(n)
+    view = memoryview(buffer)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:])
+        if not read:
+            raise ConnectionError("Embedding server closed the connection")
+        got += read
+    return buffer
+
+
+class EmbedServer:
+    """Serves model.encode over a Unix socket, batching requests from all connections together."""
+
+    def __init__(self, model, path, **batcher_options):
+        self.path = path
+        self.batcher = EmbeddingBatcher(model.encode, as_list=False, **batcher_options)
+        self.connections = 0
+        self.requests = 0
+
+    async def serve(self):
+        # A socket file left behind by a crashed server would make bind fail
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info("embed_server_listening", socket=self.path)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    count, total = _REQUEST.unpack(await reader.readexactly(_REQUEST.size))
+                except asyncio.IncompleteReadError:
+                    break  # the worker hung up
+                if count == STATS_REQUEST:
+                    self._reply_message(writer, STATS, json.dumps(self.stats()))
+                else:
+                    lengths = np.frombuffer(await reader.readexactly(4 * count), dtype=">u4")
+                    blob = await reader.readexactly(total)
+                    await self._encode(writer, _split(blob, lengths))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _encode(self, writer, texts):
+        self.requests += 1
+        try:
+            rows = await self.batcher.encode_many(texts)
+        except Exception as e:
+            logger.error("embed_server_encode_failed", texts=len(texts), error=str(e))
+            return self._reply_message(writer, ERROR, f"{type(e).__name__}: {e}")
+        vectors = np.ascontiguousarray(np.stack(rows), dtype=np.float32) if rows else np.zeros((0, 0), np.float32)
+        writer.write(_RESPONSE.pack(OK, *vectors.shape))
+        writer.write(memoryview(vectors).cast("B"))
+
+    def _reply_message(self, writer, status, message):
+        payload = message.encode("utf-8")
+        writer.write(_RESPONSE.pack(status, 0, len(payload)))
+        writer.write(payload)
+
+    def stats(self):
+        return {"connections": self.connections, "requests": self.requests, **self.batcher.stats()}
+
+
+def _split(blob, lengths):
+    texts, start = [], 0
+    for length in lengths.tolist():
+        texts.append(blob[start:start + length].decode("utf-8"))
+        start += length
+    return texts
+
+
+class RemoteEncoder:
+    """Stands in for the model in an HTTP worker: .encode(texts) asks the embedding server.
+
+    Blocking, like model.encode, so it runs in the encode pool. Every pool
+    thread keeps its own connection and reconnects after an error.
+    """
+
+    def __init__(self, path=EMBED_SERVER_SOCKET, timeout=ENCODE_TIMEOUT_S + 5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def wait_until_up(self, wait_s=EMBED_SERVER_WAIT_S):
+        """Blocks until the server accepts connections, OSError once wait_s runs out."""
+        deadline = time.monotonic() + wait_s
+        while True:
+            try:
+                self._connection()
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.2)
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _call(self, request):
+        # A connection that went stale (server restarted) fails on first use, retry once on a fresh one
+        for attempt in (0, 1):
+            sock = self._connection()
+            try:
+                sock.sendall(request)
+                status, rows, size = _RESPONSE.unpack(_recv_exactly(sock, _RESPONSE.size))
+                payload = _recv_exactly(sock, rows * size * 4 if status == OK else size)
+                return status, rows, size, payload
+            except OSError as e:
+                # Half a response may still be on the wire, this connection can't be reused
+                sock.close()
+                self._local.sock = None
+                if attempt or not isinstance(e, ConnectionError):
+                    raise
+
+    def encode(self, texts):
+        """One float32 row per text, viewed straight out of the received buffer."""
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.array([len(b) for b in encoded], dtype=">u4")
+        request = b"".join([_REQUEST.pack(len(encoded), int(lengths.sum())), lengths.tobytes(), *encoded])
+        status, rows, size, payload = self._call(request)
+        if status != OK:
+            raise RemoteEncodeError(payload.decode("utf-8"))
+        return np.frombuffer(payload, dtype=np.float32).reshape(rows, size)
+
+    def stats(self):
+        _, _, _, payload = self._call(_REQUEST.pack(STATS_REQUEST, 0))
+        return json.loads(payload.decode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves model.encode to the HTTP workers over a Unix socket")
+    parser.add_argument("--socket", default=EMBED_SERVER_SOCKET or DEFAULT_SOCKET)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    spec = current_index()
+    model = load_model(spec["backend"], spec["model"])
+    # Pay for lazy kernel / graph setup before the socket shows up, workers treat it as ready
+    model.encode(["warm up"])
+    logger.info("embed_server_model_loaded", took_s=round(time.perf_counter() - started, 3))
+    asyncio.run(EmbedServer(model, args.socket).serve())
+
+
+if __name__ == "__main__":
+    main()
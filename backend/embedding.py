@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import time
+import types
+
+import numpy as np
+
+import logger
+from executors import run_encode
+
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "torch" runs the model in PyTorch, "onnx" runs a dynamically int8-quantized ONNX export on CPU
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# The all-MiniLM-L6-v2 hub repo ships quantized exports for arm64, avx2, avx512 and avx512_vnni
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "onnx/model_quint8_avx2.onnx")
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", "onnx_models")
+
+# Tunables for the shared embedding engine. Bigger batches give better CPU
+# throughput, a longer wait gives bursts more time to fill a batch.
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+# Longest a bulk slice waits for queued request encodes to be picked up
+BULK_YIELD_MAX_S = 1.0
+
+
+def load_model(backend=EMBEDDING_BACKEND, name=EMBEDDING_MODEL):
+    """Loads the sentence embedding model. Every backend has the same .encode().
+
+    Only "torch" imports sentence-transformers (and so PyTorch). "onnx"
+    runs the export in onnxruntime, unless it has to be quantized locally
+    first, which needs PyTorch once.
+    """
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(name)
+    if backend == "onnx":
+        try:
+            return OnnxEncoder(name, ONNX_MODEL_FILE)
+        except Exception as e:
+            logger.warning("onnx_export_missing", file=ONNX_MODEL_FILE, model=name, error=str(e))
+        return _export_quantized_onnx(name)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+
+def _export_quantized_onnx(name):
+    target = os.path.join(ONNX_EXPORT_DIR, name.replace("/", "__"))
+    quantized = "onnx/model_qint8_avx2.onnx"
+    if not os.path.exists(os.path.join(target, quantized)):
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+        # Export to fp32 ONNX once, then quantize the weights to int8 next to it
+        fp32 = SentenceTransformer(name, backend="onnx")
+        fp32.save(target)
+        export_dynamic_quantized_onnx_model(fp32, "avx2", target)
+    return OnnxEncoder(target, quantized)
+
+
+class OnnxEncoder:
+    """A sentence-transformers model exported to ONNX, run with onnxruntime and tokenizers only.
+
+    name is a local model directory or a Hugging Face hub repo, file_name
+    the .onnx file in it. Pooling and normalization follow the model's
+    sentence-transformers config, so the vectors match the PyTorch ones.
+    """
+
+    def __init__(self, name, file_name):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        root = name if os.path.isdir(name) else self._download(name, file_name)
+        self.session = onnxruntime.InferenceSession(os.path.join(root, file_name), providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(root, "tokenizer.json"))
+        settings = self._config(root, "sentence_bert_config.json")
+        self._tokenizer.enable_truncation(int(settings.get("max_seq_length") or 512))
+        pad_token = self._config(root, "tokenizer_config.json").get("pad_token") or "[PAD]"
+        if isinstance(pad_token, dict):
+            pad_token = pad_token.get("content", "[PAD]")
+        self._tokenizer.enable_padding(pad_id=self._tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+        # Shaped like a transformers fast tokenizer, for chunking's span_tokenizer()
+        self.tokenizer = types.SimpleNamespace(backend_tokenizer=self._tokenizer)
+
+        pooling = self._config(root, "1_Pooling/config.json")
+        if pooling.get("pooling_mode_cls_token"):
+            self.pooling = "cls"
+        elif pooling.get("pooling_mode_max_tokens"):
+            self.pooling = "max"
+        else:
+            self.pooling = "mean"
+        modules = self._config(root, "modules.json") or []
+        self.normalize = any(m.get("type", "").endswith(".Normalize") for m in modules)
+
+    @staticmethod
+    def _download(name, file_name):
+        from huggingface_hub import snapshot_download
+
+        # Same short names as sentence-transformers, e.g. "all-MiniLM-L6-v2"
+        repo = name if "/" in name else f"sentence-transformers/{name}"
+        return snapshot_download(repo, allow_patterns=[
+            file_name, "tokenizer.json", "tokenizer_config.json", "sentence_bert_config.json",
+            "modules.json", "1_Pooling/config.json",
+        ])
+
+    @staticmethod
+    def _config(root, path):
+        try:
+            with open(os.path.join(root, path)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), 0), dtype=np.float32)
+        # Similar lengths together, so a batch pads little
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            vectors = self._encode_batch([texts[i] for i in rows])
+            if out.shape[1] == 0:
+                out = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[rows] = vectors
+        return out[0] if single else out
+
+    def _encode_batch(self, texts):
+        encodings = self._tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+        if self.pooling == "cls":
+            vectors = hidden[:, 0]
+        elif self.pooling == "max":
+            vectors = np.where(mask[:, :, None] > 0, hidden, -1e9).max(axis=1)
+        else:
+            weights = mask[:, :, None].astype(hidden.dtype)
+            vectors = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.astype(np.float32)
+
+
+class EmbeddingBatcher:
+    """Groups concurrent encode requests into a single model.encode call."""
+
+    def __init__(self, encode_fn, max_batch_size=EMBED_MAX_BATCH_SIZE, max_wait_ms=EMBED_MAX_WAIT_MS, as_list=True):
+        # encode_fn takes a list of strings and returns one vector per string
+        self.encode_fn = encode_fn
+        # False hands back the model's own rows (numpy) instead of lists of floats
+        self.as_list = as_list
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = None
+        self._worker = None
+
+        # Counters for tuning
+        self.batches = 0
+        self.items = 0
+        self.max_seen_batch = 0
+        self.batch_size_counts = {}
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_encode_time = 0.0
+
+    def _ensure_worker(self):
+        # The worker is bound to the loop that serves requests, so start it lazily
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def encode(self, text):
+        """Returns the embedding of one text as a list of floats."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def encode_many(self, texts):
+        """Returns one embedding per text. The texts share batches with everyone else."""
+        return list(await asyncio.gather(*(self.encode(t) for t in texts)))
+
+    async def encode_bulk(self, texts):
+        """Encodes a whole backlog, skipping the queue. For bulk jobs, not requests.
+
+        Goes in slices of max_batch_size and lets queued request encodes go
+        first between them, so a backlog flush never holds up a recall for
+        more than one slice.
+        """
+        texts = list(texts)
+        out = []
+        for start in range(0, len(texts), self.max_batch_size):
+            await self._yield_to_requests()
+            chunk = texts[start:start + self.max_batch_size]
+            started = time.perf_counter()
+            vectors = await self._encode_batch(chunk)
+            self.total_encode_time += time.perf_counter() - started
+            self.batches += 1
+            self.items += len(chunk)
+            self.max_seen_batch = max(self.max_seen_batch, len(chunk))
+            out.extend(self._output(v) for v in vectors)
+        return out
+
+    async def _yield_to_requests(self):
+        # Bounded, a steady stream of requests must not starve the backlog
+        deadline = time.perf_counter() + BULK_YIELD_MAX_S
+        while self._queue is not None and not self._queue.empty() and time.perf_counter() < deadline:
+            await asyncio.sleep(max(self.max_wait, 0.001))
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Still grab whatever is already waiting, it costs nothing
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                continue
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (cancelled) don't need a vector
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                wait = started - queued_at
+                self.total_queue_wait += wait
+                self.max_queue_wait = max(self.max_queue_wait, wait)
+
+            try:
+                vectors = await self._encode_batch([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.total_encode_time += time.perf_counter() - started
+
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+            self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(self._output(vector))
+
+    def _output(self, vector):
+        if not self.as_list:
+            return vector
+        return vector.tolist() if hasattr(vector, "tolist") else list(vector)
+
+    async def _encode_batch(self, texts):
+        # The model runs in the encode pool so the event loop keeps routing
+        return await run_encode(self.encode_fn, texts)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "max_batch_seen": self.max_seen_batch,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "avg_queue_wait_ms": (self.total_queue_wait / self.items * 1000.0) if self.items else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait * 1000.0,
+            "avg_encode_ms": (self.total_encode_time / self.batches * 1000.0) if self.batches else 0.0,
+        }
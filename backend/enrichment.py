@@ -0,0 +1,134 @@
+import asyncio
+import os
+from urllib.parse import urlsplit
+
+import logger
+from executors import run_in_pool, fetch_pool, FETCH_TIMEOUT_S
+
+
+# After a page is stored, transcripts / captions are fetched in the background
+# and the document is re-embedded with them. ENRICHMENT=0 turns this off.
+ENRICHMENT = os.getenv("ENRICHMENT", "1").lower() not in ("0", "false", "no")
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "4"))
+# Fetches in flight per host, so a burst of reels doesn't get us rate limited
+ENRICH_PER_HOST = int(os.getenv("ENRICH_PER_HOST", "2"))
+ENRICH_QUEUE_MAX = int(os.getenv("ENRICH_QUEUE_MAX", "1000"))
+
+
+class Enricher:
+    """Bounded pool of background workers that fetch extra text for stored documents.
+
+    fetcher_for(url) returns a no-argument blocking function that fetches the
+    text (None if there is nothing), or None if the URL has nothing to fetch.
+    apply(job, text) is awaited with every non-empty result.
+
+    A job is a dict with at least "id" and "url". Jobs for a document that is
+    already waiting are dropped, as are jobs that arrive when the queue is full.
+    """
+
+    def __init__(self, fetcher_for, apply, workers=ENRICH_WORKERS, per_host=ENRICH_PER_HOST,
+                 timeout=FETCH_TIMEOUT_S, max_queue=ENRICH_QUEUE_MAX, pool=fetch_pool):
+        self.fetcher_for = fetcher_for
+        self.apply = apply
+        self.workers = workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.pool = pool
+        self._queue = None
+        self._tasks = []
+        self._pending = set()
+        self._hosts = {}
+        self.in_flight = 0
+        self.enriched = 0
+        self.empty = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    def start(self):
+        # Created here so the queue belongs to the server's event loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job):
+        """Queues a job if its URL has something to fetch. Returns whether it was queued."""
+        if self._queue is None or self.fetcher_for(job["url"]) is None or job["id"] in self._pending:
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending.add(job["id"])
+        return True
+
+    async def join(self):
+        """Waits until every queued job has been handled."""
+        await self._queue.join()
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc.lower()
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._enrich(job)
+            finally:
+                self._pending.discard(job["id"])
+                self._queue.task_done()
+
+    async def _enrich(self, job):
+        fetch = self.fetcher_for(job["url"])
+        if fetch is None:
+            return
+        self.in_flight += 1
+        try:
+            async with self._host_limit(job["url"]):
+                text = await run_in_pool(self.pool, fetch, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning("enrich_timeout", id=job["id"], url=job["url"])
+            return
+        except Exception as e:
+            self.failed += 1
+            logger.warning("enrich_fetch_failed", id=job["id"], url=job["url"], error=str(e))
+            return
+        finally:
+            self.in_flight -= 1
+
+        if not text:
+            self.empty += 1
+            return
+        try:
+            await self.apply(job, text)
+            self.enriched += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning("enrich_store_failed", id=job["id"], error=str(e))
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight,
+            "enriched": self.enriched,
+            "empty": self.empty,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "dropped": self.dropped,
+        }
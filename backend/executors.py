@@ -0,0 +1,85 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# CPU-bound work (model.encode) and network-bound work (Pinecone) get their own
+# pools, so a slow vector store can never starve the encoder or the event loop.
+ENCODE_POOL_SIZE = int(os.getenv("ENCODE_POOL_SIZE", "1"))
+STORE_POOL_SIZE = int(os.getenv("STORE_POOL_SIZE", "8"))
+ENCODE_TIMEOUT_S = float(os.getenv("ENCODE_TIMEOUT_S", "30"))
+STORE_TIMEOUT_S = float(os.getenv("STORE_TIMEOUT_S", "15"))
+# Third-party fetches (YouTube transcripts, yt-dlp) are the slowest of all and get a pool of their own
+FETCH_POOL_SIZE = int(os.getenv("FETCH_POOL_SIZE", "4"))
+FETCH_TIMEOUT_S = float(os.getenv("FETCH_TIMEOUT_S", "20"))
+
+
+class TrackedPool(ThreadPoolExecutor):
+    """A ThreadPoolExecutor that counts its calls waiting for a thread and running, for the metrics."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+
+    def submit(self, fn, *args, **kwargs):
+        started = False
+
+        def run():
+            nonlocal started
+            with self._count_lock:
+                started = True
+                self.waiting -= 1
+                self.running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._count_lock:
+                    self.running -= 1
+
+        def done(future):
+            # Cancelled before a thread picked it up: run() never happened
+            with self._count_lock:
+                if not started:
+                    self.waiting -= 1
+
+        with self._count_lock:
+            self.waiting += 1
+        try:
+            future = super().submit(run)
+        except BaseException:
+            with self._count_lock:
+                self.waiting -= 1
+            raise
+        future.add_done_callback(done)
+        return future
+
+
+encode_pool = TrackedPool(max_workers=ENCODE_POOL_SIZE, thread_name_prefix="encode")
+store_pool = TrackedPool(max_workers=STORE_POOL_SIZE, thread_name_prefix="store")
+fetch_pool = TrackedPool(max_workers=FETCH_POOL_SIZE, thread_name_prefix="fetch")
+
+
+async def run_in_pool(pool, fn, *args, timeout=None, **kwargs):
+    """Runs a blocking call in the given pool and awaits it with an optional timeout.
+
+    On timeout asyncio.TimeoutError is raised. The thread itself can't be killed,
+    it finishes in the background and its result is dropped.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
+
+
+async def run_encode(fn, *args, **kwargs):
+    return await run_in_pool(encode_pool, fn, *args, timeout=ENCODE_TIMEOUT_S, **kwargs)
+
+
+async def run_store(fn, *args, **kwargs):
+    return await run_in_pool(store_pool, fn, *args, timeout=STORE_TIMEOUT_S, **kwargs)
+
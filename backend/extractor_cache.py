@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Transcripts and captions of a video don't change, so they are kept for a long time
+EXTRACTOR_CACHE_PATH = os.getenv("EXTRACTOR_CACHE_PATH", "extractor_cache.sqlite")
+EXTRACTOR_CACHE_TTL_S = float(os.getenv("EXTRACTOR_CACHE_TTL_S", str(30 * 24 * 3600)))
+# "No transcript" is remembered too, but for less long: captions can be added later
+EXTRACTOR_NEGATIVE_TTL_S = float(os.getenv("EXTRACTOR_NEGATIVE_TTL_S", str(6 * 3600)))
+EXTRACTOR_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTOR_CACHE_MAX_ENTRIES", "50000"))
+EXTRACTOR_CACHE_MAX_MB = float(os.getenv("EXTRACTOR_CACHE_MAX_MB", "256"))
+
+
+class ExtractorCache:
+    """Disk-backed TTL + LRU cache of extractor results, keyed by e.g. "youtube:<video id>".
+
+    An entry is {"text": str or None, "meta": dict}. A None text is a negative
+    entry: we asked and there was nothing to fetch. Size is bounded by entry
+    count and by total bytes, least recently used entries go first.
+    """
+
+    def __init__(self, path=EXTRACTOR_CACHE_PATH, ttl_s=EXTRACTOR_CACHE_TTL_S,
+                 negative_ttl_s=EXTRACTOR_NEGATIVE_TTL_S, max_entries=EXTRACTOR_CACHE_MAX_ENTRIES,
+                 max_bytes=int(EXTRACTOR_CACHE_MAX_MB * 1024 * 1024)):
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Extractors run in the fetch pool, several threads share this connection
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS extracted ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, negative INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS extracted_lru ON extracted (last_used)")
+        self._db.commit()
+        self._entries, self._bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extracted"
+        ).fetchone()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """The cached entry, or None if there is none (or it expired)."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, negative, size, expires_at FROM extracted WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, negative, size, expires_at = row
+            if expires_at <= now:
+                self._db.execute("DELETE FROM extracted WHERE key = ?", (key,))
+                self._db.commit()
+                self._entries -= 1
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE extracted SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        if negative:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return json.loads(value)
+
+    def put(self, key, text, meta=None):
+        """Stores a result. Pass text=None to remember that there was nothing."""
+        negative = text is None
+        value = json.dumps({"text": text, "meta": meta or {}})
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM extracted WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO extracted VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, int(negative), size, now + (self.negative_ttl_s if negative else self.ttl_s), now),
+            )
+            if old:
+                self._bytes -= old[0]
+            else:
+                self._entries += 1
+            self._bytes += size
+            self._evict()
+            self._db.commit()
+
+    def _over_budget(self):
+        # A single entry bigger than the byte budget is kept, it was just asked for
+        return self._entries > self.max_entries or (self._bytes > self.max_bytes and self._entries > 1)
+
+    def _evict(self):
+        while self._over_budget():
+            # Drop expired entries first, then the least recently used ones, in small steps
+            rows = self._db.execute(
+                "SELECT key, size FROM extracted ORDER BY expires_at > ?, last_used LIMIT 64", (time.time(),)
+            ).fetchall()
+            for key, size in rows:
+                if not self._over_budget():
+                    break
+                self._db.execute("DELETE FROM extracted WHERE key = ?", (key,))
+                self._entries -= 1
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM extracted")
+            self._db.commit()
+            self._entries, self._bytes = 0, 0
+
+    def stats(self):
+        return {
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
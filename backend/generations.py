@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import threading
+
+
+# With several workers, caches that have to forget deleted pages everywhere share counters in this file
+GENERATIONS_PATH = os.getenv("GENERATIONS_PATH", "generations.sqlite")
+
+
+class Generation:
+    """A counter the worker processes share, bumped when every copy of a cache must be dropped.
+
+    A cache bumps it when it forgets something and asks changed() before
+    answering from memory. changed() costs one PRAGMA while nobody else
+    wrote: data_version only moves when another connection committed.
+    Without a path it is a no-op, for a single process.
+    """
+
+    def __init__(self, name, path=None):
+        self.name = name
+        self._db = None
+        self._lock = threading.Lock()
+        if not path:
+            return
+        # Autocommit, and no fsync: after a crash every worker starts with empty caches anyway
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO generations VALUES (?, 0)", (name,))
+        self._value = self._read()
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read(self):
+        return self._db.execute("SELECT value FROM generations WHERE name = ?", (self.name,)).fetchone()[0]
+
+    def bump(self):
+        """Tells the other processes to drop their copy. The caller drops its own."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("UPDATE generations SET value = value + 1 WHERE name = ?", (self.name,))
+            value = self._read()
+            # Somebody else's bump in between still has to show up in changed()
+            if value == self._value + 1:
+                self._value = value
+
+    def changed(self):
+        """True once after another process bumped."""
+        if self._db is None:
+            return False
+        with self._lock:
+            version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return False
+            self._data_version = version
+            value = self._read()
+            if value == self._value:
+                return False
+            self._value = value
+            return True
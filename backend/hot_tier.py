@@ -0,0 +1,403 @@
+import heapq
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+import logger
+from chunking import chunk_id, doc_id_of
+from metrics import HOT_TIER_QUERIES
+from partitions import time_bounds
+from vector_store import VectorStore, _compare
+
+
+# Memory for the newest records kept in-process in front of Pinecone (0 turns the tier off)
+HOT_TIER_MB = float(os.getenv("HOT_TIER_MB", "64"))
+# "float16" or "int8" vectors, int8 is half the size and a little less precise
+HOT_TIER_DTYPE = os.getenv("HOT_TIER_DTYPE", "float16")
+# The tier answers alone when it has hits at least this similar in HOT_TIER_MIN_HITS documents
+HOT_TIER_MIN_SCORE = float(os.getenv("HOT_TIER_MIN_SCORE", "0.5"))
+HOT_TIER_MIN_HITS = int(os.getenv("HOT_TIER_MIN_HITS", "5"))
+HOT_TIER_WARM_BATCH = 100
+
+# Rough size of a HotRecord and its strings beyond the text itself
+_RECORD_OVERHEAD = 300
+# Eviction frees a bit more than needed so it doesn't run on every upsert
+_EVICT_TO = 0.9
+
+
+class HotRecord:
+    """Metadata of one record in the hot tier, in slots instead of a dict."""
+
+    __slots__ = ("id", "doc_id", "chunk", "chunks", "title", "url", "content", "content_hash",
+                 "timestamp", "platform", "domain", "ts", "extra", "nbytes")
+    FIELDS = ("doc_id", "chunk", "chunks", "title", "url", "content", "content_hash",
+              "timestamp", "platform", "domain", "ts")
+
+    def __init__(self, vid, metadata):
+        self.id = vid
+        rest = dict(metadata)
+        for field in self.FIELDS:
+            setattr(self, field, rest.pop(field, None))
+        # Anything we don't have a slot for (visits, first_seen, ...)
+        self.extra = rest or None
+        self.nbytes = _RECORD_OVERHEAD + len(vid) + sum(
+            len(getattr(self, field)) for field in ("title", "url", "content", "timestamp") if isinstance(getattr(self, field), str)
+        ) + (len(json.dumps(rest)) if rest else 0)
+
+    def get(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self.extra.get(key) if self.extra else None
+
+    def metadata(self):
+        meta = {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+        if self.extra:
+            meta.update(self.extra)
+        return meta
+
+
+class HotTier:
+    """The newest records, held in memory and searched with one matmul.
+
+    Vectors are unit-normalized rows of one contiguous float16 or int8 array
+    (int8 scaled by 127). When records take more than max_bytes the oldest
+    are evicted. covered_since is the "ts" above which every stored record
+    is known to be here: infinite until warm() has run, raised by evictions.
+    """
+
+    INITIAL_CAPACITY = 1024
+    INT8_SCALE = 127.0
+
+    def __init__(self, max_bytes=int(HOT_TIER_MB * 1024 * 1024), dtype=HOT_TIER_DTYPE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unknown HOT_TIER_DTYPE: {dtype}")
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._warmed = False
+        self._warm_cutoff = math.inf
+        self._deleted_while_warming = None
+        self._reset()
+
+    def _reset(self):
+        self.dimension = None
+        self.nbytes = 0
+        self._vectors = None
+        self._records = []
+        self._slots = {}
+        self._free = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._ts = np.zeros(0, dtype=np.float64)
+        self._platform = np.zeros(0, dtype=object)
+        self._domain = np.zeros(0, dtype=object)
+        self._evicted_max_ts = -math.inf
+
+    @property
+    def covered_since(self):
+        if not self._warmed:
+            return math.inf
+        return max(self._warm_cutoff, self._evicted_max_ts)
+
+    def __len__(self):
+        return len(self._slots)
+
+    # --- storage ---
+
+    def _grow(self, capacity):
+        grow = capacity - len(self._alive)
+        vectors = np.zeros((capacity, self.dimension), dtype=self.dtype)
+        if self._vectors is not None:
+            vectors[:len(self._vectors)] = self._vectors
+        self._vectors = vectors
+        self._records.extend([None] * grow)
+        self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+        self._ts = np.concatenate([self._ts, np.full(grow, np.nan)])
+        self._platform = np.concatenate([self._platform, np.full(grow, None, dtype=object)])
+        self._domain = np.concatenate([self._domain, np.full(grow, None, dtype=object)])
+        self._free = list(range(capacity - 1, capacity - grow - 1, -1)) + self._free
+
+    def _encode(self, values):
+        v = np.asarray(values, dtype=np.float32)
+        v = v / np.maximum(np.linalg.norm(v, axis=-1, keepdims=True), 1e-12)
+        if self.dtype == np.int8:
+            return np.round(v * self.INT8_SCALE).astype(np.int8)
+        return v.astype(np.float16)
+
+    def _row_bytes(self):
+        return self.dimension * self.dtype.itemsize
+
+    def _remove(self, slot):
+        record = self._records[slot]
+        del self._slots[record.id]
+        self._records[slot] = None
+        self._alive[slot] = False
+        self._ts[slot] = np.nan
+        self._platform[slot] = self._domain[slot] = None
+        self._free.append(slot)
+        self.nbytes -= record.nbytes + self._row_bytes()
+
+    def _evict(self):
+        if self.nbytes <= self.max_bytes:
+            return
+        alive = np.flatnonzero(self._alive)
+        # Oldest first, undated records before everything else
+        order = alive[np.argsort(np.nan_to_num(self._ts[alive], nan=-np.inf), kind="stable")]
+        target = self.max_bytes * _EVICT_TO
+        evicted = 0
+        for slot in order:
+            if self.nbytes <= target:
+                break
+            ts = self._ts[slot]
+            if ts == ts:
+                self._evicted_max_ts = max(self._evicted_max_ts, float(ts))
+            self._remove(slot)
+            evicted += 1
+        self.evictions += evicted
+        logger.debug("hot_tier_evicted", records=evicted, covered_since=self.covered_since)
+
+    # --- records ---
+
+    def upsert(self, vectors, only_new=False):
+        """Adds or replaces records. only_new skips ids already here or deleted during warm-up."""
+        if not vectors or self.max_bytes <= 0:
+            return
+        with self._lock:
+            if only_new:
+                skip = self._deleted_while_warming or ()
+                vectors = [r for r in vectors if r["id"] not in self._slots and r["id"] not in skip]
+                if not vectors:
+                    return
+            if self.dimension is None:
+                self.dimension = len(vectors[0]["values"])
+            rows = self._encode([r["values"] for r in vectors])
+            for record, row in zip(vectors, rows):
+                slot = self._slots.get(record["id"])
+                if slot is not None:
+                    self._remove(slot)
+                if not self._free:
+                    self._grow(max(self.INITIAL_CAPACITY, len(self._alive) * 2))
+                slot = self._free.pop()
+                hot = HotRecord(record["id"], record.get("metadata") or {})
+                self._slots[hot.id] = slot
+                self._records[slot] = hot
+                self._vectors[slot] = row
+                self._alive[slot] = True
+                self._ts[slot] = float(hot.ts) if isinstance(hot.ts, (int, float)) else np.nan
+                self._platform[slot] = hot.platform
+                self._domain[slot] = hot.domain
+                self.nbytes += hot.nbytes + self._row_bytes()
+            self._evict()
+
+    def delete(self, ids):
+        with self._lock:
+            for vid in ids:
+                if self._deleted_while_warming is not None:
+                    self._deleted_while_warming.add(vid)
+                slot = self._slots.get(vid)
+                if slot is not None:
+                    self._remove(slot)
+
+    def clear(self):
+        """Empties the tier. The store is empty too, so everything from now on is covered."""
+        with self._lock:
+            self._reset()
+            self._deleted_while_warming = None
+            self._warmed = True
+            self._warm_cutoff = -math.inf
+
+    def start_warm(self):
+        with self._lock:
+            self._deleted_while_warming = set()
+
+    def finish_warm(self, cutoff):
+        """Every record newer than cutoff has been loaded (or upserted since)."""
+        with self._lock:
+            self._deleted_while_warming = None
+            self._warmed = True
+            self._warm_cutoff = cutoff
+
+    def abort_warm(self):
+        with self._lock:
+            self._deleted_while_warming = None
+
+    def nearly_full(self):
+        return self.nbytes >= self.max_bytes * _EVICT_TO
+
+    # --- search ---
+
+    def _filter_mask(self, filter, n):
+        mask = np.ones(n, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._filter_mask(sub, n)
+                continue
+            if key == "$or":
+                any_mask = np.zeros(n, dtype=bool)
+                for sub in condition:
+                    any_mask |= self._filter_mask(sub, n)
+                mask &= any_mask
+                continue
+            columns = {"ts": self._ts, "platform": self._platform, "domain": self._domain}
+            if key in columns:
+                values = columns[key][:n]
+            else:
+                values = np.array([r.get(key) if r else None for r in self._records[:n]], dtype=object)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                mask &= _compare(values, op, operand)
+        return mask
+
+    def search(self, vector, top_k=5, filter=None):
+        """Pinecone-style matches, best first. Scores come from the compressed vectors."""
+        with self._lock:
+            if not self._slots:
+                return []
+            q = np.asarray(vector, dtype=np.float32)
+            q = q / max(float(np.linalg.norm(q)), 1e-12)
+            n = int(np.flatnonzero(self._alive)[-1]) + 1
+            candidates = self._alive[:n].copy()
+            if filter:
+                candidates &= self._filter_mask(filter, n)
+            rows = np.flatnonzero(candidates)
+            if len(rows) == 0:
+                return []
+            block = self._vectors[:n] if len(rows) == n else self._vectors[rows]
+            scores = block.astype(np.float32) @ q
+            if self.dtype == np.int8:
+                scores /= self.INT8_SCALE
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": self._records[rows[i]].id, "score": float(scores[i]), "metadata": self._records[rows[i]].metadata()}
+                for i in top
+            ]
+
+    def stats(self):
+        return {
+            "records": len(self._slots),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "dtype": self.dtype.name,
+            "evictions": self.evictions,
+            # None: nothing is known to be complete, 0: every dated record is here
+            "covered_since": None if self.covered_since == math.inf else max(self.covered_since, 0.0),
+            "warmed": self._warmed,
+            "queries": {outcome: HOT_TIER_QUERIES.value(outcome=outcome) for outcome in ("covered", "hot", "merged")},
+        }
+
+
+class TieredStore(VectorStore):
+    """A remote store with a HotTier of its newest records in front.
+
+    Writes go to both. A query is answered by the tier alone when its time
+    filter lies entirely within what the tier covers, or when matches
+    scoring at least min_score come from min_hits distinct documents (or
+    as many as the caller keeps, see query). Otherwise the remote index is
+    queried too and the two are merged by id, which also covers records the
+    remote index hasn't made searchable yet.
+    """
+
+    def __init__(self, remote, hot, min_score=HOT_TIER_MIN_SCORE, min_hits=HOT_TIER_MIN_HITS):
+        self.remote = remote
+        self.hot = hot
+        self.min_score = min_score
+        self.min_hits = min_hits
+
+    def __getattr__(self, name):
+        # stats(), namespaces() ... of the remote store. drop_before only exists if the remote has it.
+        if name == "drop_before" and hasattr(self.remote, "drop_before"):
+            return self._drop_before
+        return getattr(self.remote, name)
+
+    def warm(self, documents, batch_size=HOT_TIER_WARM_BATCH):
+        """Loads the newest memories from the remote store until the tier is nearly full.
+
+        documents: (doc_id, ts, url) of every memory, newest first, e.g.
+        MemoryIndex.documents(). Blocking: run it in a worker thread.
+        """
+        if not documents:
+            return  # can't tell an empty store from a missing index, stay uncovered
+        self.hot.start_warm()
+        cutoff = -math.inf
+        try:
+            for start in range(0, len(documents), batch_size):
+                if self.hot.nearly_full():
+                    cutoff = documents[start][1]
+                    break
+                batch = [doc_id for doc_id, _, _ in documents[start:start + batch_size]]
+                first = self.remote.fetch([chunk_id(d, 0) for d in batch] + batch)
+                rest = [
+                    chunk_id(record["metadata"]["doc_id"], i)
+                    for record in first.values() if "doc_id" in (record.get("metadata") or {})
+                    for i in range(1, record["metadata"].get("chunks", 1))
+                ]
+                records = list(first.values())
+                for offset in range(0, len(rest), batch_size):
+                    records += self.remote.fetch(rest[offset:offset + batch_size]).values()
+                self.hot.upsert(records, only_new=True)
+        except Exception:
+            # What was loaded stays, but without a cutoff the tier claims no coverage
+            self.hot.abort_warm()
+            raise
+        self.hot.finish_warm(cutoff)
+        logger.info("hot_tier_warmed", **{k: v for k, v in self.hot.stats().items() if k != "queries"})
+
+    # --- VectorStore ---
+
+    def upsert(self, vectors):
+        self.remote.upsert(vectors)
+        self.hot.upsert(vectors)
+
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None, documents=None):
+        """documents: how many distinct documents the caller keeps from top_k chunk hits (default top_k)."""
+        if include_values:
+            return self.remote.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                                     include_values=include_values, filter=filter)
+        hits = self.hot.search(vector, top_k, filter)
+        low, _ = time_bounds(filter)
+        if low is not None and low > self.hot.covered_since:
+            outcome = "covered"
+        elif len({doc_id_of(hit) for hit in hits if hit["score"] >= self.min_score}) >= min(self.min_hits, documents or top_k):
+            outcome = "hot"
+        else:
+            outcome = "merged"
+            remote = self.remote.query(vector=vector, top_k=top_k, include_metadata=True, filter=filter)["matches"]
+            # The remote score is exact, keep its copy of a record found in both
+            merged = {hit["id"]: hit for hit in hits}
+            merged.update((match["id"], match) for match in remote)
+            hits = heapq.nlargest(top_k, merged.values(), key=lambda m: m["score"])
+        HOT_TIER_QUERIES.inc(outcome=outcome)
+        if not include_metadata:
+            hits = [{"id": hit["id"], "score": hit["score"]} for hit in hits]
+        return {"matches": hits}
+
+    def fetch(self, ids):
+        return self.remote.fetch(ids)
+
+    def list(self):
+        return self.remote.list()
+
+    def delete(self, ids):
+        ids = list(ids)
+        self.remote.delete(ids)
+        self.hot.delete(ids)
+
+    def delete_all(self):
+        self.remote.delete_all()
+        self.hot.clear()
+
+    def drop(self):
+        self.remote.drop()
+        self.hot.clear()
+
+    def _drop_before(self, cutoff_ts):
+        dropped = self.remote.drop_before(cutoff_ts)
+        self.hot.delete(dropped)
+        return dropped
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import logger
+
+
+# Durable journal of accepted-but-not-yet-stored ingests (SQLite in WAL mode)
+INGEST_JOURNAL_PATH = os.getenv("INGEST_JOURNAL_PATH", "ingest_journal.sqlite")
+INGEST_DRAIN_BATCH = int(os.getenv("INGEST_DRAIN_BATCH", "64"))
+INGEST_RETRY_BASE_S = float(os.getenv("INGEST_RETRY_BASE_S", "1"))
+INGEST_RETRY_MAX_S = float(os.getenv("INGEST_RETRY_MAX_S", "300"))
+# After this many failed attempts a record is parked as dead instead of retried forever
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "20"))
+INGEST_POLL_S = 1.0
+# How stale the cached depth may get before it is re-read (other workers append too)
+DEPTH_REFRESH_S = 0.5
+
+
+def retry_delay(attempts, base=INGEST_RETRY_BASE_S, cap=INGEST_RETRY_MAX_S):
+    """Exponential backoff with jitter, so a recovering store isn't hit by every retry at once."""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class IngestJournal:
+    """Append-only queue of ingest payloads that survives restarts.
+
+    Every append is fsynced before we answer the client. A background worker
+    drains due entries in batches and removes them only after they are stored,
+    so delivery is at-least-once. Ids are derived from the URL, which makes a
+    replayed entry an idempotent overwrite. An entry still waiting when a newer
+    one for the same document arrives is dropped, so a retry never writes an
+    older version over a newer one.
+    """
+
+    def __init__(self, path=INGEST_JOURNAL_PATH):
+        self._lock = threading.Lock()
+        # One writer thread keeps the fsync off the event loop and serializes access
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT NOT NULL, payload TEXT NOT NULL, "
+            "enqueued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, last_error TEXT, dead INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS journal_due ON journal (dead, next_attempt_at, seq)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS journal_doc ON journal (doc_id, seq)")
+        self._db.commit()
+        self._wake = None
+        # Depth and oldest entry as last counted, read by metrics and admission without touching SQLite
+        self._depth = 0
+        self._oldest = None
+        self._counted_at = -float("inf")
+        self._counting = False
+        self._count()
+        self.stored = 0
+        self.failed_attempts = 0
+        self.last_error = None
+        self.worker_running = False
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    # --- blocking SQLite work, run in the journal thread ---
+
+    def _append(self, doc_id, payload):
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO journal (doc_id, payload, enqueued_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (doc_id, json.dumps(payload), now, now),
+            )
+            self._db.commit()
+            self._depth += 1
+            if self._oldest is None:
+                self._oldest = now
+            return cur.lastrowid
+
+    def _due(self, limit):
+        with self._lock:
+            superseded = self._db.execute(
+                "DELETE FROM journal WHERE dead = 0 AND EXISTS "
+                "(SELECT 1 FROM journal AS newer WHERE newer.doc_id = journal.doc_id AND newer.seq > journal.seq)"
+            ).rowcount
+            if superseded:
+                self._db.commit()
+                self._depth = max(0, self._depth - superseded)
+            rows = self._db.execute(
+                "SELECT seq, payload, attempts FROM journal WHERE dead = 0 AND next_attempt_at <= ? "
+                "ORDER BY seq LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        return [(seq, json.loads(payload), attempts) for seq, payload, attempts in rows]
+
+    def _finish(self, done, failed):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("DELETE FROM journal WHERE seq = ?", [(seq,) for seq in done])
+            for seq, (attempts, error) in failed.items():
+                attempts += 1
+                dead = 1 if INGEST_MAX_ATTEMPTS and attempts >= INGEST_MAX_ATTEMPTS else 0
+                self._db.execute(
+                    "UPDATE journal SET attempts = ?, next_attempt_at = ?, last_error = ?, dead = ? WHERE seq = ?",
+                    (attempts, now + retry_delay(attempts, INGEST_RETRY_BASE_S, INGEST_RETRY_MAX_S), error[:500], dead, seq),
+                )
+                self._depth -= dead
+            self._db.commit()
+            self._depth = max(0, self._depth - len(done))
+            if not self._depth:
+                self._oldest = None
+
+    def _clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM journal")
+            self._db.commit()
+            self._depth, self._oldest = 0, None
+
+    def _discard(self, doc_ids):
+        with self._lock:
+            params = [(doc_id,) for doc_id in doc_ids]
+            removed = self._db.executemany("DELETE FROM journal WHERE doc_id = ? AND dead = 0", params).rowcount
+            self._db.executemany("DELETE FROM journal WHERE doc_id = ? AND dead = 1", params)
+            self._db.commit()
+            self._depth = max(0, self._depth - removed)
+        return removed
+
+    def _count(self):
+        try:
+            with self._lock:
+                self._depth, self._oldest = self._db.execute(
+                    "SELECT COUNT(*), MIN(enqueued_at) FROM journal WHERE dead = 0"
+                ).fetchone()
+                self._counted_at = time.monotonic()
+        finally:
+            self._counting = False
+
+    def depth(self):
+        """Entries waiting, without blocking: the cached count, re-read in the journal thread once stale."""
+        if not self._counting and time.monotonic() - self._counted_at >= DEPTH_REFRESH_S:
+            self._counting = True
+            self._pool.submit(self._count)
+        return self._depth
+
+    def lag(self):
+        """Age of the oldest waiting entry as last counted, like depth()."""
+        self.depth()
+        oldest = self._oldest
+        return round(time.time() - oldest, 3) if oldest else 0.0
+
+    def snapshot(self):
+        """Depth, age of the oldest entry, entries being retried and dead entries."""
+        with self._lock:
+            depth, oldest, retrying = self._db.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), SUM(attempts > 0) FROM journal WHERE dead = 0"
+            ).fetchone()
+            dead = self._db.execute("SELECT COUNT(*) FROM journal WHERE dead = 1").fetchone()[0]
+        return {
+            "depth": depth,
+            "lag_s": round(time.time() - oldest, 3) if oldest else 0.0,
+            "retrying": retrying or 0,
+            "dead": dead,
+        }
+
+    # --- async API ---
+
+    async def append(self, doc_id, payload):
+        """Durably stores one payload. Returns its sequence number."""
+        seq = await self._call(self._append, doc_id, payload)
+        if self._wake is not None:
+            self._wake.set()
+        return seq
+
+    async def clear(self):
+        """Drops everything still waiting, e.g. after the store was wiped."""
+        await self._call(self._clear)
+
+    async def discard(self, doc_ids):
+        """Drops what is still waiting for these documents, so a deleted page isn't stored again. Returns how many."""
+        doc_ids = list(doc_ids)
+        return await self._call(self._discard, doc_ids) if doc_ids else 0
+
+    async def status(self):
+        status = await self._call(self.snapshot)
+        status.update({
+            "worker_running": self.worker_running,
+            "stored": self.stored,
+            "failed_attempts": self.failed_attempts,
+            "last_error": self.last_error,
+        })
+        return status
+
+    async def run(self, process, batch_size=INGEST_DRAIN_BATCH):
+        """Drains the journal forever.
+
+        process(payloads) gets a list of payload dicts and returns one error
+        string (or None on success) per payload.
+        """
+        self._wake = asyncio.Event()
+        self.worker_running = True
+        try:
+            while True:
+                jobs = await self._call(self._due, batch_size)
+                if not jobs:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), INGEST_POLL_S)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                try:
+                    errors = await process([payload for _, payload, _ in jobs])
+                except Exception as e:
+                    errors = [f"{type(e).__name__}: {e}"] * len(jobs)
+
+                done = [seq for (seq, _, _), error in zip(jobs, errors) if error is None]
+                failed = {seq: (attempts, error) for (seq, _, attempts), error in zip(jobs, errors) if error is not None}
+                await self._call(self._finish, done, failed)
+                self.stored += len(done)
+                if failed:
+                    self.failed_attempts += len(failed)
+                    self.last_error = next(iter(failed.values()))[1]
+                    logger.warning("ingest_retry", failed=len(failed), error=self.last_error)
+                    if not done:
+                        # Everything failed, likely the store is down: back off before polling again
+                        await asyncio.sleep(min(INGEST_RETRY_MAX_S, INGEST_RETRY_BASE_S))
+        finally:
+            self.worker_running = False
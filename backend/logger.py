@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+import random
+import sys
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of per-request debug/info events that get logged. Warnings and errors always are.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_logger = logging.getLogger("sentinel")
+if not _logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    _logger.addHandler(handler)
+    _logger.setLevel(LOG_LEVEL)
+    _logger.propagate = False
+
+
+def log_event(level, event, sampled=False, exc_info=False, **fields):
+    """Logs one JSON line {"ts", "level", "event", **fields}.
+
+    sampled=True marks high-volume per-request events, only LOG_SAMPLE_RATE of them are kept.
+    """
+    if not _logger.isEnabledFor(level):
+        return
+    if sampled and level < logging.WARNING and LOG_SAMPLE_RATE < 1.0 and random.random() >= LOG_SAMPLE_RATE:
+        return
+    _logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+def debug(event, **fields):
+    log_event(logging.DEBUG, event, sampled=True, **fields)
+
+
+def info(event, sampled=False, **fields):
+    log_event(logging.INFO, event, sampled=sampled, **fields)
+
+
+def warning(event, **fields):
+    log_event(logging.WARNING, event, **fields)
+
+
+def error(event, exc_info=False, **fields):
+    log_event(logging.ERROR, event, exc_info=exc_info, **fields)
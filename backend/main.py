@@ -1,17 +1,48 @@
+from readiness import Readiness  # first, so import time is measured from here
+import logger
 import os
+import asyncio
+import itertools
+import json
+import re
+import time
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
-from youtube_transcript_api import YouTubeTranscriptApi
-import yt_dlp
-import uuid
 from datetime import datetime
+from typing import Optional, Union
+from urllib.parse import urlsplit
+from embedding import EmbeddingBatcher, load_model
+from embed_server import RemoteEncoder, EMBED_SERVER_SOCKET
+from serve import runs_background_jobs, WEB_WORKERS
+from executors import run_store, run_in_pool, encode_pool, store_pool
+from chunking import chunk_text, span_tokenizer, is_uncased, chunk_id, join_chunks, doc_id_of, parent_of, collapse_matches, expand_doc_ids
+from dedup import SeenCache, content_hash, doc_id_for
+from query_cache import QueryCache, normalize_query, QUERY_RESULT_TTL_S
+from generations import Generation, GENERATIONS_PATH
+from vector_store import with_hot_tier
+from memory_index import MemoryIndex, LIST_DEFAULT_LIMIT, parse_timestamp
+from ingest_queue import IngestJournal
+from enrichment import Enricher, ENRICHMENT
+from extractor_cache import ExtractorCache
+from compaction import Compactor, COMPACT_INTERVAL_S
+from hot_tier import TieredStore
+from reindex import Reindexer, SwapGuard, current_index, read_active, target_index, open_store, model_pool, switch_reads, mark_caught_up
+from snippets import make_snippet
+from compression import CompressionMiddleware
+from admission import Admission, AdmissionMiddleware
+from responses import FastJSONResponse
+from metrics import registry, REQUESTS, REQUEST_ERRORS, REQUEST_SECONDS, STAGE_SECONDS, INPUT_CHARS
 
 app = FastAPI()
 
+# Per-client rate limits, recall before ingest, and ingest shedding under backlog.
+# Inside CORS so the extension can read the 429s. See ADMIT_CONCURRENCY and friends.
+admission = Admission(backlog=lambda: ingest_backlog())
+app.add_middleware(AdmissionMiddleware, admission=admission)
+
 # 1. CORS - Allow your extension to talk to this server
 app.add_middleware(
     CORSMiddleware,
@@ -19,40 +50,180 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Large /recall and /memories bodies go out as br / gzip, see COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
 
-# 2. Setup Pinecone (Cloud Database)
-# We expect these secrets to be set in your Cloud Environment variables
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY") 
-if not PINECONE_API_KEY:
-    print("WARNING: Pinecone API Key not found. App will crash on request if not set.")
+# 2. Setup the Vector Store
+# VECTOR_STORE=pinecone uses the cloud index (needs PINECONE_API_KEY),
+# VECTOR_STORE=local keeps everything in a memory-mapped file on this machine.
+# Without a Pinecone key we default to local so the app still works offline.
+# 3. Setup Embedding Model
+# EMBEDDING_BACKEND=onnx swaps PyTorch for an int8-quantized ONNX copy of the same model
+# With EMBED_SERVER_SOCKET set (serve.py, WEB_WORKERS > 1) the model lives in the
+# embedding server and this worker only forwards its batches there.
+#
+# Both are loaded by the warm-up task below, after the server is already listening,
+# so cold starts don't hold port 7860 closed while torch loads.
+store = None
+model = None
+# Held by every encode + upsert, so a re-index never swaps model and store between the two
+swap_guard = SwapGuard()
+# Length of the model's vectors, known after the warm-up encode; imported vectors must match it
+embedding_dim = None
+# Copy of the model's tokenizer that chunk_text counts with (None encoding through the embedding server)
+chunk_tokenizer = None
+# Queries differing only in case share a cache entry when the model can't tell them apart
+query_casefold = False
+readiness = Readiness()
 
-# Initialize Pinecone only if key is present to avoid immediate crash on local start without key
-if PINECONE_API_KEY:
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index("sentinel-memory")
-else:
-    index = None
+# All request paths share one batcher so bursts turn into a single encode call
+# Tune with EMBED_MAX_BATCH_SIZE / EMBED_MAX_WAIT_MS
+embedder = EmbeddingBatcher(lambda texts: model.encode(texts))
 
-# 3. Setup Embedding Model
-# We load this once when the server starts. 
-# Note: On free cloud tiers, this might be slow.
-model = SentenceTransformer('all-MiniLM-L6-v2')
+async def ensure_ready():
+    """Waits (up to READY_WAIT_S) for warm-up, 503 if the model or store isn't usable yet."""
+    if not await readiness.wait():
+        detail = f"Warm-up failed: {readiness.error}" if readiness.error else "Warming up, try again shortly"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    if not store:
+         raise HTTPException(status_code=500, detail="Pinecone API Key not configured")
+
+async def embed(text):
+    """Encodes one text through the shared batcher, 504 if the encoder is stuck."""
+    try:
+        return await embedder.encode(text)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Embedding timed out")
+
+async def embed_many(texts):
+    try:
+        return await embedder.encode_many(texts)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Embedding timed out")
+
+async def store_call(fn, *args, **kwargs):
+    """Runs a blocking vector-store call in the store pool, 504 on timeout."""
+    try:
+        return await run_store(fn, *args, **kwargs)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Vector store timed out")
+
+DUPLICATES = registry.counter("sentinel_ingest_duplicates_total", "Ingests skipped because the page was already stored")
+TRUNCATED = registry.counter("sentinel_ingest_truncated_total", "Pages cut off at CHUNK_MAX_PER_DOC chunks")
+registry.gauge("sentinel_queue_depth", "Work waiting for the embedding batcher, the thread pools and admission", lambda: {
+    "embed_batcher": embedder.stats()["queue_depth"],
+    "encode_pool": encode_pool.waiting,
+    "store_pool": store_pool.waiting,
+    "ingest_journal": ingest_journal.depth(),
+    "enrichment": enricher.stats()["queued"],
+    "admission_recall": admission.gate.waiting("recall"),
+    "admission_ingest": admission.gate.waiting("ingest"),
+})
+
+def ingest_backlog():
+    """Accepted ingest work not stored yet: journal entries plus queued encodes and store calls."""
+    return (ingest_journal.depth() + embedder.stats()["queue_depth"]
+            + encode_pool.waiting + store_pool.waiting)
+
+registry.gauge("sentinel_hot_tier_bytes", "Memory held by the in-process tier of recent records",
+               lambda: store.hot.nbytes if isinstance(store, TieredStore) else 0)
+registry.gauge("sentinel_ingest_lag_seconds", "Age of the oldest ingest still waiting in the journal",
+               lambda: ingest_journal.lag())
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw path, to keep the series count small
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUESTS.inc(path=path, method=request.method, status=status)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, path=path)
+        # A 503 from the readiness probe during warm-up is its job, not an error
+        if status >= 500 and path != "/readyz":
+            REQUEST_ERRORS.inc(path=path)
+            logger.warning("request_failed", path=path, method=request.method, status=status)
+
+# With several workers, a delete or an ingest in one of them drops the caches below in all of them
+shared_generations = GENERATIONS_PATH if WEB_WORKERS > 1 else None
+
+# Recently stored pages, so revisits skip the encode and the upsert entirely
+# Size with DEDUP_CACHE_SIZE, persist across restarts with DEDUP_DB_PATH
+seen_cache = SeenCache(generation=Generation("seen", shared_generations))
+
+# Repeated /recall queries reuse the query vector and, for a short while, the search result
+# Concurrent identical queries share one encode and one store query
+query_vectors = QueryCache()
+query_results = QueryCache(ttl_s=QUERY_RESULT_TTL_S, generation=Generation("query_results", shared_generations))
+
+# Time-ordered listing for GET /memories, kept next to the store on every write
+memory_index = MemoryIndex()
+
+# How many raw hits /recall fetches per result before collapsing chunks
+RECALL_OVERFETCH = int(os.getenv("RECALL_OVERFETCH", "4"))
+RECALL_MAX_TOP_K = int(os.getenv("RECALL_MAX_TOP_K", "50"))
+
+# Export / import move records through the store this many at a time
+TRANSFER_BATCH = int(os.getenv("TRANSFER_BATCH", "100"))
+
+# Batch ingest: max logs per request, vectors per upsert call and upserts in flight
+INGEST_BATCH_MAX = int(os.getenv("INGEST_BATCH_MAX", "1000"))
+INGEST_UPSERT_BATCH = int(os.getenv("INGEST_UPSERT_BATCH", "100"))
+INGEST_UPSERT_PARALLEL = int(os.getenv("INGEST_UPSERT_PARALLEL", "4"))
+
+# Write-behind: /ingest appends to a local journal and answers 202, a worker stores it later
+# Set INGEST_WRITE_BEHIND=0 to encode and upsert inside the request again
+INGEST_WRITE_BEHIND = os.getenv("INGEST_WRITE_BEHIND", "1").lower() not in ("0", "false", "no")
+ingest_journal = IngestJournal()
+
+# Transcripts / captions by video or post id, so a video seen again is never fetched twice
+# Size with EXTRACTOR_CACHE_MAX_ENTRIES / EXTRACTOR_CACHE_MAX_MB, expire with EXTRACTOR_CACHE_TTL_S
+extractor_cache = ExtractorCache()
 
 class ActivityLog(BaseModel):
     title: str
     url: str
     content: str
     timestamp: str
+    # What the extension captured, e.g. "chat" or "video"
+    type: Optional[str] = None
 
 class Query(BaseModel):
     text: str
+    # Optional filters, applied inside the vector store before ranking
+    platform: Optional[str] = None  # e.g. "YOUTUBE", "INSTAGRAM"
+    domain: Optional[str] = None    # e.g. "github.com"
+    since: Optional[Union[float, str]] = None  # epoch seconds or ISO timestamp
+    until: Optional[Union[float, str]] = None
+    top_k: int = 5
+    # "full": the stored chunk, "snippet": the sentences that best match the query,
+    # "ids": no content at all
+    mode: str = "full"
+    # Optional projection of each memory, e.g. ["id", "metadata"]
+    fields: Optional[list[str]] = None
+
+RECALL_MODES = ("full", "snippet", "ids")
+RECALL_FIELDS = {"id", "content", "metadata", "score"}
 
 def get_youtube_transcript(video_id):
     """Fetches the full spoken transcript of a YouTube video."""
+    key = f"youtube:{video_id}"
+    cached = extractor_cache.get(key)
+    if cached is not None:
+        return cached["text"]
     try:
         # New API: instantiate YouTubeTranscriptApi and call fetch()
-        from youtube_transcript_api import YouTubeTranscriptApi
-        
+        from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
+    except ImportError as e:
+        logger.warning("youtube_transcript_failed", video_id=video_id, error=str(e))
+        return None
+
+    try:
         ytt_api = YouTubeTranscriptApi()
         fetched_transcript = ytt_api.fetch(video_id)
         
@@ -61,26 +232,39 @@ def get_youtube_transcript(video_id):
         
         # Combine all text segments
         full_text = " ".join([entry['text'] for entry in transcript_data])
+        extractor_cache.put(key, full_text, {"segments": len(transcript_data)})
         return full_text
-        
+
+    except (TranscriptsDisabled, NoTranscriptFound, VideoUnavailable) as e:
+        # There is nothing to fetch, remember that instead of asking again on every visit
+        extractor_cache.put(key, None, {"reason": type(e).__name__})
+        logger.debug("youtube_no_transcript", video_id=video_id, reason=type(e).__name__)
+        return None
     except Exception as e:
-        print(f"Error getting YT transcript: {e}")
+        # Network trouble or rate limiting: not cached, the next visit tries again
+        logger.warning("youtube_transcript_failed", video_id=video_id, error=str(e))
         return None
 
 def get_instagram_details(url):
     """Fetches captions, subtitles, and metadata from Instagram/TikTok videos."""
+    post_id = extract_post_id(url)
+    if post_id:
+        cached = extractor_cache.get(post_id)
+        if cached is not None:
+            return cached["text"]
     ydl_opts = {
-        'quiet': False,  # Enable output for debugging
+        'quiet': True,  # Runs in the background for every reel, keep stdout to our own logs
         'skip_download': True,
-        'no_warnings': False,  # Show warnings for debugging
+        'no_warnings': True,
         'ignoreerrors': True,
         'writesubtitles': True,
         'writeautomaticsub': True,
         'subtitleslangs': ['en', 'en-US'],
-        'verbose': True,  # Enable verbose mode
     }
     try:
-        print(f"   Attempting to fetch from: {url}")
+        import yt_dlp
+
+        logger.debug("ytdlp_fetch", url=url)
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=False)
             if info:
@@ -89,7 +273,7 @@ def get_instagram_details(url):
                 uploader = info.get('uploader', 'Unknown')
                 title = info.get('title', '')
                 
-                print(f"   Extracted - Title: {title[:50]}, Uploader: {uploader}")
+                logger.debug("ytdlp_extracted", title=title[:50], uploader=uploader)
                 
                 # Try to get subtitles/captions
                 subtitles = info.get('subtitles', {})
@@ -115,13 +299,16 @@ def get_instagram_details(url):
                 if subtitle_text:
                     full_context += f"\n\n{subtitle_text}"
                 
+                if post_id:
+                    extractor_cache.put(post_id, full_context, {"uploader": uploader, "title": title})
                 return full_context
             else:
-                print("   No info returned from yt-dlp")
+                # With ignoreerrors yt-dlp returns None for removed / private posts
+                logger.warning("ytdlp_no_info", url=url)
+                if post_id:
+                    extractor_cache.put(post_id, None, {"reason": "no_info"})
     except Exception as e:
-        import traceback
-        print(f"Error getting Instagram/TikTok details: {e}")
-        print(f"Full traceback:\n{traceback.format_exc()}")
+        logger.error("ytdlp_failed", exc_info=True, url=url, error=str(e))
     return None
 
 def extract_video_id(url):
@@ -129,136 +316,792 @@ def extract_video_id(url):
     if "v=" in url:
         return url.split("v=")[1].split("&")[0]
     elif "youtu.be/" in url:
-        return url.split("youtu.be/")[1]
+        return url.split("youtu.be/")[1].split("?")[0]
+    return None
+
+# Instagram posts / reels and TikTok videos, by the id in their URL
+POST_ID_PATTERNS = (
+    ("instagram", re.compile(r"instagram\.com/(?:[\w.]+/)?(?:reels?|p|tv)/([\w-]+)")),
+    ("tiktok", re.compile(r"tiktok\.com/(?:@[\w.-]+/video|v|embed(?:/v2)?)/(\d+)")),
+    ("tiktok", re.compile(r"(?:vm|vt)\.tiktok\.com/(\w+)")),
+)
+
+def extract_post_id(url):
+    """Canonical id of an Instagram / TikTok post, e.g. "instagram:Cx1AbC", or None."""
+    for platform, pattern in POST_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return f"{platform}:{match.group(1)}"
     return None
 
+def detect_platform(url):
+    """Normalized platform name, matching the ones the web UI shows."""
+    url = url.lower()
+    if "youtube.com" in url or "youtu.be" in url:
+        return "YOUTUBE"
+    if "instagram.com" in url:
+        return "INSTAGRAM"
+    if "tiktok.com" in url:
+        return "TIKTOK"
+    if "chatgpt.com" in url:
+        return "CHATGPT"
+    return "OTHER"
+
+def fetcher_for(url):
+    """The blocking fetch that can add a transcript or caption to this URL, or None."""
+    if detect_platform(url) == "YOUTUBE":
+        video_id = extract_video_id(url)
+        return (lambda: get_youtube_transcript(video_id)) if video_id else None
+    if "instagram.com/reel" in url or "tiktok.com" in url:
+        return lambda: get_instagram_details(url)
+    return None
+
+async def backfill_memory_index():
+    # First start with an existing store: fill the listing index from it
+    try:
+        count = await run_store(memory_index.rebuild, store, detect_platform)
+        logger.info("listing_index_rebuilt", memories=count)
+    except Exception as e:
+        logger.error("listing_index_rebuild_failed", error=str(e))
+
+async def load_indexes():
+    """Rebuilds the listing index if it's missing, then fills the hot tier from it, newest first."""
+    if memory_index.count() == 0:
+        await backfill_memory_index()
+    if isinstance(store, TieredStore):
+        try:
+            documents = await run_in_pool(store_pool, memory_index.documents)
+            await run_in_pool(store_pool, store.warm, documents)
+        except Exception as e:
+            logger.error("hot_tier_warm_failed", error=str(e))
+
+def set_chunk_tokenizer(encoder):
+    global chunk_tokenizer, query_casefold
+    chunk_tokenizer = span_tokenizer(getattr(encoder, "tokenizer", None))
+    query_casefold = is_uncased(chunk_tokenizer)
+
+def split_document(content):
+    """chunk_text with the model's tokenizer, counting pages cut off at the chunk cap."""
+    chunks = chunk_text(content, tokenizer=chunk_tokenizer)
+    if chunks.dropped_tokens:
+        TRUNCATED.inc()
+    return chunks
+
+async def warm_up():
+    """Loads the model and the vector store in the background and runs one dummy encode.
+
+    A failed attempt is retried with backoff, keeping whatever already loaded.
+    """
+    async def load_embedding_model():
+        global model, embedding_dim
+        started = time.perf_counter()
+        if EMBED_SERVER_SOCKET:
+            remote = RemoteEncoder(EMBED_SERVER_SOCKET)
+            await run_in_pool(encode_pool, remote.wait_until_up)
+            model = remote
+        else:
+            spec = current_index()
+            model = await run_in_pool(encode_pool, load_model, spec["backend"], spec["model"])
+        set_chunk_tokenizer(model)
+        readiness.stage_done("model_load", started)
+        started = time.perf_counter()
+        # First encode pays for lazy kernel / graph setup, do it before real traffic
+        try:
+            embedding_dim = len(await embedder.encode("warm up"))
+        except Exception:
+            model = None  # loaded but not usable, the next attempt loads it again
+            raise
+        readiness.stage_done("warmup_encode", started)
+
+    async def connect_store():
+        global store
+        started = time.perf_counter()
+        # The index a re-index switched to, or the one the settings describe
+        store = await run_in_pool(store_pool, open_store, current_index(), True)
+        readiness.stage_done("store_connect", started)
+
+    while True:
+        # Both run to the end before a retry, so a slow one is never started twice
+        steps = ([] if model else [load_embedding_model()]) + ([] if store else [connect_store()])
+        errors = [e for e in await asyncio.gather(*steps, return_exceptions=True) if isinstance(e, Exception)]
+        if errors:
+            await asyncio.sleep(readiness.set_failed(errors[0]))
+            continue
+        if store is None:
+            # Not something a retry fixes
+            readiness.set_failed(RuntimeError("No vector store: set PINECONE_API_KEY or VECTOR_STORE=local"))
+            return
+        break
+    readiness.set_ready()
+
+    if ENRICHMENT:
+        enricher.start()
+    # With several workers, one of them runs the jobs that walk the whole store
+    if not runs_background_jobs():
+        return
+    asyncio.create_task(load_indexes())
+    asyncio.create_task(finish_reindex())
+    # Drains whatever was accepted while we were warming up, or before a restart
+    asyncio.create_task(ingest_journal.run(drain_journal))
+    if RETENTION_DAYS > 0 and hasattr(store, "drop_before"):
+        asyncio.create_task(retention_loop())
+    if COMPACT_INTERVAL_S > 0:
+        asyncio.create_task(compaction_loop())
+
+# Memories older than this are dropped, one whole month partition at a time (0 keeps everything)
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "0"))
+RETENTION_CHECK_S = 3600
+
+async def enforce_retention():
+    """Drops the partitions that lie entirely before the retention window."""
+    cutoff = time.time() - RETENTION_DAYS * 86400
+    # Dropping a partition is one call per namespace, but can take a while: no timeout
+    dropped = await run_in_pool(store_pool, store.drop_before, cutoff)
+    if not dropped:
+        return
+    doc_ids = sorted({parent_of(vid) for vid in dropped})
+    memory_index.remove(doc_ids)
+    seen_cache.discard(doc_ids)
+    query_results.clear()
+    logger.info("retention_dropped", records=len(dropped), memories=len(doc_ids))
+
+# Report of the last compaction run, for /stats/compaction
+last_compaction = {}
+compaction_lock = None
+
+async def compact_memories():
+    """Evicts expired / over-budget memories and merges near-duplicates, then syncs the caches."""
+    global compaction_lock
+    # Created on first use so it belongs to the server's event loop
+    if compaction_lock is None:
+        compaction_lock = asyncio.Lock()
+    async with compaction_lock:
+        compactor = Compactor(store, max_age_s=RETENTION_DAYS * 86400 or None)
+        # Long and blocking (many store round trips): a store thread without a timeout
+        report = await run_in_pool(store_pool, lambda: compactor.run(memory_index.documents(), domain_of))
+        removed = report.pop("removed")
+        if removed:
+            memory_index.remove(removed)
+            seen_cache.discard(removed)
+            query_results.clear()
+        last_compaction.clear()
+        last_compaction.update(report, finished_at=time.time())
+        return report
+
+async def compaction_loop():
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL_S)
+        try:
+            await compact_memories()
+        except Exception as e:
+            logger.error("compaction_failed", error=str(e))
+
+async def retention_loop():
+    while True:
+        try:
+            await enforce_retention()
+        except Exception as e:
+            logger.error("retention_failed", error=str(e))
+        await asyncio.sleep(RETENTION_CHECK_S)
+
+@app.on_event("startup")
+async def start_warm_up():
+    readiness.stage_done("import")
+    asyncio.create_task(warm_up())
+
+def domain_of(url):
+    """Host of a URL without "www.", lowercased."""
+    host = urlsplit(url).netloc.lower().split("@")[-1].split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+def recall_filter(query):
+    """Pinecone-style metadata filter for the optional fields of a Query."""
+    conditions = {}
+    if query.platform:
+        conditions["platform"] = {"$eq": query.platform.upper()}
+    if query.domain:
+        # Accept a bare host ("github.com") or a full URL
+        domain = query.domain if "//" in query.domain else f"//{query.domain}"
+        conditions["domain"] = {"$eq": domain_of(domain)}
+    time_range = {}
+    for field, op in (("since", "$gte"), ("until", "$lte")):
+        value = getattr(query, field)
+        if value is None:
+            continue
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid {field}: use epoch seconds or an ISO timestamp")
+        time_range[op] = float(value)
+    if time_range:
+        conditions["ts"] = time_range
+    return conditions
+
 @app.get("/")
 def health_check():
-    return {"status": "Sentinel Cloud Brain is Online"}
+    if not readiness.is_ready:
+        return {"status": "Sentinel Cloud Brain is warming up", "ready": False}
+    return {"status": "Sentinel Cloud Brain is Online", "ready": True}
 
-@app.post("/ingest")
-async def ingest_activity(log: ActivityLog):
-    if not index:
-         raise HTTPException(status_code=500, detail="Pinecone API Key not configured")
+@app.get("/healthz")
+def healthz():
+    # The process is up and serving, unless warm-up kept failing (see WARMUP_MAX_FAILURES)
+    if not readiness.is_alive:
+        return JSONResponse({"status": "failing", "error": readiness.error, "failures": readiness.failures}, status_code=503)
+    return {"status": "ok"}
 
-    print(f"🧠 Processing: {log.url}")
-    
+@app.get("/readyz")
+def readyz():
+    # Model and vector store are loaded and usable
+    ready = readiness.is_ready and model is not None and store is not None
+    return JSONResponse({**readiness.snapshot(), "ready": ready}, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/embedding")
+def embedding_stats():
+    stats = embedder.stats()
+    if isinstance(model, RemoteEncoder):
+        try:
+            stats["server"] = model.stats()
+        except OSError as e:
+            stats["server"] = {"error": str(e)}
+    return stats
+
+@app.get("/stats/hot-tier")
+def hot_tier_stats():
+    return store.hot.stats() if isinstance(store, TieredStore) else {"enabled": False}
+
+@app.get("/stats/admission")
+def admission_stats():
+    return admission.stats()
+
+@app.get("/stats/dedup")
+def dedup_stats():
+    return seen_cache.stats()
+
+@app.get("/stats/query-cache")
+def query_cache_stats():
+    return {"vectors": query_vectors.stats(), "results": query_results.stats()}
+
+@app.get("/stats/partitions")
+def partition_stats():
+    # Records per month partition, when the store is partitioned
+    return store.stats() if hasattr(store, "stats") else {"partitions": None}
+
+@app.get("/stats/compaction")
+def compaction_stats():
+    return last_compaction
+
+@app.get("/stats/enrichment")
+def enrichment_stats():
+    return {**enricher.stats(), "cache": extractor_cache.stats()}
+
+def expand_context(log):
+    """Builds the text we embed for a log, depending on the platform it came from."""
     final_content = log.content # Start with what the browser sent
     
-    # --- INTELLIGENT CONTEXT EXPANSION ---
-    
     # 1. YOUTUBE STRATEGY
     if "youtube.com" in log.url or "youtu.be" in log.url:
-        print(f"   🎥 YouTube detected.")
+        platform = "youtube"
         
         # Note: HF Spaces cannot access YouTube due to network restrictions
         # We rely on the extension to scrape title/description/transcript
         if log.content and len(log.content) > 100:
             final_content = f"VIDEO: {log.title}\n\nCONTENT:\n{log.content}"
-            print(f"   ✅ Using video data from extension. Length: {len(log.content)} chars")
+            logger.debug("classified", platform=platform, source="extension", chars=len(log.content))
         else:
-            print(f"   ⚠️ No video data from extension. Using title only.")
+            logger.debug("classified", platform=platform, source="title_only")
             final_content = f"VIDEO TITLE: {log.title}\nURL: {log.url}"
 
     # 2. INSTAGRAM / TIKTOK STRATEGY
     elif "instagram.com/reel" in log.url or "tiktok.com" in log.url:
-        platform = "Instagram" if "instagram" in log.url else "TikTok"
-        print(f"   📱 {platform} detected.")
+        platform = "instagram" if "instagram" in log.url else "tiktok"
         
         # Note: HF Spaces cannot access Instagram due to network restrictions
         # We rely on the extension to scrape the caption before sending
         if log.content and len(log.content) > 50:
             final_content = f"SOCIAL POST: {log.title}\n\nCONTENT:\n{log.content}"
-            print(f"   ✅ Using caption from extension. Length: {len(log.content)} chars")
+            logger.debug("classified", platform=platform, source="extension", chars=len(log.content))
         else:
-            print(f"   ⚠️ No caption from extension. Using title only.")
+            logger.debug("classified", platform=platform, source="title_only")
             final_content = f"SOCIAL POST: {log.title}\nURL: {log.url}"
 
     # 3. INSTAGRAM DM (Private) -> TRUST THE EXTENSION
     elif "instagram.com/direct" in log.url:
-        print("   💬 Private Chat detected. Using text from Extension.")
+        logger.debug("classified", platform="instagram_dm", source="extension", chars=len(log.content))
         final_content = f"PRIVATE CHAT LOG:\n{log.content}"
 
-    # 3. Create the Memory (Embedding)
-    vector = model.encode(final_content).tolist()
+    return final_content
 
-    # 4. Store in Cloud Memory (Pinecone)
-    index.upsert(
-        vectors=[{
-            "id": str(uuid.uuid4()),
-            "values": vector,
-            "metadata": {
-                "title": log.title,
-                "url": log.url,
-                "content": final_content[:10000], # Store up to 10k chars for full context
-                "timestamp": log.timestamp
-            }
-        }]
-    )
-    return {"status": "saved", "content_preview": final_content[:50]}
+def build_records(doc_id, log, digest, chunks, vectors):
+    """Vector-store records for every chunk of one document."""
+    return [{
+        "id": chunk_id(doc_id, i),
+        "values": vector,
+        "metadata": {
+            "doc_id": doc_id,
+            "chunk": i,
+            "chunks": len(chunks),
+            "title": log.title,
+            "url": log.url,
+            "content": chunk,
+            # Where the chunk starts in the page, to put it back together
+            "start": start,
+            "content_hash": digest,
+            "timestamp": log.timestamp,
+            # Filterable fields for /recall
+            "platform": detect_platform(log.url),
+            "domain": domain_of(log.url),
+            "ts": parse_timestamp(log.timestamp)
+        }
+    } for i, (chunk, start, vector) in enumerate(zip(chunks, chunks.starts, vectors))]
+
+def remember_document(doc_id, log, digest, final_content, n_chunks, previous):
+    """Updates the local caches after a document was stored.
+
+    Returns the ids of chunks the document no longer has, which the caller deletes.
+    """
+    seen_cache.put(doc_id, digest, n_chunks)
+    memory_index.add(doc_id, log.timestamp, log.title, log.url, detect_platform(log.url), final_content[:500])
+    # The page changed and got shorter - drop the chunks it no longer has
+    if previous and previous[1] > n_chunks:
+        return [chunk_id(doc_id, i) for i in range(n_chunks, previous[1])]
+    return []
+
+async def stored_version(doc_id):
+    """(content_hash, chunks) of a document as the store has it, or None if it isn't stored."""
+    found = await store_call(store.fetch, [chunk_id(doc_id, 0), doc_id])
+    record = found.get(chunk_id(doc_id, 0)) or found.get(doc_id)
+    meta = (record or {}).get("metadata") or {}
+    if not meta.get("content_hash"):
+        return None
+    return meta["content_hash"], int(meta.get("chunks", 1))
+
+def classify(log):
+    """Expanded content, document id, content hash and the cached entry for a log."""
+    final_content = expand_context(log)
+    # The id comes from the URL, so a revisit lands on the same record (a chat's from what it shows, too)
+    doc_id = doc_id_for(log.url, final_content, log.type)
+    return final_content, doc_id, content_hash(final_content), seen_cache.get(doc_id)
+
+@app.post("/ingest")
+async def ingest_activity(log: ActivityLog):
+    logger.info("ingest", sampled=True, url=log.url, chars=len(log.content))
+    INPUT_CHARS.observe(len(log.content), op="ingest")
+
+    # --- INTELLIGENT CONTEXT EXPANSION + DEDUPLICATION ---
+    with STAGE_SECONDS.time(op="ingest", stage="classify"):
+        final_content, doc_id, digest, previous = classify(log)
+    if previous and previous[0] == digest:
+        logger.debug("ingest_duplicate", id=doc_id)
+        DUPLICATES.inc()
+        return {"status": "duplicate", "id": doc_id, "content_preview": final_content[:50]}
+
+    if INGEST_WRITE_BEHIND:
+        # Accepted while warming up too, the worker stores it once the model is loaded
+        if readiness.error or (readiness.is_ready and not store):
+            await ensure_ready()
+        with STAGE_SECONDS.time(op="ingest", stage="journal"):
+            await ingest_journal.append(doc_id, dict(log))
+        return JSONResponse({"status": "queued", "id": doc_id, "content_preview": final_content[:50]}, status_code=202)
+
+    await ensure_ready()
+
+    async with swap_guard.writing():
+        # 3. Create the Memory (Embeddings)
+        # Long pages are split into overlapping windows so nothing past the model's
+        # input limit is lost. All chunks are encoded together.
+        with STAGE_SECONDS.time(op="ingest", stage="encode"):
+            chunks = split_document(final_content)
+            vectors = await embed_many(chunks)
+
+        # 4. Store in Memory - one bulk upsert for the whole document
+        with STAGE_SECONDS.time(op="ingest", stage="upsert"):
+            await store_call(store.upsert, build_records(doc_id, log, digest, chunks, vectors))
+
+        stale = remember_document(doc_id, log, digest, final_content, len(chunks), previous)
+        if stale:
+            await store_call(store.delete, stale)
+    # Cached search results may be missing this page now
+    query_results.clear()
+    enricher.submit({"id": doc_id, **dict(log)})
+    status = "updated" if previous else "saved"
+    result = {"status": status, "id": doc_id, "chunks": len(chunks), "content_preview": final_content[:50]}
+    if chunks.dropped_tokens:
+        result["truncated_tokens"] = chunks.dropped_tokens
+    return result
+
+async def store_logs(logs, enrich=True, extras=None):
+    """Encodes and stores a list of logs with one encode call and a few bulk upserts.
+
+    Returns a result dict per log. Upsert failures are reported per log as
+    "error", an encoder timeout raises asyncio.TimeoutError. Stored pages
+    are queued for enrichment unless enrich is False.
+
+    extras holds text fetched for each log (transcripts) that is stored
+    after its content. The content hash stays that of the page as the
+    extension sent it, so the next plain visit is still a duplicate. A log
+    with extras is only stored over the same version of the page.
+    """
+    extras = extras or [None] * len(logs)
+    results = [None] * len(logs)
+    latest = {}  # doc_id -> (position, log, final_content, extra)
+    for i, (log, extra) in enumerate(zip(logs, extras)):
+        final_content = expand_context(log)
+        doc_id = doc_id_for(log.url, final_content, log.type)
+        if doc_id in latest:
+            # Same page twice in one batch: the later visit wins
+            results[latest[doc_id][0]] = {"status": "superseded", "id": doc_id}
+        latest[doc_id] = (i, log, final_content, extra)
+
+    pending = {}  # doc_id -> (position, log, digest, final_content, previous, chunks)
+    for doc_id, (i, log, final_content, extra) in latest.items():
+        digest = content_hash(final_content)
+        previous = seen_cache.get(doc_id)
+        if extra:
+            if previous is None:
+                # Evicted from the seen cache (or stored by another worker): ask the store
+                previous = await stored_version(doc_id)
+            # Enrichment of a page that was deleted or changed since, the newer version has its own job
+            if not previous or previous[0] != digest:
+                results[i] = {"status": "superseded", "id": doc_id}
+                continue
+            final_content = f"{final_content}\n\n{extra}"
+        elif previous and previous[0] == digest:
+            results[i] = {"status": "duplicate", "id": doc_id}
+            continue
+        pending[doc_id] = (i, log, digest, final_content, previous, split_document(final_content))
+
+    if not pending:
+        return results
+
+    async with swap_guard.writing():
+        # Every chunk of every log encoded together, in slices that let recall encodes in between
+        texts = [chunk for doc in pending.values() for chunk in doc[5]]
+        vectors = await embedder.encode_bulk(texts)
+
+        records, owners, offset = [], [], 0
+        for doc_id, (_, log, digest, _, _, chunks) in pending.items():
+            records += build_records(doc_id, log, digest, chunks, vectors[offset:offset + len(chunks)])
+            owners += [doc_id] * len(chunks)
+            offset += len(chunks)
+
+        # Upsert in size-limited slices, a few at a time
+        failed = {}
+        limit = asyncio.Semaphore(INGEST_UPSERT_PARALLEL)
+
+        async def upsert_slice(start):
+            async with limit:
+                try:
+                    await run_store(store.upsert, records[start:start + INGEST_UPSERT_BATCH])
+                except Exception as e:
+                    for doc_id in owners[start:start + INGEST_UPSERT_BATCH]:
+                        failed[doc_id] = str(e) or type(e).__name__
+
+        await asyncio.gather(*(upsert_slice(start) for start in range(0, len(records), INGEST_UPSERT_BATCH)))
+
+        stale = []
+        for doc_id, (i, log, digest, final_content, previous, chunks) in pending.items():
+            if doc_id in failed:
+                results[i] = {"status": "error", "id": doc_id, "detail": failed[doc_id]}
+                continue
+            stale += remember_document(doc_id, log, digest, final_content, len(chunks), previous)
+            results[i] = {"status": "updated" if previous else "saved", "id": doc_id, "chunks": len(chunks)}
+            if chunks.dropped_tokens:
+                results[i]["truncated_tokens"] = chunks.dropped_tokens
+            if enrich:
+                enricher.submit({"id": doc_id, **dict(log)})
+        if stale:
+            await store_call(store.delete, stale)
+    query_results.clear()
+    return results
+
+async def enrich_document(job, text):
+    """Re-embeds a stored page with the transcript / caption the enricher fetched."""
+    log = ActivityLog(title=job["title"], url=job["url"], content=job["content"], timestamp=job["timestamp"],
+                      type=job.get("type"))
+    results = await store_logs([log], enrich=False, extras=[text])
+    if results[0]["status"] == "error":
+        raise RuntimeError(results[0]["detail"])
+    logger.info("enriched", id=job["id"], chars=len(text), status=results[0]["status"])
+
+# Transcripts and captions are fetched after the page is stored, never inside a request
+# Tune with ENRICH_WORKERS / ENRICH_PER_HOST / FETCH_TIMEOUT_S, turn off with ENRICHMENT=0
+enricher = Enricher(fetcher_for, enrich_document)
+
+async def drain_journal(payloads):
+    """Stores one batch from the ingest journal. Returns an error (or None) per payload, errors are retried."""
+    results = await store_logs([ActivityLog(**payload) for payload in payloads])
+    return [result.get("detail", "error") if result["status"] == "error" else None for result in results]
+
+@app.post("/ingest/batch")
+async def ingest_batch(logs: list[ActivityLog]):
+    """Ingests a backlog of logs with one encode call and a few bulk upserts. Reports a status per log."""
+    await ensure_ready()
+    if len(logs) > INGEST_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {INGEST_BATCH_MAX} logs per batch")
+
+    logger.info("ingest_batch", logs=len(logs))
+    INPUT_CHARS.observe(sum(len(log.content) for log in logs), op="ingest_batch")
+
+    try:
+        results = await store_logs(logs)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Embedding timed out")
+
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {"results": results, "counts": counts}
+
+@app.get("/ingest/status")
+async def ingest_status():
+    """Depth and lag of the write-behind journal, plus what the worker has done since start."""
+    return {"write_behind": INGEST_WRITE_BEHIND, **await ingest_journal.status()}
 
 @app.post("/recall")
 async def recall_memory(query: Query):
-    if not index:
-         raise HTTPException(status_code=500, detail="Pinecone API Key not configured")
+    await ensure_ready()
 
-    # Convert query to vector
-    query_vector = model.encode(query.text).tolist()
+    INPUT_CHARS.observe(len(query.text), op="recall")
+    top_k = max(1, min(query.top_k, RECALL_MAX_TOP_K))
+    filters = recall_filter(query)
+    if query.mode not in RECALL_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(RECALL_MODES)}")
+    fields = set(query.fields or ())
+    if fields - RECALL_FIELDS:
+        raise HTTPException(status_code=400, detail=f"fields must be among {', '.join(sorted(RECALL_FIELDS))}")
+    key = normalize_query(query.text, query_casefold)
 
-    # Search Pinecone
-    results = index.query(
-        vector=query_vector,
-        top_k=5,
-        include_metadata=True
-    )
+    async def encode_query():
+        with STAGE_SECONDS.time(op="recall", stage="encode"):
+            return await embed(query.text)
 
-    memories = []
-    for match in results['matches']:
-        memories.append({
-            "content": match['metadata']['content'],
-            "metadata": {
-                "title": match['metadata']['title'],
-                "url": match['metadata']['url'],
-                "time": match['metadata']['timestamp']
-            },
-            "score": match['score']
-        })
-            
-    return {"memories": memories}
+    async def search():
+        # Convert query to vector
+        query_vector = await query_vectors.get_or_compute(key, encode_query)
 
-@app.get("/memories")
-async def get_all_memories():
-    if not index:
-         raise HTTPException(status_code=500, detail="Pinecone API Key not configured")
+        # Search the store
+        # Ask for extra hits since several chunks of one document can match
+        with STAGE_SECONDS.time(op="recall", stage="query"):
+            # The hot tier decides whether it can answer alone by documents, not chunks
+            tiered = {"documents": top_k} if isinstance(store, TieredStore) else {}
+            return await store_call(
+                store.query,
+                vector=query_vector,
+                top_k=top_k * RECALL_OVERFETCH,
+                include_metadata=True,
+                filter=filters or None,
+                **tiered
+            )
 
-    # Create a generic "neutral" vector to match everything (or as much as possible)
-    # We use a vector of small non-zero values to avoid zero-vector issues
-    dummy_vector = [0.01] * 384
+    results = await query_results.get_or_compute((key, top_k, json.dumps(filters, sort_keys=True)), search)
 
-    # Fetch top 100 most recent/relevant items
-    results = index.query(
-        vector=dummy_vector,
-        top_k=100,
-        include_metadata=True
-    )
+    with STAGE_SECONDS.time(op="recall", stage="serialize"):
+        memories = []
+        for match in collapse_matches(results['matches'], limit=top_k):
+            memory = {
+                "id": doc_id_of(match),
+                "metadata": {
+                    "title": match['metadata']['title'],
+                    "url": match['metadata']['url'],
+                    "time": match['metadata']['timestamp'],
+                    "platform": match['metadata'].get('platform') or detect_platform(match['metadata']['url']),
+                    # Near-duplicate visits folded into this one by compaction
+                    "visits": match['metadata'].get('visits', 1)
+                },
+                "score": match['score']
+            }
+            if query.mode == "full":
+                memory["content"] = match['metadata']['content']
+            elif query.mode == "snippet":
+                memory["content"] = make_snippet(match['metadata']['content'], query.text)
+            if fields:
+                memory = {k: v for k, v in memory.items() if k in fields}
+            memories.append(memory)
+        response = FastJSONResponse({"memories": memories})
+    logger.info("recall", sampled=True, chars=len(query.text), results=len(memories), filtered=bool(filters), mode=query.mode)
+    return response
+
+@app.get("/memories")
+async def get_all_memories(
+    limit: int = LIST_DEFAULT_LIMIT,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    platform: Optional[str] = None,
+):
+    """Newest-first listing, paged with the cursors returned in the previous response."""
+    await ensure_ready()
+
+    try:
+        rows, next_before, next_after = memory_index.page(limit=limit, before=before, after=after, platform=platform)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
     memories = []
-    for match in results['matches']:
-        # Safety check for metadata
-        meta = match.get('metadata', {})
+    for row in rows:
         memories.append({
-            "id": match['id'],
-            "content": meta.get('content', 'No content'),
+            "id": row['id'],
+            # The first 500 characters, GET /memories/{id} has the whole text
+            "preview": row['preview'] or 'No content',
             "metadata": {
-                "title": meta.get('title', 'Unknown Title'),
-                "url": meta.get('url', '#'),
-                "time": meta.get('timestamp', datetime.now().isoformat()),
-                "platform": "YOUTUBE" if "youtube" in meta.get('url', '') else "OTHER"
-            },
-            "score": match['score']
+                "title": row['title'] or 'Unknown Title',
+                "url": row['url'] or '#',
+                "time": row['timestamp'] or datetime.now().isoformat(),
+                "platform": row['platform']
+            }
         })
-            
-    return {"memories": memories}
+
+    return FastJSONResponse({"memories": memories, "next_before": next_before, "next_after": next_after})
+
+@app.get("/memories/export")
+async def export_memories(include_vectors: bool = False):
+    """Streams every stored record as NDJSON, one batch of records in memory at a time."""
+    await ensure_ready()
+
+    async def lines():
+        ids = iter(store.list())
+        while True:
+            # Pull the next page of ids and its records off the event loop
+            batch = await run_store(lambda: list(itertools.islice(ids, TRANSFER_BATCH)))
+            if not batch:
+                break
+            records = await run_store(store.fetch, batch)
+            for vid in batch:
+                record = records.get(vid)
+                if record is None:
+                    continue  # deleted while we were exporting
+                line = {"id": vid, "metadata": record.get("metadata") or {}}
+                if include_vectors:
+                    line["values"] = record["values"]
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/memories/import")
+async def import_memories(request: Request):
+    """Reads an NDJSON export from the request body and upserts it in batches.
+
+    Lines that carry "values" are stored as-is, if they have the model's
+    dimension. Lines without them are re-embedded from their metadata
+    content. A stuck encoder ends the import with a 503 that reports how
+    far it got, so the rest can be sent again.
+    """
+    await ensure_ready()
+
+    stats = {"lines": 0, "imported": 0, "embedded": 0, "errors": 0}
+    errors = []
+    batch = []
+
+    async def flush():
+        needs_vectors = [r for r in batch if not r.get("values")]
+        async with swap_guard.writing():
+            if needs_vectors:
+                vectors = await embedder.encode_bulk([r["metadata"].get("content", "") for r in needs_vectors])
+                for record, vector in zip(needs_vectors, vectors):
+                    record["values"] = vector
+                stats["embedded"] += len(needs_vectors)
+            await store_call(store.upsert, batch)
+        stats["imported"] += len(batch)
+
+        # Keep the listing and dedup caches in step with the store
+        rows = []
+        for record in batch:
+            meta = record["metadata"]
+            doc_id = meta.get("doc_id") or record["id"]
+            if meta.get("chunk", 0) == 0:
+                url = meta.get("url", "#")
+                rows.append((doc_id, meta.get("timestamp", ""), meta.get("title", "Unknown Title"), url,
+                             meta.get("platform") or detect_platform(url), meta.get("content", "")[:500]))
+            if meta.get("content_hash"):
+                seen_cache.put(doc_id, meta["content_hash"], meta.get("chunks", 1))
+        memory_index.add_many(rows)
+        batch.clear()
+
+    async def body_lines():
+        buffer = b""
+        async for piece in request.stream():
+            buffer += piece
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield line
+        yield buffer
+
+    async def import_lines():
+        async for raw in body_lines():
+            if not raw.strip():
+                continue
+            stats["lines"] += 1
+            try:
+                line = json.loads(raw)
+                record = {"id": str(line["id"]), "metadata": dict(line.get("metadata") or {})}
+                if line.get("values"):
+                    record["values"] = [float(v) for v in line["values"]]
+                    if len(record["values"]) != embedding_dim:
+                        raise ValueError(f"vector dimension {len(record['values'])} does not match the model's {embedding_dim}")
+            except (ValueError, KeyError, TypeError) as e:
+                stats["errors"] += 1
+                if len(errors) < 10:
+                    errors.append(f"line {stats['lines']}: {e}")
+                continue
+            batch.append(record)
+            if len(batch) >= TRANSFER_BATCH:
+                await flush()
+        if batch:
+            await flush()
+
+    try:
+        await import_lines()
+    except asyncio.TimeoutError:
+        # Everything before the failed batch is stored: report it so the client resumes after it
+        query_results.clear()
+        return JSONResponse({"detail": "Embedding timed out", **stats, "error_samples": errors},
+                            status_code=503, headers={"Retry-After": "5"})
+
+    query_results.clear()
+    return {**stats, "error_samples": errors}
+
+@app.post("/memories/compact")
+async def compact():
+    """Runs a compaction pass now instead of waiting for the next scheduled one."""
+    await ensure_ready()
+    return await compact_memories()
+
+@app.get("/memories/{doc_id}")
+async def get_memory(doc_id: str):
+    """One memory with its whole content, put back together from its chunks."""
+    await ensure_ready()
+
+    # Records from before chunking are stored under the document id itself
+    first = await store_call(store.fetch, [doc_id, chunk_id(doc_id, 0)])
+    record = first.get(chunk_id(doc_id, 0)) or first.get(doc_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Memory not found")
+    meta = record.get("metadata") or {}
+    chunks = {0: meta}
+    rest = [chunk_id(doc_id, i) for i in range(1, int(meta.get("chunks", 1)))]
+    if rest:
+        for vid, other in (await store_call(store.fetch, rest)).items():
+            chunks[int(vid.rsplit("#", 1)[1])] = other.get("metadata") or {}
+    parts = [chunks[i] for i in sorted(chunks)]
+    # Chunks stored before "start" was kept are joined on their overlap
+    starts = [int(part["start"]) for part in parts] if all("start" in part for part in parts) else None
+
+    return FastJSONResponse({
+        "id": doc_id,
+        "content": join_chunks([part.get("content", "") for part in parts], starts) or 'No content',
+        "metadata": {
+            "title": meta.get("title") or 'Unknown Title',
+            "url": meta.get("url") or '#',
+            "time": meta.get("timestamp") or datetime.now().isoformat(),
+            "platform": meta.get("platform"),
+        },
+    })
 
 class DeleteRequest(BaseModel):
     ids: list[str] = []
@@ -266,27 +1109,128 @@ class DeleteRequest(BaseModel):
 
 @app.delete("/memories")
 async def delete_memories(req: DeleteRequest):
-    if not index:
-         raise HTTPException(status_code=500, detail="Pinecone API Key not configured")
+    await ensure_ready()
 
     if req.delete_all:
         # Delete everything in the namespace (or index if no namespace)
-        # Note: Pinecone delete_all=True is deprecated in some clients, but delete(delete_all=True) works
         try:
-            index.delete(delete_all=True)
+            await store_call(store.delete_all)
+            # Queued ingests would bring deleted pages back
+            await ingest_journal.clear()
+            seen_cache.clear()
+            memory_index.clear()
+            query_results.clear()
             return {"status": "All memories deleted"}
+        except HTTPException:
+            raise
         except Exception as e:
              raise HTTPException(status_code=500, detail=f"Failed to delete all: {str(e)}")
     
     if req.ids:
         try:
-            index.delete(ids=req.ids)
+            # Queued ingests of these pages would bring them back
+            await ingest_journal.discard(req.ids)
+            # Each document id also covers all of its chunks
+            await store_call(store.delete, expand_doc_ids(req.ids))
+            seen_cache.discard(req.ids)
+            memory_index.remove(req.ids)
+            query_results.clear()
             return {"status": f"Deleted {len(req.ids)} memories"}
+        except HTTPException:
+            raise
         except Exception as e:
              raise HTTPException(status_code=500, detail=f"Failed to delete IDs: {str(e)}")
 
     return {"status": "No action taken"}
 
+class ReindexRequest(BaseModel):
+    model: str
+    name: str
+    backend: Optional[str] = None
+    store: Optional[str] = None
+    prefix: Optional[str] = None
+
+# The re-index started through /admin/reindex: its task, Reindexer and target
+reindex_job = {}
+
+@app.post("/admin/reindex", status_code=202)
+async def start_reindex(req: ReindexRequest):
+    """Re-embeds every memory with another model into a new index in the background, then reads from it."""
+    await ensure_ready()
+    task = reindex_job.get("task")
+    if task and not task.done():
+        raise HTTPException(status_code=409, detail="A re-index is already running")
+    try:
+        target = target_index(current_index(), req.model, req.name, req.backend, req.store, req.prefix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    reindex_job.clear()
+    reindex_job.update(target=target, task=asyncio.create_task(run_reindex(target)))
+    return {"status": "started", "target": target}
+
+@app.get("/admin/reindex")
+def reindex_status():
+    reindexer = reindex_job.get("reindexer")
+    return {
+        "active": read_active(),
+        "target": reindex_job.get("target"),
+        "progress": reindexer.progress if reindexer else None,
+        "catch_up": reindex_job["catch_up"].progress if "catch_up" in reindex_job else None,
+        "error": reindex_job.get("error"),
+    }
+
+async def run_reindex(target_spec):
+    """Copies, switches reads over once caught up, then copies what came in during the switch."""
+    global model, store, embedding_dim
+    source_spec = current_index()
+    try:
+        target = await run_in_pool(store_pool, open_store, target_spec)
+        with model_pool(target_spec) as pool:
+            reindexer = Reindexer(store, target, pool, job={"source": source_spec, "target": target_spec})
+            reindex_job["reindexer"] = reindexer
+            # Hours for a big history: its own thread, not one of the store pool's
+            settled = await asyncio.to_thread(reindexer.run)
+        if not settled:
+            reindex_job["error"] = "Writes kept coming faster than the catch-up passes, start it again to resume"
+            return
+        switch_reads(target_spec, source_spec)
+        if EMBED_SERVER_SOCKET:
+            # The embedding server owns the model, everyone switches on the next restart
+            logger.warning("reindex_restart_needed", detail="Restart the server to read from the new index")
+            return
+        new_model = await run_in_pool(encode_pool, load_model, target_spec["backend"], target_spec["model"])
+        new_dim = await run_in_pool(encode_pool, lambda: len(new_model.encode(["warm up"])[0]))
+        previous = store
+        # Swapped together, once writes encoded with the old model are stored:
+        # a vector from one model never meets the other's index
+        async with swap_guard.swapping():
+            model, store, embedding_dim = new_model, with_hot_tier(target), new_dim
+            set_chunk_tokenizer(model)
+            query_vectors.clear()
+            query_results.clear()
+        await finish_reindex(previous)
+        if isinstance(store, TieredStore):
+            asyncio.create_task(load_indexes())
+    except Exception as e:
+        reindex_job["error"] = f"{type(e).__name__}: {e}"
+        logger.error("reindex_failed", error=reindex_job["error"])
+
+async def finish_reindex(previous=None):
+    """After a switch, copies once what the old index got between the last pass and the switch."""
+    active = read_active()
+    if not active or active.get("caught_up"):
+        return
+    try:
+        if previous is None:
+            previous = await run_in_pool(store_pool, open_store, active["previous"])
+        reindexer = Reindexer(previous, store, encode_pool, encode_fn=lambda texts: model.encode(texts))
+        reindex_job["catch_up"] = reindexer
+        await run_in_pool(store_pool, reindexer.catch_up)
+        mark_caught_up()
+        query_results.clear()
+    except Exception as e:
+        logger.error("reindex_catch_up_failed", error=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     # Change port to 7860
@@ -0,0 +1,151 @@
+import base64
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+# Local secondary index of (timestamp, id, title, url, platform) used to list
+# memories in time order without running a vector search
+MEMORY_INDEX_PATH = os.getenv("MEMORY_INDEX_PATH", "memory_index.sqlite")
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 500
+
+
+def parse_timestamp(value):
+    """Epoch seconds of an ISO timestamp from the extension, now if it can't be parsed."""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return time.time()
+
+
+def encode_cursor(ts, doc_id):
+    return base64.urlsafe_b64encode(f"{ts!r}|{doc_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    ts, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    return float(ts), doc_id
+
+
+class MemoryIndex:
+    def __init__(self, path=MEMORY_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS memories ("
+            "doc_id TEXT PRIMARY KEY, ts REAL NOT NULL, timestamp TEXT, "
+            "title TEXT, url TEXT, platform TEXT, preview TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS memories_ts ON memories (ts, doc_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS memories_platform_ts ON memories (platform, ts, doc_id)")
+        self._db.commit()
+
+    def add(self, doc_id, timestamp, title, url, platform, preview):
+        self.add_many([(doc_id, timestamp, title, url, platform, preview)])
+
+    def add_many(self, rows):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO memories VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(d, parse_timestamp(t), t, title, url, p, preview) for d, t, title, url, p, preview in rows],
+            )
+            self._db.commit()
+
+    def remove(self, doc_ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM memories WHERE doc_id = ?", [(d,) for d in doc_ids])
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM memories")
+            self._db.commit()
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+
+    def documents(self):
+        """(doc_id, ts, url) of every memory, newest first."""
+        with self._lock:
+            return self._db.execute("SELECT doc_id, ts, url FROM memories ORDER BY ts DESC, doc_id DESC").fetchall()
+
+    def page(self, limit=LIST_DEFAULT_LIMIT, before=None, after=None, platform=None):
+        """Newest-first page of memories.
+
+        before / after are cursors from a previous page: `before` continues to
+        older items, `after` returns items newer than the cursor. Returns
+        (rows, next_before, next_after), where each cursor is None at the end.
+        """
+        limit = max(1, min(int(limit), LIST_MAX_LIMIT))
+        where, args = [], []
+        if platform:
+            where.append("platform = ?")
+            args.append(platform.upper())
+        if before:
+            ts, doc_id = decode_cursor(before)
+            where.append("(ts < ? OR (ts = ? AND doc_id < ?))")
+            args += [ts, ts, doc_id]
+        if after:
+            ts, doc_id = decode_cursor(after)
+            where.append("(ts > ? OR (ts = ? AND doc_id > ?))")
+            args += [ts, ts, doc_id]
+        sql = "SELECT doc_id, ts, timestamp, title, url, platform, preview FROM memories"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # Paging forward from `after` walks upwards from the cursor, then flips back to newest-first
+        order = "ASC" if after and not before else "DESC"
+        sql += f" ORDER BY ts {order}, doc_id {order} LIMIT ?"
+
+        with self._lock:
+            rows = self._db.execute(sql, args + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "ASC":
+            rows.reverse()
+
+        items = [
+            {"id": r[0], "ts": r[1], "timestamp": r[2], "title": r[3], "url": r[4], "platform": r[5], "preview": r[6]}
+            for r in rows
+        ]
+        if not items:
+            return items, None, None
+        older = encode_cursor(rows[-1][1], rows[-1][0])
+        newer = encode_cursor(rows[0][1], rows[0][0])
+        if order == "DESC":
+            return items, (older if more else None), newer
+        return items, older, (newer if more else None)
+
+    def rebuild(self, store, platform_of, batch_size=100):
+        """Refills the index from every record in the vector store. Returns the number of documents."""
+        docs = {}
+        ids = []
+
+        def flush():
+            for record in store.fetch(ids).values():
+                meta = record.get("metadata") or {}
+                doc_id = meta.get("doc_id") or record["id"]
+                # Keep the first chunk, it starts at the top of the page
+                if doc_id in docs and meta.get("chunk", 0) >= docs[doc_id][0]:
+                    continue
+                url = meta.get("url", "#")
+                docs[doc_id] = (meta.get("chunk", 0), (
+                    doc_id, meta.get("timestamp", ""), meta.get("title", "Unknown Title"), url,
+                    meta.get("platform") or platform_of(url), meta.get("content", "")[:500],
+                ))
+            ids.clear()
+
+        for vid in store.list():
+            ids.append(vid)
+            if len(ids) >= batch_size:
+                flush()
+        if ids:
+            flush()
+
+        self.clear()
+        self.add_many([row for _, row in docs.values()])
+        return len(docs)
@@ -0,0 +1,141 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Latency buckets in seconds, from sub-millisecond local work up to slow Pinecone calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Input sizes in characters
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), v) for key, v in self._values.items()]
+
+
+class Gauge:
+    """A value read at scrape time from a callback, so it's never stale."""
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name, self.help = name, help
+        self.read = read
+
+    def samples(self):
+        value = self.read()
+        if isinstance(value, dict):
+            # {label value: number} for one-label gauges
+            return [(self.name, (("name", k),), (), v) for k, v in value.items()]
+        return [(self.name, (), (), value)]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    out.append((self.name + "_bucket", key, (("le", repr(bound)),), cumulative))
+                out.append((self.name + "_bucket", key, (("le", "+Inf"),), series[-1]))
+                out.append((self.name + "_sum", key, (), series[-2]))
+                out.append((self.name + "_count", key, (), series[-1]))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help, read):
+        return self._add(Gauge(name, help, read))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter("sentinel_requests_total", "HTTP requests by route, method and status")
+REQUEST_ERRORS = registry.counter("sentinel_request_errors_total", "HTTP requests that failed with a 5xx or an exception")
+REQUEST_SECONDS = registry.histogram("sentinel_request_seconds", "HTTP request latency by route")
+STAGE_SECONDS = registry.histogram("sentinel_stage_seconds", "Latency of pipeline stages (ingest: classify/journal/encode/upsert, recall: encode/query/serialize)")
+INPUT_CHARS = registry.histogram("sentinel_input_chars", "Size of ingested content and recall queries in characters", SIZE_BUCKETS)
+HOT_TIER_QUERIES = registry.counter("sentinel_hot_tier_queries_total", "Store queries by who answered them (covered/hot: the in-memory tier alone, merged: tier plus remote index)")
+ADMISSION_REJECTED = registry.counter("sentinel_admission_rejected_total", "Requests answered with a 429 by op and reason (rate_limited, queue_full, shed)")
@@ -0,0 +1,317 @@
+import heapq
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import logger
+from vector_store import VectorStore
+
+
+# "monthly" writes every memory to the partition of the month it was visited,
+# "none" keeps the single flat index
+VECTOR_PARTITIONS = os.getenv("VECTOR_PARTITIONS", "monthly")
+# Pinecone namespace / local directory name of a partition is this prefix + "YYYY-MM"
+PARTITION_PREFIX = os.getenv("PARTITION_PREFIX", "mem-")
+# Which partition every stored id lives in (default: next to the local store, or
+# partition_directory.sqlite for Pinecone). Rebuilt by listing every partition if it goes missing.
+PARTITION_DIRECTORY_PATH = os.getenv("PARTITION_DIRECTORY_PATH", "")
+PARTITION_QUERY_PARALLEL = int(os.getenv("PARTITION_QUERY_PARALLEL", "8"))
+
+# Records without a usable "ts" go here
+UNDATED = "undated"
+
+
+def partition_key(ts):
+    """"YYYY-MM" of an epoch timestamp (UTC), or UNDATED."""
+    if not isinstance(ts, (int, float)) or ts != ts:
+        return UNDATED
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m")
+
+
+def partition_range(key):
+    """[start, end) epoch seconds covered by a partition, None for UNDATED."""
+    if key == UNDATED:
+        return None
+    start = datetime.strptime(key, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.timestamp(), end.timestamp()
+
+
+def time_bounds(filter):
+    """(low, high) of the "ts" conditions in a filter, None where unbounded."""
+    low = high = None
+    conditions = []
+    if filter:
+        conditions.append(filter.get("ts"))
+        conditions += [sub.get("ts") for sub in filter.get("$and", [])]
+    for condition in conditions:
+        if not isinstance(condition, dict):
+            continue
+        for op, value in condition.items():
+            if op in ("$gt", "$gte"):
+                low = value if low is None else max(low, value)
+            elif op in ("$lt", "$lte"):
+                high = value if high is None else min(high, value)
+            elif op == "$eq":
+                low = value if low is None else max(low, value)
+                high = value if high is None else min(high, value)
+    return low, high
+
+
+class PartitionedStore(VectorStore):
+    """A VectorStore made of one child store per month.
+
+    Writes are routed by the "ts" metadata field. Queries only visit the
+    partitions that overlap the filter's time range, in parallel, and merge
+    the hits by score. Retention drops whole partitions.
+
+    open_partition(name) returns the child store for a partition name (a
+    Pinecone namespace or a local directory). legacy is the flat store from
+    before partitioning, still searched and cleaned up on rewrite, never
+    written to. Its ids are listed once into the directory, so writes only
+    delete from it the records it still holds.
+
+    Several processes may share one directory (WEB_WORKERS > 1). Each picks
+    up the partitions the others created or dropped when the directory
+    changed under it.
+    """
+
+    def __init__(self, open_partition, directory_path, existing=(), legacy=None,
+                 prefix=PARTITION_PREFIX, parallel=PARTITION_QUERY_PARALLEL):
+        self.open_partition = open_partition
+        self.prefix = prefix
+        self.legacy = legacy
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="partition")
+        self._db = sqlite3.connect(directory_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS directory (id TEXT PRIMARY KEY, partition TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS directory_partition ON directory (partition)")
+        # The partitions that exist, so other processes can see new ones without scanning the directory
+        self._db.execute("CREATE TABLE IF NOT EXISTS partitions (key TEXT PRIMARY KEY)")
+        # Ids still in the legacy store, and whether it was listed yet
+        self._db.execute("CREATE TABLE IF NOT EXISTS legacy (id TEXT PRIMARY KEY)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS migrations (step TEXT PRIMARY KEY)")
+        self._db.commit()
+
+        self._partitions = {}
+        keys = {name[len(prefix):] for name in existing if name.startswith(prefix)}
+        keys |= {row[0] for row in self._db.execute("SELECT DISTINCT partition FROM directory")}
+        keys |= {row[0] for row in self._db.execute("SELECT key FROM partitions")}
+        for key in sorted(keys):
+            self._partitions[key] = open_partition(prefix + key)
+        self._db.executemany("INSERT OR IGNORE INTO partitions VALUES (?)", [(key,) for key in keys])
+        self._db.commit()
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if self._partitions and self._db.execute("SELECT 1 FROM directory LIMIT 1").fetchone() is None:
+            self._rebuild_directory()
+        if legacy is not None:
+            self._list_legacy()
+
+    def _rebuild_directory(self):
+        for key, partition in self._partitions.items():
+            rows = [(vid, key) for vid in partition.list()]
+            self._db.executemany("INSERT OR REPLACE INTO directory VALUES (?, ?)", rows)
+            logger.info("partition_directory_rebuilt", partition=key, ids=len(rows))
+        self._db.commit()
+
+    def _list_legacy(self):
+        if self._db.execute("SELECT 1 FROM migrations WHERE step = 'legacy_listed'").fetchone():
+            return
+        rows = [(vid,) for vid in self.legacy.list()]
+        self._db.executemany("INSERT OR IGNORE INTO legacy VALUES (?)", rows)
+        self._db.execute("INSERT OR IGNORE INTO migrations VALUES ('legacy_listed')")
+        self._db.commit()
+        logger.info("partition_legacy_listed", ids=len(rows))
+
+    def _refresh(self):
+        """Catches up with partitions another process created or dropped since we last looked."""
+        with self._lock:
+            # data_version only moves when another connection committed
+            version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+            keys = {row[0] for row in self._db.execute("SELECT key FROM partitions")}
+            for key in sorted(keys - set(self._partitions)):
+                self._partitions[key] = self.open_partition(self.prefix + key)
+                logger.info("partition_discovered", partition=key)
+            for key in set(self._partitions) - keys:
+                del self._partitions[key]  # the process that dropped it deleted the data
+
+    def _partition(self, key):
+        with self._lock:
+            if key not in self._partitions:
+                self._partitions[key] = self.open_partition(self.prefix + key)
+                self._db.execute("INSERT OR IGNORE INTO partitions VALUES (?)", (key,))
+                self._db.commit()
+                logger.info("partition_created", partition=key)
+            return self._partitions[key]
+
+    def _locate(self, ids):
+        """{partition key: [ids]} for ids we know, plus the list of ids we don't."""
+        ids = list(ids)
+        known = {}
+        self._refresh()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT id, partition FROM directory WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                known.update(rows)
+        located = {}
+        for vid, key in known.items():
+            located.setdefault(key, []).append(vid)
+        return located, [vid for vid in ids if vid not in known]
+
+    def _take_from_legacy(self, ids):
+        """Deletes the ids the legacy store still holds, from it and from the directory."""
+        if self.legacy is None or not ids:
+            return
+        held = []
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                held += [row[0] for row in self._db.execute(
+                    f"SELECT id FROM legacy WHERE id IN ({','.join('?' * len(batch))})", batch
+                )]
+        if not held:
+            return
+        self.legacy.delete(held)
+        with self._lock:
+            self._db.executemany("DELETE FROM legacy WHERE id = ?", [(vid,) for vid in held])
+            self._db.commit()
+
+    def partitions_for(self, filter):
+        """Partition keys whose time range can hold a match for the filter."""
+        low, high = time_bounds(filter)
+        self._refresh()
+        with self._lock:
+            keys = list(self._partitions)
+        if low is None and high is None:
+            return keys
+        selected = []
+        for key in keys:
+            bounds = partition_range(key)
+            if bounds is None:
+                continue  # undated records can't satisfy a time condition
+            start, end = bounds
+            if (high is None or start <= high) and (low is None or end > low):
+                selected.append(key)
+        return selected
+
+    # --- VectorStore ---
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+        groups = {}
+        for record in vectors:
+            groups.setdefault(partition_key((record.get("metadata") or {}).get("ts")), []).append(record)
+        located, unknown = self._locate(record["id"] for record in vectors)
+        # Child stores do their own locking, our lock only guards the directory
+        # so parallel upserts into different partitions don't wait on each other
+        for key, records in groups.items():
+            self._partition(key).upsert(records)
+        # A revisit with a new timestamp moves the record, drop the copy it left behind
+        new_key = {record["id"]: key for key, records in groups.items() for record in records}
+        for old_key, ids in located.items():
+            moved = [vid for vid in ids if new_key[vid] != old_key]
+            if moved and old_key in self._partitions:
+                self._partitions[old_key].delete(moved)
+        self._take_from_legacy(unknown)
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO directory VALUES (?, ?)", list(new_key.items()))
+            self._db.commit()
+
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None):
+        with self._lock:
+            targets = [self._partitions[key] for key in self.partitions_for(filter)]
+        if self.legacy is not None:
+            targets.append(self.legacy)
+        if not targets:
+            return {"matches": []}
+
+        def search(store):
+            return store.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                               include_values=include_values, filter=filter)["matches"]
+
+        if len(targets) == 1:
+            return {"matches": search(targets[0])}
+        results = list(self._pool.map(search, targets))
+        return {"matches": heapq.nlargest(top_k, (m for matches in results for m in matches), key=lambda m: m["score"])}
+
+    def fetch(self, ids):
+        located, unknown = self._locate(ids)
+        found = {}
+        for key, group in located.items():
+            if key in self._partitions:  # unless retention just dropped it
+                found.update(self._partitions[key].fetch(group))
+        if unknown and self.legacy is not None:
+            found.update(self.legacy.fetch(unknown))
+        return found
+
+    def list(self):
+        self._refresh()
+        with self._lock:
+            keys = list(self._partitions)
+        for key in keys:
+            with self._lock:
+                rows = self._db.execute("SELECT id FROM directory WHERE partition = ?", (key,)).fetchall()
+            yield from (row[0] for row in rows)
+        if self.legacy is not None:
+            yield from self.legacy.list()
+
+    def delete(self, ids):
+        located, unknown = self._locate(ids)
+        for key, group in located.items():
+            if key in self._partitions:
+                self._partitions[key].delete(group)
+        self._take_from_legacy(unknown)
+        with self._lock:
+            self._db.executemany("DELETE FROM directory WHERE id = ?", [(vid,) for group in located.values() for vid in group])
+            self._db.commit()
+
+    def delete_all(self):
+        with self._lock:
+            for partition in self._partitions.values():
+                partition.drop()
+            self._partitions.clear()
+            if self.legacy is not None:
+                self.legacy.delete_all()
+            self._db.execute("DELETE FROM directory")
+            self._db.execute("DELETE FROM partitions")
+            self._db.execute("DELETE FROM legacy")
+            self._db.commit()
+
+    def drop(self):
+        self.delete_all()
+
+    # --- partitions ---
+
+    def drop_before(self, cutoff_ts):
+        """Drops every partition that ends at or before cutoff_ts. Returns the ids that were in them."""
+        dropped = []
+        with self._lock:
+            for key in list(self._partitions):
+                bounds = partition_range(key)
+                if bounds is None or bounds[1] > cutoff_ts:
+                    continue
+                ids = [row[0] for row in self._db.execute("SELECT id FROM directory WHERE partition = ?", (key,))]
+                self._partitions.pop(key).drop()
+                self._db.execute("DELETE FROM directory WHERE partition = ?", (key,))
+                self._db.execute("DELETE FROM partitions WHERE key = ?", (key,))
+                self._db.commit()
+                dropped += ids
+                logger.info("partition_dropped", partition=key, ids=len(ids))
+        return dropped
+
+    def stats(self):
+        self._refresh()
+        with self._lock:
+            counts = dict(self._db.execute("SELECT partition, COUNT(*) FROM directory GROUP BY partition").fetchall())
+            keys = sorted(self._partitions)
+        return {"partitions": {key: counts.get(key, 0) for key in keys}, "legacy": self.legacy is not None}
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from generations import Generation
+
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+# Query vectors never go stale for a given model, results do as soon as something is ingested
+QUERY_VECTOR_TTL_S = float(os.getenv("QUERY_VECTOR_TTL_S", "3600"))
+QUERY_RESULT_TTL_S = float(os.getenv("QUERY_RESULT_TTL_S", "30"))
+
+
+def normalize_query(text, casefold=False):
+    """Cache key of a query. Spacing never changes the vector, case only doesn't for an uncased model."""
+    text = " ".join(text.split())
+    return text.lower() if casefold else text
+
+
+class _Abandoned(Exception):
+    """The caller computing a value was cancelled, a waiting one computes it instead."""
+
+
+class QueryCache:
+    """Size-bounded LRU with TTL, where concurrent misses on one key share a single computation.
+
+    With a shared Generation, clear() in one worker clears the cache of every worker.
+    """
+
+    def __init__(self, max_size=QUERY_CACHE_SIZE, ttl_s=QUERY_VECTOR_TTL_S, generation=None):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.shared = generation or Generation("query_cache")
+        self._items = OrderedDict()
+        self._inflight = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl_s > 0
+
+    async def get_or_compute(self, key, compute):
+        """Returns the cached value for key, or awaits compute() once for everyone asking."""
+        if not self.enabled:
+            return await compute()
+        if self.shared.changed():
+            self._drop()
+
+        entry = self._items.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._items[key]
+            self.expirations += 1
+
+        while key in self._inflight:
+            # Somebody is already computing this one, just wait for it
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _Abandoned:
+                continue
+
+        self.misses += 1
+        generation = self._generation
+        pending = asyncio.get_running_loop().create_future()
+        self._inflight[key] = pending
+        try:
+            value = await compute()
+        except BaseException as e:
+            if not pending.done():
+                # A failure is everyone's, a cancellation only ours: waiters then take over
+                pending.set_exception(e if isinstance(e, Exception) else _Abandoned())
+                # Mark it retrieved so nobody-waiting doesn't log "exception never retrieved"
+                pending.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is pending:
+                del self._inflight[key]
+
+        pending.set_result(value)
+        # A clear() while we were computing means the value may already be stale
+        if generation == self._generation:
+            self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl_s, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._drop()
+        self.shared.bump()
+
+    def _drop(self):
+        # In-flight computations still finish, they just aren't shared with new callers
+        self._generation += 1
+        self._items.clear()
+        self._inflight.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
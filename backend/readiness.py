@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+
+import logger
+
+
+# Requests that arrive while the model is still loading wait this long for it,
+# then get a 503. 0 means answer 503 right away.
+READY_WAIT_S = float(os.getenv("READY_WAIT_S", "10"))
+# A failed warm-up is tried again after this long, doubling each time up to the max
+WARMUP_RETRY_S = float(os.getenv("WARMUP_RETRY_S", "2"))
+WARMUP_RETRY_MAX_S = float(os.getenv("WARMUP_RETRY_MAX_S", "60"))
+# After this many failed warm-ups /healthz fails too, so the process gets restarted (0 never)
+WARMUP_MAX_FAILURES = int(os.getenv("WARMUP_MAX_FAILURES", "5"))
+
+# Set when the process starts importing the app, so we can report import-to-ready time
+PROCESS_STARTED = time.perf_counter()
+
+
+class Readiness:
+    """Tracks the warm-up stages of the server and whether it can take requests yet."""
+
+    def __init__(self):
+        self.stages = {}
+        self.error = None
+        self.failures = 0
+        self._event = None
+        self._last = PROCESS_STARTED
+
+    @property
+    def is_ready(self):
+        return self._event is not None and self._event.is_set() and self.error is None
+
+    @property
+    def is_alive(self):
+        """False once warm-up failed WARMUP_MAX_FAILURES times in a row, a restart may do better."""
+        return not WARMUP_MAX_FAILURES or self.failures < WARMUP_MAX_FAILURES
+
+    def stage_done(self, name, started=None):
+        """Records how long a stage took and how long since import, and logs it."""
+        now = time.perf_counter()
+        took = now - (started if started is not None else self._last)
+        self._last = now
+        self.stages[name] = {"took_s": round(took, 3), "since_import_s": round(now - PROCESS_STARTED, 3)}
+        logger.info("startup_stage", stage=name, took_s=round(took, 3), since_import_s=round(now - PROCESS_STARTED, 3))
+
+    def _ensure_event(self):
+        # Created on first use so it belongs to the server's event loop
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def set_ready(self):
+        self.stage_done("ready", PROCESS_STARTED)
+        self.error = None
+        self.failures = 0
+        self._ensure_event().set()
+
+    def set_failed(self, error):
+        """Records a failed warm-up. Returns how long to wait before trying again."""
+        self.error = f"{type(error).__name__}: {error}"
+        self.failures += 1
+        retry_in = min(WARMUP_RETRY_MAX_S, WARMUP_RETRY_S * 2 ** (self.failures - 1))
+        logger.error("warmup_failed", error=self.error, failures=self.failures, retry_in_s=retry_in)
+        # Wake up waiting requests, they'll see the error
+        self._ensure_event().set()
+        return retry_in
+
+    async def wait(self, timeout=READY_WAIT_S):
+        """True once ready, False if warm-up failed or didn't finish within timeout."""
+        event = self._ensure_event()
+        if not event.is_set() and timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.is_ready
+
+    def snapshot(self):
+        return {"ready": self.is_ready, "error": self.error, "failures": self.failures, "stages": dict(self.stages)}
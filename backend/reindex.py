@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Re-embeds every memory with another model into a new index, then switches reads to it.
+
+Passes over the current index re-encode each record's stored content in a
+process pool and upsert it into the target. Progress is checkpointed per
+record, so a crashed job resumes and later passes only redo what changed.
+Once a pass finds (almost) nothing left, active_index.json is pointed at the
+target. The server reads it at startup and copies whatever was written to
+the old index in between. The same job runs in the server via POST /admin/reindex.
+
+Usage: python reindex.py --model <name> --name <new store dir | Pinecone index> [--prefix v2-]
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import logger
+from embedding import EMBEDDING_BACKEND, EMBEDDING_MODEL, load_model
+from partitions import PARTITION_PREFIX
+from vector_store import LOCAL_STORE_PATH, PINECONE_INDEX, VECTOR_STORE, create_vector_store
+
+
+# Which model and store serve reads, written when a re-index switches over
+ACTIVE_INDEX_PATH = os.getenv("ACTIVE_INDEX_PATH", "active_index.json")
+# Per-record progress of the running (or crashed) re-index
+REINDEX_STATE_PATH = os.getenv("REINDEX_STATE_PATH", "reindex.sqlite")
+REINDEX_BATCH = int(os.getenv("REINDEX_BATCH", "128"))
+# Processes encoding with the new model, each loads its own copy
+REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS", "2"))
+# Reads switch once a catch-up pass changes at most this many records
+REINDEX_SETTLE_CHANGES = int(os.getenv("REINDEX_SETTLE_CHANGES", "10"))
+REINDEX_MAX_PASSES = int(os.getenv("REINDEX_MAX_PASSES", "5"))
+
+
+# --- which index is active ---
+
+def default_index():
+    """The model and store the settings describe."""
+    return {
+        "model": EMBEDDING_MODEL,
+        "backend": EMBEDDING_BACKEND,
+        "store": VECTOR_STORE,
+        "name": LOCAL_STORE_PATH if VECTOR_STORE == "local" else PINECONE_INDEX,
+        "prefix": PARTITION_PREFIX,
+    }
+
+
+def read_active(path=ACTIVE_INDEX_PATH):
+    """{"current", "previous", "caught_up", "switched_at"} of the last switch, or None."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def current_index(path=ACTIVE_INDEX_PATH):
+    active = read_active(path)
+    return active["current"] if active else default_index()
+
+
+def _write_active(active, path):
+    # Written next to the target and renamed, so a crash never leaves half a file
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(active, f, indent=2)
+    os.replace(tmp, path)
+
+
+def switch_reads(target, source, path=ACTIVE_INDEX_PATH):
+    _write_active({"current": target, "previous": source, "caught_up": False, "switched_at": time.time()}, path)
+    logger.info("reindex_switched", model=target["model"], store=target["store"], name=target["name"])
+
+
+def mark_caught_up(path=ACTIVE_INDEX_PATH):
+    active = read_active(path)
+    if active:
+        _write_active({**active, "caught_up": True}, path)
+
+
+class SwapGuard:
+    """Keeps the server's model and store from being swapped under a write.
+
+    Writes that encode with the model and upsert into the store run inside
+    writing(), any number at once. swapping() holds new writes back, waits
+    for the running ones, and lets them go again once the pair is swapped,
+    so no vector of the old model lands in the new index.
+    """
+
+    def __init__(self):
+        self._writers = 0
+        self._swapping = False
+        self._changed = None
+
+    def _condition(self):
+        # Created on first use so it belongs to the server's event loop
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    @contextlib.asynccontextmanager
+    async def writing(self):
+        changed = self._condition()
+        async with changed:
+            await changed.wait_for(lambda: not self._swapping)
+            self._writers += 1
+        try:
+            yield
+        finally:
+            async with changed:
+                self._writers -= 1
+                changed.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def swapping(self):
+        changed = self._condition()
+        async with changed:
+            await changed.wait_for(lambda: not self._swapping)
+            self._swapping = True
+            await changed.wait_for(lambda: self._writers == 0)
+        try:
+            yield
+        finally:
+            async with changed:
+                self._swapping = False
+                changed.notify_all()
+
+
+def open_store(spec, hot_tier=False):
+    return create_vector_store(spec["store"], name=spec["name"], prefix=spec.get("prefix"), hot_tier=hot_tier)
+
+
+def target_index(source, model, name, backend=None, store=None, prefix=None):
+    """Spec of a re-index target, missing fields taken from the source. ValueError if it would clash."""
+    target = {
+        "model": model,
+        "backend": backend or source.get("backend", EMBEDDING_BACKEND),
+        "store": store or source["store"],
+        "name": name,
+        "prefix": prefix or source.get("prefix", PARTITION_PREFIX),
+    }
+    if target["store"] == source["store"] and target["name"] == source["name"]:
+        # Same Pinecone index is fine with another namespace prefix, the prefixes may not overlap
+        old, new = source.get("prefix", PARTITION_PREFIX), target["prefix"]
+        if target["store"] == "local" or old.startswith(new) or new.startswith(old):
+            raise ValueError("The target must be another store, or another index / partition prefix")
+    return target
+
+
+# --- encoding in worker processes ---
+
+_worker_model = None
+
+
+def _load_worker_model(backend, name):
+    global _worker_model
+    _worker_model = load_model(backend, name)
+
+
+def _encode(texts):
+    return np.asarray(_worker_model.encode(texts), dtype=np.float32)
+
+
+def model_pool(spec, workers=REINDEX_WORKERS):
+    """Processes with the target model loaded. Spawned, not forked, the server has threads running."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_load_worker_model,
+        initargs=(spec.get("backend", EMBEDDING_BACKEND), spec["model"]),
+    )
+
+
+def fingerprint(metadata):
+    """Hash of a record's metadata, stable across Pinecone's round trip (ints come back as floats)."""
+    canonical = {}
+    for key, value in metadata.items():
+        if value is None:
+            continue
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        canonical[key] = value
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# --- the job ---
+
+class Reindexer:
+    """Copies every record of source into target, re-encoded by encode_fn in pool.
+
+    done (in state_path) holds the metadata fingerprint each record was
+    copied with, so a resumed job and later passes skip what is unchanged.
+    job describes source and target; a different one starts from scratch.
+    Blocking: run it in a worker thread.
+    """
+
+    def __init__(self, source, target, pool, encode_fn=_encode, job=None,
+                 state_path=REINDEX_STATE_PATH, batch_size=REINDEX_BATCH, max_in_flight=None):
+        self.source = source
+        self.target = target
+        self.pool = pool
+        self.encode_fn = encode_fn
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight or 2 * getattr(pool, "_max_workers", 2)
+        self.progress = {"status": "idle", "passes": 0, "position": 0, "total": 0, "copied": 0, "deleted": 0}
+
+        self._db = sqlite3.connect(state_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS job (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS done (id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)")
+        if job is not None:
+            saved = self._db.execute("SELECT value FROM job WHERE key = 'job'").fetchone()
+            if saved is None or json.loads(saved[0]) != job:
+                self._db.execute("DELETE FROM done")
+                self._db.execute("INSERT OR REPLACE INTO job VALUES ('job', ?)", (json.dumps(job),))
+            else:
+                logger.info("reindex_resumed", records_done=self._db.execute("SELECT COUNT(*) FROM done").fetchone()[0])
+        self._db.commit()
+
+    def _done(self):
+        return dict(self._db.execute("SELECT id, fingerprint FROM done").fetchall())
+
+    def _target_changed(self, ids, done):
+        """Ids the target got a write or delete for since we copied them (after the switch)."""
+        current = self.target.fetch(ids)
+        changed = set()
+        for vid in ids:
+            record = current.get(vid)
+            if vid in done:
+                if record is None or fingerprint(record.get("metadata") or {}) != done[vid]:
+                    changed.add(vid)
+            elif record is not None:
+                changed.add(vid)
+        return changed
+
+    def _finish(self, future, records):
+        vectors = future.result()
+        self.target.upsert([
+            {"id": record["id"], "values": vector.tolist(), "metadata": record["metadata"]}
+            for record, vector in zip(records, vectors)
+        ])
+        self._db.executemany(
+            "INSERT OR REPLACE INTO done VALUES (?, ?)", [(r["id"], fingerprint(r["metadata"])) for r in records]
+        )
+        self._db.commit()
+        self.progress["copied"] += len(records)
+        return len(records)
+
+    def run_pass(self, protect_target=False):
+        """One pass over the source. Returns how many records were copied or deleted.
+
+        protect_target leaves records alone that were written to (or deleted
+        from) the target since they were copied, for the pass after the switch.
+        """
+        done = self._done()
+        ids = list(self.source.list())
+        self.progress.update(passes=self.progress["passes"] + 1, position=0, total=len(ids))
+        changed = 0
+        in_flight = collections.deque()
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            records = [
+                {"id": vid, "metadata": record.get("metadata") or {}}
+                for vid, record in self.source.fetch(batch).items()
+            ]
+            records = [r for r in records if done.get(r["id"]) != fingerprint(r["metadata"])]
+            if protect_target and records:
+                skip = self._target_changed([r["id"] for r in records], done)
+                records = [r for r in records if r["id"] not in skip]
+            self.progress["position"] = start + len(batch)
+            if not records:
+                continue
+            texts = [r["metadata"].get("content", "") for r in records]
+            in_flight.append((self.pool.submit(self.encode_fn, texts), records))
+            while len(in_flight) >= self.max_in_flight:
+                changed += self._finish(*in_flight.popleft())
+        while in_flight:
+            changed += self._finish(*in_flight.popleft())
+
+        # Deleted from the source since they were copied
+        seen = set(ids)
+        gone = [vid for vid in done if vid not in seen]
+        if protect_target and gone:
+            skip = set()
+            for start in range(0, len(gone), self.batch_size):
+                skip |= self._target_changed(gone[start:start + self.batch_size], done)
+            gone = [vid for vid in gone if vid not in skip]
+        for start in range(0, len(gone), self.batch_size):
+            batch = gone[start:start + self.batch_size]
+            self.target.delete(batch)
+            self._db.executemany("DELETE FROM done WHERE id = ?", [(vid,) for vid in batch])
+            self._db.commit()
+        self.progress["deleted"] += len(gone)
+        return changed + len(gone)
+
+    def run(self, max_passes=REINDEX_MAX_PASSES, settle=REINDEX_SETTLE_CHANGES):
+        """Passes until a catch-up pass changes at most `settle` records. True if it got there."""
+        self.progress["status"] = "running"
+        for _ in range(max_passes):
+            started = time.perf_counter()
+            changed = self.run_pass()
+            logger.info("reindex_pass", passes=self.progress["passes"], records=self.progress["total"],
+                        changed=changed, took_s=round(time.perf_counter() - started, 3))
+            # The first pass copies everything, only a later one can tell us we're caught up
+            if self.progress["passes"] > 1 and changed <= settle:
+                self.progress["status"] = "settled"
+                return True
+        self.progress["status"] = "unsettled"
+        return False
+
+    def catch_up(self):
+        """The pass after the switch: copies what the old index got in the meantime."""
+        self.progress["status"] = "catching_up"
+        changed = self.run_pass(protect_target=True)
+        self.progress["status"] = "done"
+        logger.info("reindex_caught_up", changed=changed)
+        return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embeds every memory with another model into a new index")
+    parser.add_argument("--model", required=True, help="Sentence-transformers model of the new index")
+    parser.add_argument("--name", required=True, help="Directory (local) or Pinecone index of the new index")
+    parser.add_argument("--backend", help="torch or onnx (default: the current one)")
+    parser.add_argument("--store", choices=("local", "pinecone"), help="default: the current kind")
+    parser.add_argument("--prefix", help="Partition prefix, to reuse a Pinecone index with new namespaces")
+    parser.add_argument("--workers", type=int, default=REINDEX_WORKERS)
+    parser.add_argument("--no-switch", action="store_true", help="Copy, but keep reading from the current index")
+    args = parser.parse_args()
+
+    source_spec = current_index()
+    target_spec = target_index(source_spec, args.model, args.name, args.backend, args.store, args.prefix)
+    source, target = open_store(source_spec), open_store(target_spec)
+    if source is None or target is None:
+        raise SystemExit("PINECONE_API_KEY is not set")
+
+    with model_pool(target_spec, args.workers) as pool:
+        job = Reindexer(source, target, pool, job={"source": source_spec, "target": target_spec})
+        settled = job.run()
+    if not settled:
+        raise SystemExit("Writes kept coming faster than the catch-up passes, run it again to resume")
+    if not args.no_switch:
+        switch_reads(target_spec, source_spec)
+        print("Switched. Restart the server: it reads the new index and copies what was written since the last pass.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Starts the API. With WEB_WORKERS=1 (default) this is plain `uvicorn main:app`.
+With more, it runs one embedding server that owns the model (embed_server.py)
+and that many uvicorn workers encoding through it, so the model is loaded once.
+
+Usage: python serve.py
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import logger
+
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = os.getenv("PORT", "7860")
+# Only the worker holding this lock runs the journal drain, retention and compaction
+BACKGROUND_LOCK_PATH = os.getenv("BACKGROUND_LOCK_PATH", "background.lock")
+
+_background_lock = None
+
+
+def runs_background_jobs(path=BACKGROUND_LOCK_PATH):
+    """True in exactly one worker process, the first to take the lock file.
+
+    The lock is held until the process exits, then the next worker to start
+    (uvicorn respawns dead ones) takes over. Always True for a single process.
+    """
+    global _background_lock
+    if WEB_WORKERS <= 1 or _background_lock is not None:
+        return True
+    import fcntl
+
+    handle = open(path, "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _background_lock = handle
+    return True
+
+
+def uvicorn_command(workers):
+    return [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", PORT, "--workers", str(workers)]
+
+
+def main():
+    from embed_server import EMBED_SERVER_SOCKET, DEFAULT_SOCKET
+    from vector_store import VECTOR_STORE
+
+    workers = WEB_WORKERS
+    if workers > 1 and VECTOR_STORE == "local":
+        # Every process would map its own copy of the local index and miss the others' writes
+        logger.warning("web_workers_need_pinecone", workers=workers, detail="Running one worker with the local store")
+        workers = 1
+    if workers <= 1:
+        os.execv(sys.executable, uvicorn_command(1))
+
+    socket_path = EMBED_SERVER_SOCKET or DEFAULT_SOCKET
+    env = {**os.environ, "EMBED_SERVER_SOCKET": socket_path, "WEB_WORKERS": str(workers)}
+
+    def start_embed_server():
+        return subprocess.Popen([sys.executable, "embed_server.py", "--socket", socket_path], env=env)
+
+    # Workers start listening right away and wait for the server during warm-up
+    embed_server = start_embed_server()
+    web = subprocess.Popen(uvicorn_command(workers), env=env)
+    logger.info("serving", workers=workers, embed_socket=socket_path)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        web.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while web.poll() is None:
+        if not stopping and embed_server.poll() is not None:
+            # Workers reconnect on their next encode
+            logger.error("embed_server_exited", code=embed_server.returncode)
+            embed_server = start_embed_server()
+        time.sleep(1)
+
+    embed_server.terminate()
+    embed_server.wait()
+    sys.exit(web.returncode)
+
+
+if __name__ == "__main__":
+    main()
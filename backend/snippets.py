@@ -0,0 +1,61 @@
+import os
+import re
+
+
+# Length of the snippet /recall returns in "snippet" mode
+RECALL_SNIPPET_CHARS = int(os.getenv("RECALL_SNIPPET_CHARS", "300"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+
+
+def _terms(text):
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 2}
+
+
+def make_snippet(text, query, max_chars=RECALL_SNIPPET_CHARS):
+    """The sentences of text that share the most words with query, within max_chars.
+
+    Matching sentences are taken best first, then widened with their neighbours
+    while there is room. Gaps between the windows are marked with "…".
+    Falls back to the start of the text when nothing matches.
+    """
+    if len(text) <= max_chars:
+        return text
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+    wanted = _terms(query)
+    scored = sorted(
+        ((len(wanted & _terms(s)), -i, i) for i, s in enumerate(sentences)),
+        reverse=True,
+    )
+    if not scored or scored[0][0] == 0:
+        return text[:max_chars].rstrip() + "…"
+
+    picked, used = set(), 0
+
+    def take(i):
+        nonlocal used
+        if i in picked or not 0 <= i < len(sentences):
+            return False
+        if used and used + len(sentences[i]) + 1 > max_chars:
+            return False
+        picked.add(i)
+        used += len(sentences[i]) + 1
+        return True
+
+    best = [i for hits, _, i in scored if hits > 0]
+    for i in best:
+        take(i)
+    # Room left: grow windows around the best sentences with their neighbours
+    for distance in range(1, len(sentences)):
+        if not any([take(i + distance) | take(i - distance) for i in best if i in picked]):
+            break
+
+    parts, previous = [], None
+    for i in sorted(picked):
+        if previous is not None and i != previous + 1:
+            parts.append("…")
+        parts.append(sentences[i])
+        previous = i
+    snippet = " ".join(parts)
+    return snippet if len(snippet) <= max_chars else snippet[:max_chars].rstrip() + "…"
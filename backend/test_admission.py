@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Checks admission control: token buckets, recall-first slots and ingest shedding.
+Runs offline against a bare ASGI app, no model or store.
+"""
+
+import asyncio
+
+from admission import Admission, AdmissionMiddleware, PriorityGate, RateLimiter, Rejected, client_key
+
+
+def test_token_bucket():
+    limiter = RateLimiter(rate=2, burst=3, max_clients=2)
+    assert [limiter.take("a", now=0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.take("a", now=0) == 0.5
+    assert limiter.take("a", now=0.5) == 0  # one token back after 1 / rate
+    assert limiter.take("b", now=0) == 0  # buckets are per client
+    limiter.take("c", now=0)
+    assert "a" not in limiter._buckets  # least recently seen dropped
+
+
+def test_recall_goes_first():
+    async def scenario():
+        gate = PriorityGate(2, limits={"recall": 2, "ingest": 1}, queue_max={"recall": 4, "ingest": 1})
+        await gate.acquire("recall")
+        await gate.acquire("ingest")
+        order = []
+
+        async def waiter(op):
+            await gate.acquire(op)
+            order.append(op)
+
+        ingest = asyncio.ensure_future(waiter("ingest"))
+        await asyncio.sleep(0)
+        recall = asyncio.ensure_future(waiter("recall"))
+        await asyncio.sleep(0)
+        try:
+            await gate.acquire("ingest")
+            raise AssertionError("ingest queue should be full")
+        except Rejected as e:
+            assert e.reason == "queue_full"
+
+        gate.release("recall")  # the queued recall gets it, although the ingest came first
+        await asyncio.sleep(0)
+        assert order == ["recall"]
+        gate.release("ingest")
+        await asyncio.sleep(0)
+        assert order == ["recall", "ingest"]
+        await asyncio.gather(ingest, recall)
+
+    asyncio.run(scenario())
+
+
+def test_middleware_answers_429():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def call(middleware, path, client="a"):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": path, "headers": [], "client": (client, 50000)}
+        await middleware(scope, None, send)
+        return sent[0]["status"], dict(sent[0]["headers"])
+
+    async def scenario():
+        backlog = [0]
+        admission = Admission(backlog=lambda: backlog[0], shed_backlog=10)
+        admission.limiters["recall"] = RateLimiter(rate=1, burst=1)
+        middleware = AdmissionMiddleware(app, admission)
+
+        assert (await call(middleware, "/recall"))[0] == 200
+        status, headers = await call(middleware, "/recall")
+        assert status == 429 and headers[b"retry-after"] == b"1"
+        assert (await call(middleware, "/recall", client="b"))[0] == 200
+        assert (await call(middleware, "/memories"))[0] == 200  # not admission-controlled
+
+        backlog[0] = 10
+        admission._backlog = (0, float("-inf"))  # skip the cached reading
+        assert (await call(middleware, "/ingest"))[0] == 429
+        stats = admission.stats()
+        assert stats["rejected"]["ingest"]["shed"] >= 1 and stats["running"] == {"recall": 0, "ingest": 0}
+
+    asyncio.run(scenario())
+
+
+def test_client_headers_need_a_trusted_proxy():
+    scope = {"headers": [(b"x-client-id", b"rotated"), (b"x-forwarded-for", b"10.0.0.9, 10.0.0.1")], "client": ("10.0.0.1", 1)}
+    assert client_key(scope, trusted_proxy=False) == "10.0.0.1"
+    assert client_key(scope, trusted_proxy=True) == "rotated"
+    scope["headers"] = scope["headers"][1:]
+    assert client_key(scope, trusted_proxy=True) == "10.0.0.9"
+    assert client_key({"headers": []}, trusted_proxy=True) == "unknown"
+
+
+if __name__ == "__main__":
+    for test in (test_token_bucket, test_recall_goes_first, test_middleware_answers_429, test_client_headers_need_a_trusted_proxy):
+        test()
+        print(f"✅ {test.__name__}")
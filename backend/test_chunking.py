@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Checks chunking: token windows and their overlap, CJK text, the per-page cap and putting pages back together.
+Runs offline: a tiny WordPiece tokenizer stands in for the model's.
+"""
+
+from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+
+from chunking import chunk_text, is_uncased, join_chunks, span_tokenizer, token_spans
+
+
+class Model:
+    """Has a .tokenizer like a SentenceTransformer."""
+
+    def __init__(self, lowercase=True):
+        vocab = {"[UNK]": 0, "the": 1, "cat": 2, "sat": 3, "##s": 4, "on": 5, "mat": 6, ".": 7}
+        backend = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+        backend.normalizer = normalizers.BertNormalizer(lowercase=lowercase)
+        backend.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+        self.tokenizer = type("Fast", (), {"backend_tokenizer": backend})()
+
+
+def test_windows_overlap_by_tokens():
+    text = " ".join(f"w{i}" for i in range(50))
+    chunks = chunk_text(text, max_tokens=10, overlap=3)
+    words = [chunk.split() for chunk in chunks]
+    assert all(len(w) <= 10 for w in words) and words[0][:2] == ["w0", "w1"]
+    for before, after in zip(words, words[1:]):
+        assert before[-3:] == after[:3]
+    assert words[-1][-1] == "w49" and join_chunks(chunks, chunks.starts) == text
+    assert chunk_text("short text", max_tokens=10) == ["short text"]
+
+
+def test_counts_model_tokens():
+    tokenizer = span_tokenizer(Model().tokenizer)
+    # "Cats" is two word pieces, "." one more
+    assert [tokens for _, _, tokens in token_spans("The Cats sat.", tokenizer)] == [1, 1, 1, 1, 1]
+    text = "The cats sat on the mat. " * 20
+    chunks = chunk_text(text, max_tokens=12, overlap=4, tokenizer=tokenizer)
+    assert all(len(token_spans(chunk, tokenizer)) <= 12 for chunk in chunks)
+    assert chunks[0] == "The cats sat on the mat. The cats sat"
+    assert join_chunks(chunks, chunks.starts) == text.rstrip()
+    assert span_tokenizer(object()) is None
+
+
+def test_knows_whether_case_matters():
+    assert is_uncased(span_tokenizer(Model().tokenizer))
+    assert not is_uncased(span_tokenizer(Model(lowercase=False).tokenizer))
+    assert not is_uncased(None)
+
+
+def test_cjk_text_is_split():
+    text = "東京は日本の首都です。" * 60
+    chunks = chunk_text(text, max_tokens=100, overlap=20)
+    assert len(chunks) == 8 and all(len(chunk) <= 100 for chunk in chunks)
+    assert chunks[1].startswith(text[80:100])
+    assert join_chunks(chunks, chunks.starts) == text
+    # One unspaced run counts a token per 4 characters, cut in pieces of 64
+    chunks = chunk_text("x" * 4000, max_tokens=100, overlap=0)
+    assert len(chunks) == 11 and len(chunks[0]) == 6 * 64
+
+
+def test_cap_reports_what_was_dropped():
+    text = " ".join(f"w{i}" for i in range(100))
+    chunks = chunk_text(text, max_tokens=10, overlap=0, max_chunks=3)
+    assert len(chunks) == 3 and chunks.dropped_tokens == 70
+    assert chunk_text(text, max_tokens=10, overlap=0).dropped_tokens == 0
+
+
+def test_joins_chunks_stored_without_starts():
+    words = [f"w{i}" for i in range(300)]
+    # What earlier versions stored: 160 words, overlapping by 32
+    legacy = [" ".join(words[i:i + 160]) for i in range(0, 300, 128)]
+    assert join_chunks(legacy) == " ".join(words)
+    assert join_chunks(["only"]) == "only" and join_chunks([]) == ""
+
+
+if __name__ == "__main__":
+    for test in (test_windows_overlap_by_tokens, test_counts_model_tokens, test_knows_whether_case_matters, test_cjk_text_is_split,
+                 test_cap_reports_what_was_dropped, test_joins_chunks_stored_without_starts):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Checks compaction: age and size eviction, and merging near-duplicate pages of one site.
+Runs offline against a LocalStore in a temp directory.
+"""
+
+import tempfile
+import time
+
+import numpy as np
+
+from compaction import Compactor, near_duplicate_clusters
+from vector_store import LocalStore
+
+DIM = 8
+
+
+def page(doc_id, ts, vector, url, chunks=1, digest=None, tail=None):
+    """Chunk c has vector + c, or tail + c past the first chunk when tail is given."""
+    return [{"id": f"{doc_id}#{c}", "values": list((vector if c == 0 or tail is None else tail) + c), "metadata": {
+        "doc_id": doc_id, "chunk": c, "chunks": chunks, "url": url, "ts": ts, "content": f"{doc_id} part {c}",
+        "content_hash": digest or f"hash of {doc_id}"}}
+        for c in range(chunks)]
+
+
+def domain_of(url):
+    return url.split("/")[2]
+
+
+def test_clusters_keep_the_newest():
+    v = np.eye(3)
+    vectors = [v[0], v[0] + 0.01, v[1], v[0] + 0.02]
+    assert near_duplicate_clusters(vectors, [1, 5, 3, 2], threshold=0.99) == [(1, [0, 3])]
+
+
+def test_merges_near_duplicates_per_site():
+    store = LocalStore(tempfile.mkdtemp())
+    base = np.random.default_rng(0).normal(size=DIM)
+    other = np.random.default_rng(1).normal(size=DIM)
+    store.upsert(page("old", 100.0, base, "https://a.test/x", chunks=3)
+                 + page("new", 300.0, base + 0.001, "https://a.test/y", chunks=3)
+                 + page("different", 200.0, other, "https://a.test/z")
+                 + page("elsewhere", 250.0, base, "https://b.test/x"))
+    documents = [("new", 300.0, "https://a.test/y"), ("elsewhere", 250.0, "https://b.test/x"),
+                 ("different", 200.0, "https://a.test/z"), ("old", 100.0, "https://a.test/x")]
+
+    report = Compactor(store, similarity=0.99).run(documents, domain_of)
+    assert report["merged"] == 1 and report["clusters"] == 1 and report["removed"] == ["old"]
+    # Every chunk of the loser is gone, every chunk of the keeper carries the visits
+    assert sorted(store.list()) == ["different#0", "elsewhere#0", "new#0", "new#1", "new#2"]
+    for record in store.fetch(["new#0", "new#2"]).values():
+        assert record["metadata"]["visits"] == 2
+        assert (record["metadata"]["first_seen"], record["metadata"]["last_seen"]) == (100.0, 300.0)
+
+
+def test_compares_whole_pages():
+    """Same header, different body: not duplicates, although the first chunks are."""
+    store = LocalStore(tempfile.mkdtemp())
+    rng = np.random.default_rng(3)
+    header = rng.normal(size=DIM)
+    store.upsert(page("feed1", 100.0, header, "https://a.test/1", chunks=4, tail=rng.normal(size=DIM))
+                 + page("feed2", 200.0, header, "https://a.test/2", chunks=4, tail=rng.normal(size=DIM)))
+    documents = [("feed2", 200.0, "https://a.test/2"), ("feed1", 100.0, "https://a.test/1")]
+
+    report = Compactor(store, similarity=0.99).run(documents, domain_of)
+    assert report["merged"] == 0 and len(list(store.list())) == 8
+
+
+def test_skips_pages_stored_again_meanwhile():
+    store = LocalStore(tempfile.mkdtemp())
+    base = np.random.default_rng(4).normal(size=DIM)
+    store.upsert(page("old", 100.0, base, "https://a.test/x") + page("new", 300.0, base, "https://a.test/y")
+                 + page("other", 200.0, base, "https://a.test/z"))
+    documents = [("new", 300.0, "https://a.test/y"), ("other", 200.0, "https://a.test/z"), ("old", 100.0, "https://a.test/x")]
+    compactor = Compactor(store, similarity=0.99)
+    read = compactor._documents
+
+    def read_then_revisit(doc_ids):
+        documents = read(doc_ids)
+        # "old" is ingested again, with new content, while the pass compares
+        store.upsert(page("old", 350.0, base, "https://a.test/x", chunks=2, digest="new content"))
+        return documents
+
+    compactor._documents = read_then_revisit
+    report = compactor.run(documents, domain_of)
+    assert report["removed"] == ["other"]
+    assert sorted(store.list()) == ["new#0", "old#0", "old#1"]
+    assert store.fetch(["new#0"])["new#0"]["metadata"]["visits"] == 2
+
+
+def test_evicts_by_age_and_budget():
+    store = LocalStore(tempfile.mkdtemp())
+    now = time.time()
+    rng = np.random.default_rng(2)
+    ages = {"a": 10, "b": 20, "c": 30, "d": 90 * 86400}
+    for doc_id, age in ages.items():
+        store.upsert(page(doc_id, now - age, rng.normal(size=DIM), f"https://{doc_id}.test/", chunks=2))
+    documents = [(doc_id, now - age, f"https://{doc_id}.test/") for doc_id, age in ages.items()]
+
+    report = Compactor(store, max_age_s=30 * 86400, max_memories=2).run(documents, domain_of)
+    assert (report["expired"], report["over_budget"]) == (1, 1)
+    assert sorted(report["removed"]) == ["c", "d"]
+    assert sorted(store.list()) == ["a#0", "a#1", "b#0", "b#1"]
+
+
+if __name__ == "__main__":
+    for test in (test_clusters_keep_the_newest, test_merges_near_duplicates_per_site, test_compares_whole_pages,
+                 test_skips_pages_stored_again_meanwhile, test_evicts_by_age_and_budget):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Checks response compression: Accept-Encoding negotiation, the size threshold, and what passes through.
+Runs offline: the middleware wraps a bare ASGI app. br is only expected when brotli is installed.
+"""
+
+import asyncio
+import gzip
+
+import compression
+from compression import CompressionMiddleware, pick_encoding
+
+BODY = b'{"memories": []}' * 200
+
+
+def respond(body=BODY, accept="gzip, br", more_body=False, headers=()):
+    """(status, headers, body) the client gets through the middleware."""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]})
+        await send({"type": "http.response.body", "body": body, "more_body": more_body})
+        if more_body:
+            await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request"}
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept.encode())]}
+    asyncio.run(CompressionMiddleware(app, min_size=1024)(scope, receive, send))
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_negotiation():
+    best = "br" if compression.brotli is not None else "gzip"
+    assert pick_encoding("gzip, deflate, br") == best
+    assert pick_encoding("GZIP") == "gzip"
+    assert pick_encoding("br;q=0, gzip") == "gzip"
+    assert pick_encoding("gzip;q=0") is None and pick_encoding("identity") is None and pick_encoding("") is None
+
+
+def test_compresses_large_responses():
+    _, headers, body = respond(accept="gzip")
+    assert headers[b"content-encoding"] == b"gzip" and headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(body) < len(BODY)
+    assert gzip.decompress(body) == BODY
+    if compression.brotli is not None:
+        _, headers, body = respond(accept="br, gzip")
+        assert headers[b"content-encoding"] == b"br" and compression.brotli.decompress(body) == BODY
+
+
+def test_small_and_streamed_responses_pass_through():
+    for kwargs in ({"body": b'{"status": "ok"}'}, {"more_body": True}, {"accept": "identity"},
+                   {"headers": [(b"content-encoding", b"gzip")]}):
+        _, headers, body = respond(**kwargs)
+        assert b"vary" not in headers, kwargs
+        assert body == kwargs.get("body", BODY)
+
+
+if __name__ == "__main__":
+    for test in (test_negotiation, test_compresses_large_responses, test_small_and_streamed_responses_pass_through):
+        test()
+        print(f"✅ {test.__name__}")
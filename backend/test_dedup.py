@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Checks document ids: URL normalization, hash routes and per-capture ids for chats.
+Runs offline, pure functions.
+"""
+
+from dedup import doc_id_for, normalize_url
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://www.Example.com/a/?utm_source=x&b=2&a=1#section") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("https://m.youtube.com/watch?v=abc&si=share") == "https://youtube.com/watch?v=abc"
+    # Hash-routed apps keep their route
+    assert normalize_url("https://mail.test/#/inbox/42") == "https://mail.test/#/inbox/42"
+    assert normalize_url("https://app.test/#!/settings") == "https://app.test/#!/settings"
+
+
+def test_pages_keep_one_id():
+    url = "https://example.com/article"
+    assert doc_id_for(url, "first version") == doc_id_for(url + "#comments", "second version") == doc_id_for(url)
+    assert doc_id_for("https://mail.test/#/inbox") != doc_id_for("https://mail.test/#/sent")
+
+
+def test_chat_captures_keep_their_own_id():
+    chat = "https://chatgpt.com/c/123"
+    first, second = doc_id_for(chat, "User asked: a"), doc_id_for(chat, "User asked: b")
+    assert first != second
+    assert doc_id_for(chat, "User asked:  a\n") == first  # whitespace isn't new content
+    dm = "https://www.instagram.com/direct/t/456/"
+    assert doc_id_for(dm, "hi") != doc_id_for(dm, "bye")
+    assert doc_id_for("https://discord.test/channels/1", "x", kind="chat") != doc_id_for("https://discord.test/channels/1", "y", kind="chat")
+
+
+if __name__ == "__main__":
+    for test in (test_normalize_url, test_pages_keep_one_id, test_chat_captures_keep_their_own_id):
+        test()
+        print(f"✅ {test.__name__}")
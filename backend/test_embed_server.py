@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Checks the embedding server round trip over a Unix socket with a stand-in model.
+Runs offline: the "model" hashes texts into small vectors.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from embed_server import EmbedServer, RemoteEncoder, RemoteEncodeError
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(len(texts))
+        if any(text == "boom" for text in texts):
+            raise ValueError("bad input")
+        return np.array([[len(text), ord(text[0]) if text else 0, i % 7, 1.5] for i, text in enumerate(texts)], dtype=np.float32)
+
+
+def start_server(model, path, **options):
+    """Runs an EmbedServer on its own event loop thread and waits until it listens."""
+    loop = asyncio.new_event_loop()
+    server = EmbedServer(model, path, **options)
+    threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True).start()
+    RemoteEncoder(path).wait_until_up(wait_s=5)
+    return server
+
+
+def test_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), "embed.sock")
+    start_server(FakeModel(), path, max_wait_ms=1)
+    encoder = RemoteEncoder(path)
+
+    texts = ["hello", "", "ünïcödé text", "x" * 5000]
+    vectors = encoder.encode(texts)
+    assert vectors.dtype == np.float32 and vectors.shape == (4, 4)
+    assert vectors[:, 0].tolist() == [5, 0, len("ünïcödé text"), 5000]
+    assert vectors[2, 1] == ord("ü")
+    assert encoder.stats()["requests"] == 1
+
+
+def test_workers_share_batches():
+    """Requests from several connections at once end up in the same model calls."""
+    path = os.path.join(tempfile.mkdtemp(), "embed.sock")
+    model = FakeModel()
+    server = start_server(model, path, max_batch_size=64, max_wait_ms=50)
+    encoder = RemoteEncoder(path)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: encoder.encode([f"text {i}", f"more {i}"]), range(8)))
+    assert all(r.shape == (2, 4) for r in results)
+    assert sum(model.calls) == 16
+    assert len(model.calls) < 8, f"every request got its own batch: {model.calls}"
+    assert server.stats()["requests"] == 8
+
+
+def test_errors_come_back_and_the_connection_survives():
+    path = os.path.join(tempfile.mkdtemp(), "embed.sock")
+    start_server(FakeModel(), path, max_wait_ms=1)
+    encoder = RemoteEncoder(path)
+
+    try:
+        encoder.encode(["boom"])
+    except RemoteEncodeError as e:
+        assert "bad input" in str(e)
+    else:
+        raise AssertionError("expected RemoteEncodeError")
+    assert encoder.encode(["still works"]).shape == (1, 4)
+
+
+if __name__ == "__main__":
+    for test in (test_round_trip, test_workers_share_batches, test_errors_come_back_and_the_connection_survives):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Checks the embedding batcher: a full batch goes at once, a partial one after the wait,
+failures reach every caller, and bulk encodes go in slices.
+Runs offline: the "model" returns the length of each text.
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+from embedding import EmbeddingBatcher
+
+
+class Model:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model broke")
+        return np.array([[float(len(t))] for t in texts])
+
+
+def test_flushes_when_the_batch_is_full():
+    async def scenario():
+        model = Model()
+        # A wait long enough that only a full batch explains a quick answer
+        batcher = EmbeddingBatcher(model.encode, max_batch_size=4, max_wait_ms=5000)
+        started = time.perf_counter()
+        vectors = await asyncio.gather(*(batcher.encode("x" * i) for i in range(1, 5)))
+        assert time.perf_counter() - started < 1
+        assert vectors == [[1.0], [2.0], [3.0], [4.0]]
+        assert model.calls == [["x", "xx", "xxx", "xxxx"]]
+        assert batcher.stats()["batch_size_counts"] == {4: 1}
+
+    asyncio.run(scenario())
+
+
+def test_flushes_a_partial_batch_after_the_wait():
+    async def scenario():
+        model = Model()
+        batcher = EmbeddingBatcher(model.encode, max_batch_size=32, max_wait_ms=50)
+        started = time.perf_counter()
+        vectors = await asyncio.gather(batcher.encode("a"), batcher.encode("bb"))
+        assert time.perf_counter() - started >= 0.05
+        assert vectors == [[1.0], [2.0]] and model.calls == [["a", "bb"]]
+
+    asyncio.run(scenario())
+
+
+def test_failures_reach_every_caller():
+    async def scenario():
+        model = Model(fail=True)
+        batcher = EmbeddingBatcher(model.encode, max_batch_size=8, max_wait_ms=10)
+        results = await asyncio.gather(*(batcher.encode(t) for t in "abc"), return_exceptions=True)
+        assert [str(r) for r in results] == ["model broke"] * 3 and len(model.calls) == 1
+        # The worker keeps serving after a failed batch
+        model.fail = False
+        assert await batcher.encode("ok") == [2.0]
+
+    asyncio.run(scenario())
+
+
+def test_bulk_goes_in_slices():
+    async def scenario():
+        model = Model()
+        batcher = EmbeddingBatcher(model.encode, max_batch_size=3, max_wait_ms=1, as_list=False)
+        vectors = await batcher.encode_bulk(["a"] * 7)
+        assert [len(call) for call in model.calls] == [3, 3, 1]
+        assert len(vectors) == 7 and isinstance(vectors[0], np.ndarray)
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    for test in (test_flushes_when_the_batch_is_full, test_flushes_a_partial_batch_after_the_wait,
+                 test_failures_reach_every_caller, test_bulk_goes_in_slices):
+        test()
+        print(f"✅ {test.__name__}")
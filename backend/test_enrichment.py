@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Checks the background enrichment pool with local stand-in fetchers.
+Runs offline: nothing here talks to YouTube or yt-dlp.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from enrichment import Enricher
+
+
+def job(i, url):
+    return {"id": f"doc{i}", "url": url, "title": f"t{i}", "content": "", "timestamp": ""}
+
+
+def run(enricher, jobs):
+    async def main():
+        enricher.start()
+        for j in jobs:
+            enricher.submit(j)
+        await enricher.join()
+        await enricher.stop()
+
+    asyncio.run(main())
+
+
+def test_results_are_applied():
+    applied = {}
+
+    async def apply(job, text):
+        applied[job["id"]] = text
+
+    def fetcher_for(url):
+        if "video" in url:
+            return lambda: f"transcript of {url}"
+        if "empty" in url:
+            return lambda: None
+        return None
+
+    enricher = Enricher(fetcher_for, apply, workers=2, timeout=1)
+    run(enricher, [job(0, "https://a.test/video/1"), job(1, "https://a.test/empty"), job(2, "https://a.test/page")])
+
+    assert applied == {"doc0": "transcript of https://a.test/video/1"}
+    stats = enricher.stats()
+    assert stats["enriched"] == 1 and stats["empty"] == 1
+
+
+def test_per_host_limit():
+    """Eight workers, but never more than two fetches at once against one host."""
+    lock = threading.Lock()
+    active = {}
+    peak = {}
+
+    def slow_fetch(host):
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+        time.sleep(0.05)
+        with lock:
+            active[host] -= 1
+        return "text"
+
+    def fetcher_for(url):
+        host = url.split("/")[2]
+        return lambda: slow_fetch(host)
+
+    async def apply(job, text):
+        pass
+
+    pool = ThreadPoolExecutor(max_workers=8)
+    enricher = Enricher(fetcher_for, apply, workers=8, per_host=2, timeout=5, pool=pool)
+    run(enricher, [job(i, f"https://{'a' if i % 2 else 'b'}.test/{i}") for i in range(12)])
+
+    assert peak == {"a.test": 2, "b.test": 2}
+    assert enricher.stats()["enriched"] == 12
+
+
+def test_timeout_and_errors():
+    async def apply(job, text):
+        raise AssertionError("nothing should be applied")
+
+    def fetcher_for(url):
+        if "slow" in url:
+            return lambda: time.sleep(0.5) or "late"
+        def broken():
+            raise ConnectionError("no network")
+        return broken
+
+    enricher = Enricher(fetcher_for, apply, workers=2, timeout=0.05)
+    run(enricher, [job(0, "https://a.test/slow"), job(1, "https://a.test/broken")])
+
+    stats = enricher.stats()
+    assert stats["timeouts"] == 1 and stats["failed"] == 1 and stats["enriched"] == 0
+
+
+def test_duplicate_jobs_are_dropped():
+    calls = []
+
+    async def apply(job, text):
+        calls.append(job["id"])
+
+    enricher = Enricher(lambda url: (lambda: "text"), apply, workers=1, timeout=1)
+    run(enricher, [job(0, "https://a.test/x"), job(0, "https://a.test/x")])
+
+    assert calls == ["doc0"]
+
+
+if __name__ == "__main__":
+    for test in (test_results_are_applied, test_per_host_limit, test_timeout_and_errors, test_duplicate_jobs_are_dropped):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Checks that blocking encode / vector-store calls run off the event loop.
+Runs offline: the "model" and "Pinecone" here are just sleeps.
+"""
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from embedding import EmbeddingBatcher
+from executors import TrackedPool, run_in_pool, run_store, store_pool
+
+
+def slow_upsert(delay=0.2):
+    # Stand-in for a slow Pinecone round trip
+    time.sleep(delay)
+    return {"upserted_count": 1}
+
+
+def test_store_calls_overlap():
+    """Five 200ms store calls should take ~200ms together, not ~1s."""
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(run_store(slow_upsert, 0.2) for _ in range(5)))
+        return time.perf_counter() - started, results
+
+    elapsed, results = asyncio.run(main())
+    assert len(results) == 5
+    assert elapsed < 0.6, f"store calls ran one after another ({elapsed:.2f}s)"
+
+
+def test_event_loop_stays_responsive():
+    """A heartbeat keeps ticking while a slow encode and a slow upsert are running."""
+    def slow_encode(texts):
+        time.sleep(0.3)
+        return np.ones((len(texts), 4))
+
+    batcher = EmbeddingBatcher(slow_encode, max_batch_size=8, max_wait_ms=1)
+
+    async def main():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.gather(batcher.encode("hello"), run_store(slow_upsert, 0.3))
+        beat.cancel()
+        return ticks
+
+    ticks = asyncio.run(main())
+    assert ticks >= 10, f"event loop was blocked (only {ticks} ticks)"
+
+
+def test_timeout():
+    async def main():
+        await run_in_pool(store_pool, slow_upsert, 0.5, timeout=0.05)
+
+    try:
+        asyncio.run(main())
+    except asyncio.TimeoutError:
+        return
+    raise AssertionError("expected a timeout")
+
+
+def test_pool_counts_waiting_and_running():
+    pool = TrackedPool(max_workers=1)
+    gate = threading.Event()
+    first = pool.submit(gate.wait)
+    queued = [pool.submit(time.sleep, 0) for _ in range(3)]
+    time.sleep(0.05)
+    assert (pool.running, pool.waiting) == (1, 3)
+    queued[-1].cancel()
+    assert pool.waiting == 2
+    gate.set()
+    first.result()
+    for future in queued[:-1]:
+        future.result()
+    assert (pool.running, pool.waiting) == (0, 0)
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    for test in (test_store_calls_overlap, test_event_loop_stays_responsive, test_timeout,
+                 test_pool_counts_waiting_and_running):
+        test()
+        print(f"✅ {test.__name__}")
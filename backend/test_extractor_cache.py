@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Checks the extractor cache: hits, misses, negative entries, expiry and least-recently-used eviction.
+Runs offline: a SQLite file in a temp directory.
+"""
+
+import os
+import tempfile
+import time
+
+from extractor_cache import ExtractorCache
+
+
+def open_cache(**kwargs):
+    return ExtractorCache(path=os.path.join(tempfile.mkdtemp(), "cache.sqlite"), **kwargs)
+
+
+def test_hit_and_miss():
+    cache = open_cache()
+    assert cache.get("youtube:abc") is None
+    cache.put("youtube:abc", "transcript", {"lang": "en"})
+    assert cache.get("youtube:abc") == {"text": "transcript", "meta": {"lang": "en"}}
+    # Nothing to fetch is remembered as well
+    cache.put("youtube:none", None)
+    assert cache.get("youtube:none") == {"text": None, "meta": {}}
+    stats = cache.stats()
+    assert (stats["hits"], stats["negative_hits"], stats["misses"], stats["entries"]) == (1, 1, 1, 2)
+
+
+def test_entries_expire():
+    cache = open_cache(ttl_s=60, negative_ttl_s=0.01)
+    cache.put("youtube:abc", "transcript")
+    cache.put("youtube:none", None)
+    time.sleep(0.02)
+    assert cache.get("youtube:none") is None and cache.get("youtube:abc")["text"] == "transcript"
+    assert cache.stats()["expirations"] == 1 and cache.stats()["entries"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = open_cache(max_entries=2)
+    cache.put("a", "first")
+    time.sleep(0.01)
+    cache.put("b", "second")
+    time.sleep(0.01)
+    assert cache.get("a")  # now "b" is the least recently used
+    cache.put("c", "third")
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+    assert cache.stats()["evictions"] == 1
+
+    # The byte budget evicts too, but keeps a single oversized entry
+    path = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+    cache = ExtractorCache(path=path, max_bytes=100)
+    cache.put("small", "x")
+    cache.put("big", "y" * 500)
+    assert cache.get("small") is None and cache.get("big")["text"] == "y" * 500
+    # Survives a reopen with its counts
+    assert ExtractorCache(path=path).stats()["entries"] == 1
+
+
+if __name__ == "__main__":
+    for test in (test_hit_and_miss, test_entries_expire, test_evicts_least_recently_used):
+        test()
+        print(f"✅ {test.__name__}")
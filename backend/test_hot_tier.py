@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Checks the in-memory hot tier in front of a store.
+Runs offline: a LocalStore in a temp directory plays the remote index.
+"""
+
+import math
+import tempfile
+
+import numpy as np
+
+from hot_tier import HotTier, TieredStore
+from vector_store import LocalStore
+
+DIM = 16
+
+
+def record(i, ts, vector=None):
+    rng = np.random.default_rng(i)
+    values = vector if vector is not None else rng.normal(size=DIM)
+    return {"id": f"doc{i}", "values": list(map(float, values)),
+            "metadata": {"title": f"t{i}", "url": f"https://ex.com/{i}", "content": "x" * 100,
+                         "platform": "WEB", "domain": "ex.com", "ts": float(ts), "visits": 2}}
+
+
+class CountingStore(LocalStore):
+    queries = 0
+
+    def query(self, *args, **kwargs):
+        self.queries += 1
+        return super().query(*args, **kwargs)
+
+
+def test_scores_match_the_store():
+    for dtype in ("float16", "int8"):
+        tier = HotTier(max_bytes=10 ** 7, dtype=dtype)
+        records = [record(i, 1000 + i) for i in range(50)]
+        tier.upsert(records)
+        exact = LocalStore(tempfile.mkdtemp())
+        exact.upsert(records)
+
+        q = np.random.default_rng(99).normal(size=DIM)
+        hot = tier.search(q, top_k=5)
+        want = exact.query(q, top_k=5)["matches"]
+        assert [m["id"] for m in hot][:3] == [m["id"] for m in want][:3], dtype
+        for h, w in zip(hot, want):
+            assert abs(h["score"] - w["score"]) < 0.02, dtype
+        assert hot[0]["metadata"]["visits"] == 2 and hot[0]["metadata"]["title"].startswith("t")
+
+
+def test_budget_keeps_the_newest():
+    tier = HotTier(max_bytes=20 * (300 + 100 + 40 + DIM * 2))
+    tier.upsert([record(i, 1000 + i) for i in range(100)])
+    assert tier.nbytes <= tier.max_bytes
+    kept = sorted(int(vid[3:]) for vid in tier._slots)
+    assert kept == list(range(100 - len(kept), 100))
+    tier.finish_warm(-math.inf)
+    # Everything newer than the newest evicted record is still here
+    assert tier.covered_since == 1000 + 100 - len(kept) - 1
+
+
+def test_routing_and_merge():
+    remote = CountingStore(tempfile.mkdtemp())
+    store = TieredStore(remote, HotTier(max_bytes=10 ** 7), min_score=0.9, min_hits=1)
+    old = [record(i, 1000 + i) for i in range(10)]
+    remote.upsert(old)  # stored before the tier existed
+    store.warm([(f"doc{i}", 1000 + i, "") for i in range(9, 4, -1)])  # pretend only five fit
+    store.upsert([record(100, 5000)])
+    assert store.hot.covered_since == -math.inf  # warm() got through the whole (pretend) index
+
+    # A time filter fully inside the tier never reaches the remote index
+    q = record(100, 0)["values"]
+    matches = store.query(q, top_k=3, filter={"ts": {"$gte": 1004}})["matches"]
+    assert matches[0]["id"] == "doc100" and remote.queries == 0
+
+    # A confident hit is answered by the tier alone
+    assert store.query(q, top_k=3)["matches"][0]["id"] == "doc100" and remote.queries == 0
+
+    # A weak one goes to the remote index too and the results are merged by id
+    q = record(2, 0)["values"]
+    matches = store.query(q, top_k=3)["matches"]
+    assert remote.queries == 1
+    assert matches[0]["id"] == "doc2" and len({m["id"] for m in matches}) == 3
+
+    store.delete(["doc100"])
+    assert "doc100" not in store.hot._slots and not remote.fetch(["doc100"])
+
+
+def test_one_long_page_does_not_fill_the_quota():
+    remote = CountingStore(tempfile.mkdtemp())
+    store = TieredStore(remote, HotTier(max_bytes=10 ** 7), min_score=0.5, min_hits=5)
+    q = np.ones(DIM)
+    # Ten older pages in the remote index only, all very close to the query
+    remote.upsert([record(i, 1000 + i, q + np.random.default_rng(i).normal(scale=0.05, size=DIM)) for i in range(10)])
+    # One new page with eight chunks, close enough to pass min_score
+    chunks = []
+    for c in range(8):
+        chunk = record(100 + c, 5000, q + np.random.default_rng(100 + c).normal(scale=0.6, size=DIM))
+        chunk["id"] = f"doc100#{c}"
+        chunk["metadata"]["doc_id"] = "doc100"
+        chunks.append(chunk)
+    store.upsert(chunks)
+
+    matches = store.query(q, top_k=20, documents=5)["matches"]
+    assert remote.queries == 1
+    assert len({m["metadata"].get("doc_id", m["id"]) for m in matches}) >= 5
+
+
+if __name__ == "__main__":
+    for test in (test_scores_match_the_store, test_budget_keeps_the_newest, test_routing_and_merge,
+                 test_one_long_page_does_not_fill_the_quota):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Checks the write-behind journal: backoff, dead letters, superseded entries and purging.
+Runs offline: SQLite in a temp directory and a stand-in for the store.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import ingest_queue
+from ingest_queue import IngestJournal, retry_delay
+
+
+def journal():
+    return IngestJournal(os.path.join(tempfile.mkdtemp(), "journal.sqlite"))
+
+
+def drain(journal, process, until):
+    """Runs the worker until until() holds, with a deadline so a bug can't hang the test."""
+    async def scenario():
+        worker = asyncio.ensure_future(journal.run(process))
+        try:
+            for _ in range(500):
+                await asyncio.sleep(0.01)
+                if until():
+                    break
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_retry_delay_backs_off():
+    for attempts in range(1, 6):
+        delay = retry_delay(attempts, base=1, cap=10)
+        assert min(10, 2 ** (attempts - 1)) / 2 <= delay <= min(10, 2 ** (attempts - 1))
+    assert retry_delay(50, base=1, cap=10) <= 10
+
+
+def test_failed_entries_retry_then_die():
+    saved = ingest_queue.INGEST_MAX_ATTEMPTS, ingest_queue.INGEST_RETRY_BASE_S, ingest_queue.INGEST_POLL_S
+    ingest_queue.INGEST_MAX_ATTEMPTS, ingest_queue.INGEST_RETRY_BASE_S, ingest_queue.INGEST_POLL_S = 3, 0.01, 0.01
+    try:
+        j = journal()
+        calls = []
+
+        async def process(payloads):
+            calls.append([p["url"] for p in payloads])
+            return ["store down" if p["url"] == "bad" else None for p in payloads]
+
+        asyncio.run(j.append("good", {"url": "good"}))
+        asyncio.run(j.append("bad", {"url": "bad"}))
+        drain(j, process, until=lambda: j.snapshot()["dead"] == 1)
+
+        status = j.snapshot()
+        assert status == {"depth": 0, "lag_s": 0.0, "retrying": 0, "dead": 1}
+        assert j.stored == 1 and j.failed_attempts == 3 and j.last_error == "store down"
+        assert calls[0] == ["good", "bad"] and calls[1:] == [["bad"], ["bad"]]
+        # The dead entry is kept for inspection, but no longer counts as waiting
+        assert j.depth() == 0 and j._db.execute("SELECT attempts, last_error FROM journal").fetchone() == (3, "store down")
+    finally:
+        ingest_queue.INGEST_MAX_ATTEMPTS, ingest_queue.INGEST_RETRY_BASE_S, ingest_queue.INGEST_POLL_S = saved
+
+
+def test_newer_entry_supersedes_a_retrying_one():
+    j = journal()
+    asyncio.run(j.append("page", {"url": "page", "content": "old"}))
+    # The old version failed once and waits for its retry
+    j._finish([], {1: (0, "timeout")})
+    j._db.execute("UPDATE journal SET next_attempt_at = 0")
+    asyncio.run(j.append("page", {"url": "page", "content": "new"}))
+    asyncio.run(j.append("other", {"url": "other", "content": "x"}))
+
+    due = j._due(10)
+    assert [(seq, payload["content"]) for seq, payload, _ in due] == [(2, "new"), (3, "x")]
+    assert j.depth() == 2 and j.snapshot()["depth"] == 2
+
+
+def test_discard_purges_pending_entries():
+    j = journal()
+    for doc_id in ("a", "b", "a", "c"):
+        asyncio.run(j.append(doc_id, {"url": doc_id}))
+    assert asyncio.run(j.discard(["a", "c", "missing"])) == 3
+    assert [payload["url"] for _, payload, _ in j._due(10)] == ["b"]
+    assert j.depth() == 1 and asyncio.run(j.discard([])) == 0
+
+
+if __name__ == "__main__":
+    for test in (test_retry_delay_backs_off, test_failed_entries_retry_then_die,
+                 test_newer_entry_supersedes_a_retrying_one, test_discard_purges_pending_entries):
+        test()
+        print(f"✅ {test.__name__}")
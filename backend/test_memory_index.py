@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Checks the time-ordered listing index: cursors, platform filter and the rebuild from a store.
+Runs offline: SQLite and a LocalStore in a temp directory.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from memory_index import MemoryIndex
+from vector_store import LocalStore
+
+
+def timestamp(day):
+    return f"2026-03-{day:02d}T12:00:00"
+
+
+def filled(n=12):
+    index = MemoryIndex(os.path.join(tempfile.mkdtemp(), "index.sqlite"))
+    index.add_many([
+        (f"doc{i:02d}", timestamp(i + 1), f"t{i}", f"https://ex.com/{i}", "YOUTUBE" if i % 3 == 0 else "WEB", f"p{i}")
+        for i in range(n)
+    ])
+    return index
+
+
+def test_pages_newest_first():
+    index = filled()
+    seen, before = [], None
+    while True:
+        rows, before, _ = index.page(limit=5, before=before)
+        seen += [row["id"] for row in rows]
+        if before is None:
+            break
+    assert seen == [f"doc{i:02d}" for i in range(11, -1, -1)]
+
+    # after= walks back towards the newest, still returned newest first
+    oldest_of_six = index.page(limit=6)[1]  # doc06
+    newer, _, more = index.page(limit=2, after=oldest_of_six)
+    assert [row["id"] for row in newer] == ["doc08", "doc07"] and more is not None
+    newest, _, more = index.page(limit=10, after=oldest_of_six)
+    assert [row["id"] for row in newest] == ["doc11", "doc10", "doc09", "doc08", "doc07"] and more is None
+
+    rows, _, _ = index.page(limit=50, platform="youtube")
+    assert [row["id"] for row in rows] == ["doc09", "doc06", "doc03", "doc00"]
+    assert rows[0]["preview"] == "p9" and rows[0]["url"] == "https://ex.com/9"
+
+    try:
+        index.page(before="not a cursor")
+        raise AssertionError("a broken cursor should be refused")
+    except ValueError:
+        pass
+
+
+def test_remove_and_rebuild():
+    index = filled(4)
+    index.remove(["doc01"])
+    assert index.count() == 3
+    assert [d[0] for d in index.documents()] == ["doc03", "doc02", "doc00"]
+
+    store = LocalStore(tempfile.mkdtemp())
+    vectors = np.random.default_rng(0).normal(size=(3, 4)).tolist()
+    store.upsert([
+        {"id": "page#0", "values": vectors[0], "metadata": {"doc_id": "page", "chunk": 0, "content": "top of the page",
+                                                          "title": "Page", "url": "https://a.test/", "timestamp": timestamp(5)}},
+        {"id": "page#1", "values": vectors[1], "metadata": {"doc_id": "page", "chunk": 1, "content": "further down",
+                                                          "title": "Page", "url": "https://a.test/", "timestamp": timestamp(5)}},
+        # Stored before chunking, no doc_id
+        {"id": "old", "values": vectors[2], "metadata": {"content": "x" * 900, "title": "Old", "url": "https://b.test/",
+                                                        "timestamp": timestamp(1)}},
+    ])
+    assert index.rebuild(store, platform_of=lambda url: "WEB", batch_size=2) == 2
+    rows, _, _ = index.page()
+    assert [(row["id"], row["preview"][:15]) for row in rows] == [("page", "top of the page"), ("old", "x" * 15)]
+    assert len(rows[1]["preview"]) == 500 and rows[0]["platform"] == "WEB"
+
+
+if __name__ == "__main__":
+    for test in (test_pages_newest_first, test_remove_and_rebuild):
+        test()
+        print(f"✅ {test.__name__}")
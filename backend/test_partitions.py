@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Checks the month-partitioned store: routing, time pruning, retention, and
+several workers sharing one partition directory.
+Runs offline: LocalStores in a temp directory stand in for Pinecone namespaces.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from partitions import UNDATED, PartitionedStore, partition_key
+from vector_store import LocalStore
+
+DIM = 8
+JAN, FEB, MAR = 1767225600.0, 1769904000.0, 1772323200.0  # 2026-01-01, 02-01, 03-01 UTC
+
+
+def record(i, ts=None):
+    return {"id": f"doc{i}", "values": list(np.random.default_rng(i).normal(size=DIM)),
+            "metadata": {"title": f"t{i}", "ts": ts}}
+
+
+def open_store(workdir, legacy=None):
+    root = os.path.join(workdir, "partitions")
+    os.makedirs(root, exist_ok=True)
+    return PartitionedStore(lambda name: LocalStore(os.path.join(root, name)),
+                            directory_path=os.path.join(workdir, "directory.sqlite"),
+                            existing=os.listdir(root), legacy=legacy)
+
+
+def test_routes_by_month():
+    workdir = tempfile.mkdtemp()
+    store = open_store(workdir)
+    store.upsert([record(0, JAN + 10), record(1, FEB + 10), record(2, MAR + 10), record(3, None)])
+    assert store.stats()["partitions"] == {"2026-01": 1, "2026-02": 1, "2026-03": 1, UNDATED: 1}
+    assert sorted(os.listdir(os.path.join(workdir, "partitions"))) == ["mem-2026-01", "mem-2026-02", "mem-2026-03", "mem-undated"]
+
+    # A time filter only visits the months it overlaps, undated records can't match it
+    assert store.partitions_for({"ts": {"$gte": FEB, "$lte": MAR - 1}}) == ["2026-02"]
+    assert store.partitions_for({"$and": [{"ts": {"$gte": FEB + 20}}]}) == ["2026-02", "2026-03"]
+    assert len(store.partitions_for(None)) == 4
+    matches = store.query(record(0)["values"], top_k=5, filter={"ts": {"$gte": FEB}})["matches"]
+    assert sorted(m["id"] for m in matches) == ["doc1", "doc2"]
+    # Without a filter the partitions' hits are merged by score
+    assert store.query(record(3)["values"], top_k=1)["matches"][0]["id"] == "doc3"
+
+    # A revisit in another month moves the record
+    store.upsert([record(0, MAR + 20)])
+    assert store.stats()["partitions"]["2026-01"] == 0
+    assert store.fetch(["doc0"])["doc0"]["metadata"]["ts"] == MAR + 20
+    assert sorted(store.list()) == ["doc0", "doc1", "doc2", "doc3"]
+
+    store.delete(["doc1"])
+    assert store.fetch(["doc1"]) == {} and "doc1" not in store.list()
+
+    # The directory comes back from the partitions if it goes missing
+    os.remove(os.path.join(workdir, "directory.sqlite"))
+    assert sorted(open_store(workdir).list()) == ["doc0", "doc2", "doc3"]
+
+
+def test_retention_and_legacy():
+    workdir = tempfile.mkdtemp()
+    legacy = LocalStore(os.path.join(workdir, "flat"))
+    legacy.upsert([record(7, JAN + 5), record(8, JAN + 6)])
+    store = open_store(workdir, legacy=legacy)
+    store.upsert([record(0, JAN + 10), record(1, FEB + 10)])
+
+    # Legacy records stay searchable, and a rewrite moves them into a partition
+    assert "doc7" in store.fetch(["doc7"])
+    assert {m["id"] for m in store.query(record(7)["values"], top_k=10)["matches"]} >= {"doc7", "doc8"}
+    store.upsert([record(7, FEB + 20)])
+    assert legacy.fetch(["doc7"]) == {} and store.fetch(["doc7"])["doc7"]["metadata"]["ts"] == FEB + 20
+
+    # Only ids the legacy store was listed with are deleted from it, once
+    deletes = []
+    legacy_delete = legacy.delete
+    legacy.delete = lambda ids: deletes.append(list(ids)) or legacy_delete(ids)
+    store.upsert([record(7, FEB + 21), record(9, FEB + 22)])
+    store.delete(["doc8", "doc9"])
+    assert deletes == [["doc8"]] and legacy.fetch(["doc8"]) == {}
+    assert "doc8" not in store.fetch(["doc8"])
+
+    # Retention drops whole months that ended by the cutoff
+    assert store.drop_before(FEB + 1) == ["doc0"]
+    assert not os.path.exists(os.path.join(workdir, "partitions", "mem-2026-01"))
+    assert store.stats()["partitions"] == {"2026-02": 2}
+    assert store.drop_before(FEB + 1) == []
+
+
+def test_workers_share_the_directory():
+    workdir = tempfile.mkdtemp()
+    writer, reader = open_store(workdir), open_store(workdir)
+    assert reader.query(record(0, 0)["values"], top_k=3)["matches"] == []
+
+    # Only the writer creates the partition, the reader has to notice it
+    writer.upsert([record(0, JAN + 10), record(1, JAN + 20)])
+    assert partition_key(JAN) in reader.partitions_for(None)
+    assert reader.query(record(0, 0)["values"], top_k=1)["matches"][0]["id"] == "doc0"
+    assert sorted(reader.list()) == ["doc0", "doc1"]
+
+    # Retention in one worker drops the partition from the other too
+    writer.drop_before(FEB)
+    assert reader.partitions_for(None) == []
+    assert reader.query(record(0, 0)["values"], top_k=1)["matches"] == []
+
+
+if __name__ == "__main__":
+    for test in (test_routes_by_month, test_retention_and_legacy, test_workers_share_the_directory):
+        test()
+        print(f"✅ {test.__name__}")
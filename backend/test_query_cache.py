@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Checks the query cache: coalescing, TTL expiry, invalidation, and what happens when the caller computing goes away.
+Runs offline, plain asyncio.
+"""
+
+import asyncio
+import time
+
+from query_cache import QueryCache, normalize_query
+
+
+def test_concurrent_misses_share_one_computation():
+    async def scenario():
+        cache = QueryCache(ttl_s=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "vector"
+
+        results = await asyncio.gather(*(cache.get_or_compute("q", compute) for _ in range(5)))
+        assert results == ["vector"] * 5 and len(calls) == 1
+        assert await cache.get_or_compute("q", compute) == "vector" and len(calls) == 1
+        stats = cache.stats()
+        assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire():
+    async def scenario():
+        cache = QueryCache(ttl_s=0.02)
+        values = iter(range(10))
+
+        async def compute():
+            return next(values)
+
+        assert await cache.get_or_compute("q", compute) == 0
+        assert await cache.get_or_compute("q", compute) == 0
+        time.sleep(0.03)
+        assert await cache.get_or_compute("q", compute) == 1
+        assert cache.stats()["expirations"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_clear_while_computing_is_not_cached():
+    async def scenario():
+        cache = QueryCache(ttl_s=60)
+        values = iter(range(10))
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            return next(values)
+
+        first = asyncio.ensure_future(cache.get_or_compute("q", compute))
+        await asyncio.sleep(0)
+        cache.clear()  # e.g. an ingest while the search ran
+        assert await first == 0
+        assert await cache.get_or_compute("q", compute) == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_hands_over():
+    async def scenario():
+        cache = QueryCache(ttl_s=60)
+        started = []
+
+        async def compute():
+            started.append(1)
+            await asyncio.sleep(0.05)
+            return len(started)
+
+        leader = asyncio.ensure_future(cache.get_or_compute("q", compute))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(cache.get_or_compute("q", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()  # its client went away
+        assert await asyncio.gather(*waiters) == [2, 2, 2]
+        assert leader.cancelled() and len(started) == 2
+
+    asyncio.run(scenario())
+
+
+def test_failures_reach_every_waiter():
+    async def scenario():
+        cache = QueryCache(ttl_s=60)
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise TimeoutError("encoder stuck")
+
+        results = await asyncio.gather(*(cache.get_or_compute("q", compute) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, TimeoutError) for r in results)
+        assert cache.stats()["size"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_normalize_query():
+    assert normalize_query("  Apple\n pie ") == "Apple pie"
+    assert normalize_query("  Apple\n pie ", casefold=True) == "apple pie"
+
+
+if __name__ == "__main__":
+    for test in (test_concurrent_misses_share_one_computation, test_entries_expire, test_clear_while_computing_is_not_cached,
+                 test_cancelled_leader_hands_over, test_failures_reach_every_waiter, test_normalize_query):
+        test()
+        print(f"✅ {test.__name__}")
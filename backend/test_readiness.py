@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Checks warm-up bookkeeping: retry backoff, recovery and when liveness gives up.
+Runs offline, no model or store.
+"""
+
+import asyncio
+
+import readiness
+from readiness import Readiness
+
+
+def test_failures_back_off_then_recover():
+    async def scenario():
+        state = Readiness()
+        delays = [state.set_failed(OSError("no network")) for _ in range(3)]
+        assert delays == [readiness.WARMUP_RETRY_S * 2 ** i for i in range(3)]
+        assert not state.is_ready and state.error == "OSError: no network"
+        assert not await state.wait(timeout=1)  # answers right away, doesn't wait out the timeout
+
+        state.set_ready()
+        assert state.is_ready and state.error is None and state.failures == 0
+
+    asyncio.run(scenario())
+
+
+def test_liveness_fails_after_repeated_failures():
+    async def scenario():
+        state = Readiness()
+        for _ in range(readiness.WARMUP_MAX_FAILURES - 1):
+            state.set_failed(RuntimeError("boom"))
+        assert state.is_alive
+        state.set_failed(RuntimeError("boom"))
+        assert not state.is_alive and state.snapshot()["failures"] == readiness.WARMUP_MAX_FAILURES
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    for test in (test_failures_back_off_then_recover, test_liveness_fails_after_repeated_failures):
+        test()
+        print(f"✅ {test.__name__}")
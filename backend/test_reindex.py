@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Checks the re-index job: resume after a crash, catch-up passes, the pass after the switch, and the model swap waiting for writes.
+Runs offline: LocalStores in temp directories, the "new model" counts characters.
+"""
+
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from reindex import Reindexer, SwapGuard, fingerprint, target_index
+from vector_store import LocalStore
+
+
+def record(i, text, dim=8):
+    return {"id": f"doc{i}", "values": list(np.random.default_rng(i).normal(size=dim)),
+            "metadata": {"content": text, "title": f"t{i}", "ts": 1000.0 + i, "chunk": 0}}
+
+
+def new_model(texts):
+    # A "model" with another dimension, so old and new vectors can't be mixed up
+    return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+
+
+def setup(n=25):
+    workdir = tempfile.mkdtemp()
+    source = LocalStore(os.path.join(workdir, "old"))
+    source.upsert([record(i, "a" * i) for i in range(n)])
+    target = LocalStore(os.path.join(workdir, "new"))
+    return workdir, source, target
+
+
+def job(source, target, workdir, encode_fn=new_model):
+    return Reindexer(source, target, ThreadPoolExecutor(max_workers=2), encode_fn=encode_fn,
+                     job={"source": "old", "target": "new"},
+                     state_path=os.path.join(workdir, "reindex.sqlite"), batch_size=4)
+
+
+def test_copies_everything_and_resumes():
+    workdir, source, target = setup()
+    calls = []
+
+    def crashing(texts):
+        calls.append(len(texts))
+        if len(calls) == 4:
+            raise RuntimeError("killed")
+        return new_model(texts)
+
+    try:
+        job(source, target, workdir, crashing).run_pass()
+    except RuntimeError:
+        pass
+    copied_before = len(list(target.list()))
+    assert 0 < copied_before < 25
+
+    resumed = job(source, target, workdir)
+    assert resumed.run_pass() == 25 - copied_before
+    assert sorted(target.list()) == sorted(source.list())
+    assert target.dimension == 3
+    assert target.fetch(["doc7"])["doc7"]["metadata"]["title"] == "t7"
+    assert resumed.run_pass() == 0
+
+
+def test_catch_up_passes_follow_changes():
+    workdir, source, target = setup()
+    reindexer = job(source, target, workdir)
+    reindexer.run_pass()
+    source.upsert([record(3, "changed"), record(99, "new page")])
+    source.delete(["doc5"])
+    assert reindexer.run(max_passes=3, settle=0)
+    assert "doc99" in set(target.list()) and "doc5" not in set(target.list())
+    assert target.fetch(["doc3"])["doc3"]["metadata"]["content"] == "changed"
+
+
+def test_pass_after_switch_keeps_newer_writes():
+    workdir, source, target = setup()
+    reindexer = job(source, target, workdir)
+    reindexer.run_pass()
+    # Before the switch, the old index still took these writes
+    source.upsert([record(1, "late edit"), record(50, "late page")])
+    source.delete(["doc2"])
+    # After it, the new index took these
+    target.upsert([{"id": "doc1", "values": [0, 0, 1], "metadata": {"content": "newest", "ts": 9e9}}])
+    target.delete(["doc4"])
+    source.upsert([record(4, "edited in the old index too")])
+
+    reindexer.catch_up()
+    ids = set(target.list())
+    assert "doc50" in ids and "doc2" not in ids
+    assert target.fetch(["doc1"])["doc1"]["metadata"]["content"] == "newest"
+    assert "doc4" not in ids
+
+
+def test_fingerprint_and_targets():
+    assert fingerprint({"chunk": 0, "ts": 5, "x": None}) == fingerprint({"chunk": 0.0, "ts": 5.0})
+    source = {"model": "a", "backend": "torch", "store": "pinecone", "name": "idx", "prefix": "mem-"}
+    assert target_index(source, "b", "idx", prefix="v2-")["store"] == "pinecone"
+    for prefix in (None, "mem-v2-"):
+        try:
+            target_index(source, "b", "idx", prefix=prefix)
+        except ValueError:
+            continue
+        raise AssertionError(f"prefix {prefix} should clash")
+
+
+def test_swap_waits_for_writes():
+    async def scenario():
+        guard, events = SwapGuard(), []
+
+        async def write(name, delay):
+            async with guard.writing():
+                events.append(f"{name} encoded")
+                await asyncio.sleep(delay)
+                events.append(f"{name} upserted")
+
+        async def swap():
+            async with guard.swapping():
+                events.append("swapped")
+                await asyncio.sleep(0.01)
+
+        running = asyncio.ensure_future(write("old", 0.02))
+        await asyncio.sleep(0)
+        swapping = asyncio.ensure_future(swap())
+        await asyncio.sleep(0)
+        late = asyncio.ensure_future(write("new", 0))
+        await asyncio.gather(running, swapping, late)
+        assert events == ["old encoded", "old upserted", "swapped", "new encoded", "new upserted"]
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    for test in (test_copies_everything_and_resumes, test_catch_up_passes_follow_changes,
+                 test_pass_after_switch_keeps_newer_writes, test_fingerprint_and_targets, test_swap_waits_for_writes):
+        test()
+        print(f"✅ {test.__name__}")
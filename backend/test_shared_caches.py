@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Checks that the dedup and result caches of two workers forget deleted pages together.
+Runs offline: each "worker" has its own caches and SQLite connections on shared files.
+"""
+
+import asyncio
+import os
+import tempfile
+
+from dedup import SeenCache
+from generations import Generation
+from query_cache import QueryCache
+
+
+def workers(dedup_db=False):
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "generations.sqlite")
+    db_path = os.path.join(workdir, "seen.sqlite") if dedup_db else ""
+    return [SeenCache(db_path=db_path, generation=Generation("seen", path)) for _ in range(2)]
+
+
+def test_delete_then_reingest_across_workers():
+    for dedup_db in (False, True):
+        draining, other = workers(dedup_db)
+        draining.put("page", "hash1", 1)
+        assert draining.get("page") == ("hash1", 1)
+
+        # DELETE lands on the other worker, the revisit on the one that stored it
+        other.discard(["page"])
+        assert draining.get("page") is None, dedup_db
+        draining.put("page", "hash1", 1)
+        assert draining.get("page") == ("hash1", 1)
+
+        other.clear()
+        assert draining.get("page") is None
+
+
+def test_result_cache_cleared_everywhere():
+    path = os.path.join(tempfile.mkdtemp(), "generations.sqlite")
+    first, second = (QueryCache(ttl_s=60, generation=Generation("results", path)) for _ in range(2))
+    computed = []
+
+    async def search():
+        computed.append(1)
+        return len(computed)
+
+    async def scenario():
+        assert await first.get_or_compute("q", search) == 1
+        assert await first.get_or_compute("q", search) == 1
+        second.clear()  # an ingest on the other worker
+        assert await first.get_or_compute("q", search) == 2
+        # Its own clear doesn't make it drop the cache a second time
+        first.clear()
+        assert await first.get_or_compute("q", search) == 3
+        assert await first.get_or_compute("q", search) == 3
+
+    asyncio.run(scenario())
+
+
+def test_without_path_nothing_is_shared():
+    generation = Generation("seen")
+    generation.bump()
+    assert not generation.changed()
+
+
+if __name__ == "__main__":
+    for test in (test_delete_then_reingest_across_workers, test_result_cache_cleared_everywhere,
+                 test_without_path_nothing_is_shared):
+        test()
+        print(f"✅ {test.__name__}")
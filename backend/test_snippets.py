@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Checks recall snippets: which sentences are picked, how they widen, and the fallback.
+Runs offline, pure functions.
+"""
+
+from snippets import make_snippet
+
+FILLER = [f"Filler sentence number {i} talks about nothing." for i in range(20)]
+
+
+def test_picks_the_matching_sentence():
+    text = " ".join(FILLER[:10] + ["Pinecone stores the vectors for recall."] + FILLER[10:])
+    assert make_snippet(text, "where are vectors stored", max_chars=60) == "Pinecone stores the vectors for recall."
+    # With room to spare the neighbours come along, on both sides
+    assert make_snippet(text, "where are vectors stored", max_chars=150) == (
+        "Filler sentence number 9 talks about nothing. Pinecone stores the vectors for recall. "
+        "Filler sentence number 10 talks about nothing."
+    )
+
+
+def test_separate_matches_are_marked():
+    text = " ".join(FILLER[:3] + ["Brotli compresses text."] + FILLER[3:15] + ["Gzip compresses text too."] + FILLER[15:])
+    assert make_snippet(text, "brotli gzip compresses", max_chars=80) == "Brotli compresses text. … Gzip compresses text too."
+
+
+def test_falls_back_to_the_start():
+    text = " ".join(FILLER)
+    snippet = make_snippet(text, "zebra", max_chars=60)
+    assert text.startswith(snippet[:-1]) and snippet.endswith("…") and len(snippet) <= 61
+    assert make_snippet("Short page.", "zebra", max_chars=60) == "Short page."
+
+
+if __name__ == "__main__":
+    for test in (test_picks_the_matching_sentence, test_separate_matches_are_marked, test_falls_back_to_the_start):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Checks the local memory-mapped store: growth, reopening, filters and deletes.
+Runs offline in a temp directory.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from vector_store import LocalStore
+
+DIM = 8
+
+
+def record(i, **metadata):
+    return {"id": f"doc{i}", "values": list(np.random.default_rng(i).normal(size=DIM)),
+            "metadata": {"title": f"t{i}", **metadata}}
+
+
+def test_grows_and_reopens():
+    path = tempfile.mkdtemp()
+    store = LocalStore(path, dtype="float16")
+    n = LocalStore.INITIAL_CAPACITY + 10
+    store.upsert([record(i, ts=float(i)) for i in range(n)])
+    assert store._capacity == 2 * LocalStore.INITIAL_CAPACITY
+    assert os.path.getsize(os.path.join(path, "vectors.bin")) == store._capacity * DIM * 2
+
+    reopened = LocalStore(path)  # dtype comes from the store, not the argument
+    assert reopened.dtype == np.float16 and reopened.dimension == DIM
+    assert len(list(reopened.list())) == n
+    q = record(n - 1)["values"]
+    best = reopened.query(q, top_k=1)["matches"][0]
+    assert best["id"] == f"doc{n - 1}" and abs(best["score"] - 1) < 1e-2
+    assert reopened.fetch(["doc3"])["doc3"]["metadata"] == {"title": "t3", "ts": 3.0}
+
+    try:
+        reopened.upsert([{"id": "x", "values": [1.0] * (DIM + 1), "metadata": {}}])
+        raise AssertionError("a vector of another dimension should be refused")
+    except ValueError:
+        pass
+
+
+def test_filters_run_inside_the_store():
+    store = LocalStore(tempfile.mkdtemp())
+    store.upsert([
+        record(0, platform="YOUTUBE", domain="youtube.com", ts=100.0, lang="en"),
+        record(1, platform="WEB", domain="ex.com", ts=200.0, lang="de"),
+        record(2, platform="YOUTUBE", domain="youtube.com", ts=300.0),
+        record(3, platform="WEB", domain="other.org"),  # no ts
+    ])
+    q = record(0)["values"]
+
+    def ids(filter):
+        return sorted(m["id"] for m in store.query(q, top_k=10, filter=filter)["matches"])
+
+    assert ids({"platform": {"$eq": "YOUTUBE"}}) == ["doc0", "doc2"]
+    assert ids({"platform": "WEB"}) == ["doc1", "doc3"]
+    assert ids({"ts": {"$gte": 150}}) == ["doc1", "doc2"]  # a missing ts never matches a range
+    assert ids({"domain": {"$in": ["ex.com", "other.org"]}, "ts": {"$lt": 250}}) == ["doc1"]
+    assert ids({"$or": [{"ts": {"$lte": 100}}, {"domain": {"$eq": "other.org"}}]}) == ["doc0", "doc3"]
+    assert ids({"lang": {"$ne": "de"}}) == ["doc0", "doc2", "doc3"]  # not a column, read from metadata
+    # top_k applies after the filter: the best match (doc0) is filtered out, not returned alone
+    assert [m["id"] for m in store.query(q, top_k=1, filter={"platform": "WEB"})["matches"]] in (["doc1"], ["doc3"])
+
+
+def test_delete_reuses_slots():
+    path = tempfile.mkdtemp()
+    store = LocalStore(path)
+    store.upsert([record(i, platform="WEB") for i in range(5)])
+    slot = store._slots["doc2"]
+    store.delete(["doc2", "missing"])
+    assert "doc2" not in store.fetch(["doc2"])
+    assert all(m["id"] != "doc2" for m in store.query(record(2)["values"], top_k=5)["matches"])
+    assert store.query(record(2)["values"], top_k=5, filter={"platform": "WEB"})["matches"][0]["id"] != "doc2"
+
+    store.upsert([record(9)])
+    assert store._slots["doc9"] == slot  # the freed row is taken again, the file doesn't grow
+    assert sorted(LocalStore(path).list()) == ["doc0", "doc1", "doc3", "doc4", "doc9"]
+
+    store.delete_all()
+    assert list(store.list()) == [] and store.query(record(0)["values"])["matches"] == []
+    assert list(LocalStore(path).list()) == []
+    store.drop()
+    assert not os.path.exists(path)
+
+
+if __name__ == "__main__":
+    for test in (test_grows_and_reopens, test_filters_run_inside_the_store, test_delete_reuses_slots):
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,478 @@
+import abc
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+
+import logger
+
+
+# "pinecone" or "local". Without a Pinecone key we fall back to the local store.
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone" if os.getenv("PINECONE_API_KEY") else "local")
+PINECONE_INDEX = os.getenv("PINECONE_INDEX", "sentinel-memory")
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", "sentinel_store")
+LOCAL_STORE_DTYPE = os.getenv("LOCAL_STORE_DTYPE", "float32")
+
+
+class VectorStore(abc.ABC):
+    """What the API needs from a vector database.
+
+    Records are dicts {"id", "values", "metadata"} and query results look like
+    Pinecone's: {"matches": [{"id", "score", "metadata", "values"?}]}.
+    Filters use Pinecone's metadata filter syntax, e.g.
+    {"platform": {"$eq": "YOUTUBE"}, "ts": {"$gte": 1700000000}}.
+    """
+
+    @abc.abstractmethod
+    def upsert(self, vectors):
+        ...
+
+    @abc.abstractmethod
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None):
+        ...
+
+    @abc.abstractmethod
+    def fetch(self, ids):
+        """Returns {id: record} for the ids that exist."""
+        ...
+
+    @abc.abstractmethod
+    def list(self):
+        """Yields every stored id."""
+        ...
+
+    @abc.abstractmethod
+    def delete(self, ids):
+        ...
+
+    @abc.abstractmethod
+    def delete_all(self):
+        ...
+
+    @abc.abstractmethod
+    def drop(self):
+        """Removes the store itself (its namespace or directory), not just the records."""
+        ...
+
+
+class PineconeStore(VectorStore):
+    """The hosted Pinecone index, or one namespace of it."""
+
+    def __init__(self, api_key=None, index_name=PINECONE_INDEX, namespace="", index=None):
+        if index is None:
+            from pinecone import Pinecone
+
+            index = Pinecone(api_key=api_key).Index(index_name)
+        self.index = index
+        self.namespace = namespace
+
+    def namespaces(self):
+        """{namespace: vector count} of the whole index."""
+        stats = self.index.describe_index_stats()
+        return {name: ns.vector_count for name, ns in (stats.namespaces or {}).items()}
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=vectors, namespace=self.namespace)
+
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None):
+        # Pinecone applies the filter inside the index, before ranking
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=include_values,
+            filter=filter or None,
+            namespace=self.namespace,
+        )
+        return {"matches": [_plain_match(m) for m in results['matches']]}
+
+    def fetch(self, ids):
+        vectors = self.index.fetch(ids=list(ids), namespace=self.namespace).vectors
+        return {
+            vid: {"id": vid, "values": list(v.values), "metadata": dict(v.metadata or {})}
+            for vid, v in vectors.items()
+        }
+
+    def list(self):
+        # Serverless indexes page through ids in lists of up to 100
+        for page in self.index.list(namespace=self.namespace):
+            yield from page
+
+    def delete(self, ids):
+        # Pinecone takes at most 1000 ids per delete
+        ids = list(ids)
+        for start in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[start:start + 1000], namespace=self.namespace)
+
+    def delete_all(self):
+        # Note: Pinecone delete_all=True is deprecated in some clients, but delete(delete_all=True) works
+        self.index.delete(delete_all=True, namespace=self.namespace)
+
+    def drop(self):
+        # Deleting every record of a namespace removes the namespace
+        self.delete_all()
+
+
+def _plain_match(match):
+    return {
+        "id": match['id'],
+        "score": match['score'],
+        "metadata": dict(match.get('metadata') or {}),
+        "values": list(match.get('values') or []),
+    }
+
+
+def _compare(values, op, operand):
+    """Vectorized Pinecone filter operator over a NumPy column."""
+    if op == "$eq":
+        return values == operand
+    if op == "$ne":
+        return values != operand
+    if op in ("$in", "$nin"):
+        # Membership test per value, np.isin would try to sort mixed None / str columns
+        allowed = set(operand)
+        found = np.frompyfunc(lambda v: v in allowed, 1, 1)(values).astype(bool)
+        return found if op == "$in" else ~found
+    # Range operators only make sense on numbers, missing values (NaN) never match
+    if op == "$gt":
+        return values > operand
+    if op == "$gte":
+        return values >= operand
+    if op == "$lt":
+        return values < operand
+    if op == "$lte":
+        return values <= operand
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+class LocalStore(VectorStore):
+    """Vectors in a memory-mapped NumPy file, metadata in a SQLite sidecar.
+
+    Search is one vectorized dot product over all live rows, which for one
+    person's browsing history is well under a millisecond. Vectors are stored
+    unit-normalized so the dot product is the cosine similarity, like the
+    cosine Pinecone index.
+    """
+
+    INITIAL_CAPACITY = 1024
+    QUERY_BLOCK_ROWS = 65536
+    # Metadata fields kept as NumPy columns so filters run vectorized
+    NUMERIC_COLUMNS = ("ts",)
+    TEXT_COLUMNS = ("platform", "domain", "url", "doc_id")
+
+    def __init__(self, path=LOCAL_STORE_PATH, dtype=LOCAL_STORE_DTYPE):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(path, "metadata.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records (slot INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT)"
+        )
+        self._db.commit()
+
+        info = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+        if "dtype" in info:
+            self.dtype = np.dtype(info["dtype"])
+        self.dimension = int(info["dimension"]) if "dimension" in info else None
+        self._vectors = None
+        self._capacity = 0
+        self._slots = {}
+        self._ids = []
+        self._metadata = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._columns = {name: np.zeros(0, dtype=np.float64) for name in self.NUMERIC_COLUMNS}
+        self._columns.update({name: np.zeros(0, dtype=object) for name in self.TEXT_COLUMNS})
+        self._free = []
+
+        if self.dimension is not None:
+            self._load()
+
+    # --- storage ---
+
+    def _vectors_file(self):
+        return os.path.join(self.path, "vectors.bin")
+
+    def _open(self, capacity):
+        # Growing just extends the file, existing rows stay where they are
+        nbytes = capacity * self.dimension * self.dtype.itemsize
+        with open(self._vectors_file(), "ab") as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._vectors = np.memmap(self._vectors_file(), dtype=self.dtype, mode="r+", shape=(capacity, self.dimension))
+        self._capacity = capacity
+        self._ids.extend([None] * (capacity - len(self._ids)))
+        self._metadata.extend([None] * (capacity - len(self._metadata)))
+        grow = capacity - len(self._alive)
+        self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+        for name in self.NUMERIC_COLUMNS:
+            self._columns[name] = np.concatenate([self._columns[name], np.full(grow, np.nan)])
+        for name in self.TEXT_COLUMNS:
+            self._columns[name] = np.concatenate([self._columns[name], np.full(grow, None, dtype=object)])
+
+    def _load(self):
+        rows = self._db.execute("SELECT slot, id, metadata FROM records").fetchall()
+        file_rows = 0
+        if os.path.exists(self._vectors_file()):
+            file_rows = os.path.getsize(self._vectors_file()) // (self.dimension * self.dtype.itemsize)
+        needed = max([file_rows, self.INITIAL_CAPACITY] + [slot + 1 for slot, _, _ in rows])
+        self._open(needed)
+        for slot, vid, meta in rows:
+            self._slots[vid] = slot
+            self._ids[slot] = vid
+            self._metadata[slot] = json.loads(meta) if meta else {}
+            self._alive[slot] = True
+            self._set_columns(slot, self._metadata[slot])
+        self._free = [slot for slot in range(self._capacity - 1, -1, -1) if not self._alive[slot]]
+
+    def _init_dimension(self, dimension):
+        self.dimension = dimension
+        self._db.executemany(
+            "INSERT OR REPLACE INTO info VALUES (?, ?)",
+            [("dimension", str(dimension)), ("dtype", self.dtype.name)],
+        )
+        self._db.commit()
+        self._open(self.INITIAL_CAPACITY)
+        self._free = list(range(self._capacity - 1, -1, -1))
+
+    def _take_slot(self):
+        if not self._free:
+            old = self._capacity
+            self._open(old * 2)
+            self._free = list(range(self._capacity - 1, old - 1, -1))
+        return self._free.pop()
+
+    def _set_columns(self, slot, meta):
+        for name in self.NUMERIC_COLUMNS:
+            value = meta.get(name)
+            self._columns[name][slot] = float(value) if isinstance(value, (int, float)) else np.nan
+        for name in self.TEXT_COLUMNS:
+            self._columns[name][slot] = meta.get(name)
+
+    def _filter_mask(self, filter, n):
+        """Boolean mask over the first n slots of the records matching a Pinecone-style filter."""
+        mask = np.ones(n, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._filter_mask(sub, n)
+                continue
+            if key == "$or":
+                any_mask = np.zeros(n, dtype=bool)
+                for sub in condition:
+                    any_mask |= self._filter_mask(sub, n)
+                mask &= any_mask
+                continue
+            if key in self._columns:
+                values = self._columns[key][:n]
+            else:
+                # Not a column: fall back to reading the metadata of each row
+                values = np.array([m.get(key) if m else None for m in self._metadata[:n]], dtype=object)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                mask &= _compare(values, op, operand)
+        return mask
+
+    @staticmethod
+    def _normalize(values):
+        v = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(v, axis=-1, keepdims=True)
+        return v / np.where(norm == 0, 1, norm)
+
+    # --- VectorStore ---
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+        with self._lock:
+            if self.dimension is None:
+                self._init_dimension(len(vectors[0]["values"]))
+            values = self._normalize([v["values"] for v in vectors])
+            if values.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match store dimension {self.dimension}")
+
+            rows = []
+            for record, vector in zip(vectors, values):
+                vid = record["id"]
+                slot = self._slots.get(vid)
+                if slot is None:
+                    slot = self._take_slot()
+                    self._slots[vid] = slot
+                    self._ids[slot] = vid
+                meta = record.get("metadata") or {}
+                self._vectors[slot] = vector
+                self._metadata[slot] = meta
+                self._alive[slot] = True
+                self._set_columns(slot, meta)
+                rows.append((slot, vid, json.dumps(meta)))
+            self._vectors.flush()
+            self._db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None):
+        with self._lock:
+            if self.dimension is None or not self._slots:
+                return {"matches": []}
+            q = self._normalize(vector)
+            # Only rows up to the highest used slot can be alive
+            n = int(np.flatnonzero(self._alive)[-1]) + 1
+            candidates = self._alive[:n].copy()
+            if filter:
+                candidates &= self._filter_mask(filter, n)
+            # Only the rows that pass the filter get scored
+            rows = np.flatnonzero(candidates)
+            if len(rows) == 0:
+                return {"matches": []}
+
+            scores = np.empty(len(rows), dtype=np.float32)
+            dense = len(rows) == n
+            for start in range(0, len(rows), self.QUERY_BLOCK_ROWS):
+                chunk = rows[start:start + self.QUERY_BLOCK_ROWS]
+                # Contiguous slices stay memory-mapped views, fancy indexing copies
+                block = self._vectors[chunk[0]:chunk[-1] + 1] if dense else self._vectors[chunk]
+                scores[start:start + len(chunk)] = block.astype(np.float32, copy=False) @ q
+
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+
+            matches = []
+            for i in top:
+                slot = rows[i]
+                match = {"id": self._ids[slot], "score": float(scores[i])}
+                if include_metadata:
+                    match["metadata"] = dict(self._metadata[slot])
+                if include_values:
+                    match["values"] = self._vectors[slot].astype(np.float32).tolist()
+                matches.append(match)
+            return {"matches": matches}
+
+    def fetch(self, ids):
+        with self._lock:
+            found = {}
+            for vid in ids:
+                slot = self._slots.get(vid)
+                if slot is not None:
+                    found[vid] = {
+                        "id": vid,
+                        "values": self._vectors[slot].astype(np.float32).tolist(),
+                        "metadata": dict(self._metadata[slot]),
+                    }
+            return found
+
+    def list(self):
+        with self._lock:
+            ids = list(self._slots)
+        yield from ids
+
+    def delete(self, ids):
+        with self._lock:
+            slots = [self._slots.pop(vid) for vid in ids if vid in self._slots]
+            for slot in slots:
+                self._alive[slot] = False
+                self._ids[slot] = None
+                self._metadata[slot] = None
+                self._set_columns(slot, {})
+                self._free.append(slot)
+            if slots:
+                self._db.executemany("DELETE FROM records WHERE slot = ?", [(s,) for s in slots])
+                self._db.commit()
+
+    def delete_all(self):
+        with self._lock:
+            self._db.execute("DELETE FROM records")
+            self._db.commit()
+            self._slots.clear()
+            self._alive[:] = False
+            for name in self.NUMERIC_COLUMNS:
+                self._columns[name][:] = np.nan
+            for name in self.TEXT_COLUMNS:
+                self._columns[name][:] = None
+            self._ids = [None] * self._capacity
+            self._metadata = [None] * self._capacity
+            self._free = list(range(self._capacity - 1, -1, -1))
+
+    def drop(self):
+        with self._lock:
+            self._db.close()
+            self._vectors = None
+            self._slots.clear()
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def with_hot_tier(store):
+    """Puts an in-memory tier of the newest records in front of a remote store, if enabled."""
+    from hot_tier import HotTier, TieredStore, HOT_TIER_MB
+    from serve import WEB_WORKERS
+
+    # With several workers each would only see its own writes, and most land in the journal worker
+    if HOT_TIER_MB <= 0 or WEB_WORKERS > 1:
+        return store
+    logger.info("hot_tier", max_mb=HOT_TIER_MB)
+    return TieredStore(store, HotTier())
+
+
+def create_vector_store(kind=VECTOR_STORE, name=None, prefix=None, hot_tier=True):
+    """Builds the configured store, or returns None if Pinecone is selected without a key.
+
+    name is the local store directory or the Pinecone index and prefix the
+    partition prefix, both default to the settings. A re-index target passes its own.
+    """
+    from partitions import PartitionedStore, VECTOR_PARTITIONS, PARTITION_DIRECTORY_PATH, PARTITION_PREFIX
+
+    prefix = prefix or PARTITION_PREFIX
+    if kind == "local":
+        path = name or LOCAL_STORE_PATH
+        logger.info("vector_store", kind="local", path=path, partitions=VECTOR_PARTITIONS)
+        if VECTOR_PARTITIONS == "none":
+            return LocalStore(path)
+        root = os.path.join(path, "partitions")
+        os.makedirs(root, exist_ok=True)
+        # A flat store from before partitioning stays searchable until it empties out
+        legacy = None
+        if os.path.exists(os.path.join(path, "metadata.sqlite")):
+            legacy = LocalStore(path)
+            if next(iter(legacy.list()), None) is None:
+                legacy = None
+        directory_path = os.path.join(path, "partition_directory.sqlite")
+        if PARTITION_DIRECTORY_PATH and path == LOCAL_STORE_PATH:
+            directory_path = PARTITION_DIRECTORY_PATH
+        return PartitionedStore(
+            lambda name: LocalStore(os.path.join(root, name)),
+            existing=os.listdir(root),
+            legacy=legacy,
+            directory_path=directory_path,
+            prefix=prefix,
+        )
+    if kind == "pinecone":
+        api_key = os.getenv("PINECONE_API_KEY")
+        if not api_key:
+            logger.warning("pinecone_key_missing", detail="Requests will fail until PINECONE_API_KEY is set")
+            return None
+        index_name = name or PINECONE_INDEX
+        flat = store = PineconeStore(api_key, index_name=index_name)
+        if VECTOR_PARTITIONS != "none":
+            namespaces = flat.namespaces()
+            default = index_name == PINECONE_INDEX and prefix == PARTITION_PREFIX
+            # Records written before partitioning live in the default namespace of the original index
+            legacy = flat if default and namespaces.get("", 0) else None
+            directory_path = PARTITION_DIRECTORY_PATH or "partition_directory.sqlite"
+            if not default:
+                directory_path = f"partition_directory-{index_name}-{prefix.strip('-')}.sqlite"
+            store = PartitionedStore(
+                lambda name: PineconeStore(index=flat.index, namespace=name),
+                existing=namespaces,
+                legacy=legacy,
+                directory_path=directory_path,
+                prefix=prefix,
+            )
+        return with_hot_tier(store) if hot_tier else store
+    raise ValueError(f"Unknown VECTOR_STORE: {kind}")
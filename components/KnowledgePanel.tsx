@@ -1,6 +1,7 @@
 import React, { useState, useRef } from 'react';
 import { SentinelMode, MemoryItem } from '../types';
 import { Plus, Trash2, FileText, Youtube, Instagram, Clapperboard, Brain, Search } from './Icons';
+import { brainService } from '../services/brainService';
 
 interface KnowledgePanelProps {
   mode: SentinelMode;
@@ -15,6 +16,17 @@ const KnowledgePanel: React.FC<KnowledgePanelProps> = ({ mode, memories, onAddMe
   const jsonInputRef = useRef<HTMLInputElement>(null);
   const [selectedMemory, setSelectedMemory] = useState<MemoryItem | null>(null);
 
+  // Memories from the brain are listed with a preview, load the whole text when one is opened
+  const openMemory = async (mem: MemoryItem) => {
+    setSelectedMemory(mem);
+    const brainId = mem.metadata?.brainId;
+    if (!brainId) return;
+    const full = await brainService.fetchMemory(brainId);
+    if (full) {
+      setSelectedMemory(current => (current?.id === mem.id ? { ...current, content: full.content } : current));
+    }
+  };
+
   // Form State for Life Log
   const [logTitle, setLogTitle] = useState('');
   const [logDesc, setLogDesc] = useState('');
@@ -178,7 +190,7 @@ const KnowledgePanel: React.FC<KnowledgePanelProps> = ({ mode, memories, onAddMe
               <div
                 key={mem.id}
                 className="bg-sentinel-dark p-3 rounded-lg border border-gray-700 group hover:border-sentinel-primary transition-colors cursor-pointer"
-                onClick={() => setSelectedMemory(mem)}
+                onClick={() => openMemory(mem)}
               >
                 <div className="flex justify-between items-start">
                   <div className="flex items-center gap-2 overflow-hidden">
@@ -8,6 +8,33 @@ function logStatus(msg) {
     chrome.storage.local.set({ lastLog: fullMsg });
 }
 
+// A stable id per browser, the backend rate-limits per client
+function getClientId(callback) {
+    chrome.storage.local.get(['clientId'], function (result) {
+        if (result.clientId) return callback(result.clientId);
+        const clientId = crypto.randomUUID();
+        chrome.storage.local.set({ clientId: clientId }, () => callback(clientId));
+    });
+}
+
+// POST /ingest, waiting out one 429 (busy or over the rate limit) before giving up
+function sendIngest(apiUrl, payload, clientId, retried = false) {
+    return fetch(`${apiUrl}/ingest`, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "X-Client-Id": clientId
+        },
+        body: JSON.stringify(payload)
+    }).then(response => {
+        if (response.status !== 429 || retried) return response;
+        const waitS = parseInt(response.headers.get("Retry-After"), 10) || 5;
+        logStatus(`⏳ Server busy, retrying in ${waitS}s`);
+        return new Promise(resolve => setTimeout(resolve, waitS * 1000))
+            .then(() => sendIngest(apiUrl, payload, clientId, true));
+    });
+}
+
 // This listens for the data coming from the open tab (content.js)
 chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
     // CHECK IF PAUSED
@@ -27,13 +54,7 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
             }
 
             // 2. DIRECTLY send data to the Python Brain (The "Invisible Wire")
-            fetch(`${apiUrl}/ingest`, {
-                method: "POST",
-                headers: {
-                    "Content-Type": "application/json"
-                },
-                body: JSON.stringify(message.payload)
-            })
+            getClientId(clientId => sendIngest(apiUrl, message.payload, clientId)
                 .then(response => {
                     if (response.ok) {
                         logStatus(`✅ Success: ${title.substring(0, 20)}...`);
@@ -58,7 +79,7 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
                         chrome.action.setBadgeText({ text: "OFF", tabId: sender.tab.id }); // Python backend is likely offline
                         chrome.action.setBadgeBackgroundColor({ color: "#000000", tabId: sender.tab.id });
                     }
-                });
+                }));
         }
     });
 });
\ No newline at end of file
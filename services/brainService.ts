@@ -1,9 +1,11 @@
 export interface Memory {
+  id?: string;
   content: string;
   metadata: {
     title: string;
     url: string;
     time: string;
+    platform?: string;
   };
   score?: number;
 }
@@ -12,19 +14,43 @@ export interface BrainResponse {
   memories: Memory[];
 }
 
+export interface RecallFilters {
+  platform?: string;
+  domain?: string;
+  since?: string | number;
+  until?: string | number;
+  top_k?: number;
+  // 'snippet' returns only the best-matching sentences, 'ids' no content at all
+  mode?: 'full' | 'snippet' | 'ids';
+  fields?: Array<'id' | 'content' | 'metadata' | 'score'>;
+}
+
+// A /memories listing entry: the start of the content only, fetchMemory has all of it
+export interface MemorySummary {
+  id: string;
+  preview: string;
+  metadata: Memory['metadata'];
+}
+
+export interface MemoryPage {
+  memories: MemorySummary[];
+  next_before: string | null;
+  next_after: string | null;
+}
+
 // Default to localhost, but allow override via environment variable or config
 // Default to the deployed Hugging Face Space, but allow override via environment variable
 const API_URL = import.meta.env.VITE_API_URL || "https://sa-d-bo-sentinel-brain.hf.space";
 
 export const brainService = {
-  async recall(query: string): Promise<Memory[]> {
+  async recall(query: string, filters: RecallFilters = {}): Promise<Memory[]> {
     try {
       const response = await fetch(`${API_URL}/recall`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ text: query }),
+        body: JSON.stringify({ text: query, ...filters }),
       });
 
       if (!response.ok) {
@@ -48,15 +74,38 @@ export const brainService = {
     }
   },
 
-  async fetchAll(): Promise<Memory[]> {
+  async fetchPage(before?: string, limit: number = 200): Promise<MemoryPage> {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (before) params.set('before', before);
+    const response = await fetch(`${API_URL}/memories?${params}`);
+    if (!response.ok) throw new Error('Failed to fetch memories');
+    return response.json();
+  },
+
+  async fetchAll(): Promise<MemorySummary[]> {
+    // Walk the newest-first pages until the server runs out of cursors
+    const all: MemorySummary[] = [];
     try {
-      const response = await fetch(`${API_URL}/memories`);
-      if (!response.ok) return [];
-      const data = await response.json();
-      return data.memories;
+      let before: string | undefined;
+      do {
+        const page = await this.fetchPage(before);
+        all.push(...page.memories);
+        before = page.next_before ?? undefined;
+      } while (before);
     } catch (error) {
       console.error("Failed to fetch all memories:", error);
-      return [];
+    }
+    return all;
+  },
+
+  async fetchMemory(id: string): Promise<Memory | null> {
+    try {
+      const response = await fetch(`${API_URL}/memories/${encodeURIComponent(id)}`);
+      if (!response.ok) throw new Error('Failed to fetch memory');
+      return response.json();
+    } catch (error) {
+      console.error("Failed to fetch memory:", error);
+      return null;
     }
   },
 
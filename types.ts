@@ -11,6 +11,8 @@ export interface MemoryItem {
     platform?: 'YOUTUBE' | 'INSTAGRAM' | 'NETFLIX' | 'CRUNCHYROLL' | 'GITHUB' | 'HUGGING FACE' | 'STACK OVERFLOW' | 'LOCAL' | 'WEB' | 'OTHER';
     url?: string;
     description?: string;
+    // Backend id of a memory listed with a preview only, the full content is fetched on demand
+    brainId?: string;
   };
 }
 